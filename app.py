@@ -1,48 +1,227 @@
+import gzip
 import json
 import os
 import requests
 import logging
-import pandas as pd
 import re
+import threading
+import time
+import atexit
+from contextlib import contextmanager
 from datetime import datetime
 from flask import Flask, jsonify, render_template, request, g, Response
 
 # --- Custom Imports ---
-from logger_setup import initialize_session_dir, configure_app_logger
-from parser import parse_workbook
+from logger_setup import LOGS_DIR, initialize_session_dir, configure_app_logger
+from parse_cache import ParseCache
+from artifact_writer import ArtifactWriter
+from completion_cache import CompletionCache, payload_key
+from filter_pool import FilterPool, JobIdInUse, signal_cancel
+from llm_client import LLMClient
+from metrics import metrics
+from llm_fanout import plan_jobs, stream_fanout
+from prompt_payload import build_prompt
+from model_catalogue import ModelCatalogue
+from results_query import DEFAULT_LIMIT, ResultsQuery, StaleCursor
+from parse_engine import iter_parse_workbooks, parse_workbooks
+from session_store import SessionStore, SnapshotSaver, find_snapshots
+from disk_cache import DiskCache
+from shared_state import SharedConfig, SharedSession, shared_state_enabled
 
 # --- Configuration & Constants ---
 CONFIG_FILE = 'config.json'
 PROMPTS_DIR = './prompts'
+CACHE_DIR = './CACHE'
+SESSION_SNAPSHOT_DIR = 'session_state'  # inside each LOGS session directory
 NEBIUS_API_BASE_URL = "https://api.studio.nebius.com/v1"
 
+DEFAULT_CONFIG = {"api_key": "", "starred_models": [], "all_models": [], "selected_model": ""}
+
 # --- App State ---
-session_wallets = []
-
-def load_config():
-    if not os.path.exists(CONFIG_FILE):
-        default_config = {
-            "api_key": "", "starred_models": [], "all_models": [], "selected_model": ""
-        }
-        save_config(default_config)
-        return default_config
-    with open(CONFIG_FILE, 'r') as f:
-        return json.load(f)
-
-def save_config(config_data):
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config_data, f, indent=2)
+# Under serve.py several worker processes run this module side by side. They share
+# the session directory, config.json and the session snapshot (see shared_state);
+# everything else here is per process.
+SHARED_STATE = shared_state_enabled()
+WORKER_ID = f"w{os.getpid()}" if SHARED_STATE else None
+
+# Wallet profiles of the current session, held as a typed columnar frame.
+session = SessionStore()
+
+# config.json is re-read whenever it changes on disk and written under a lock; `config`
+# is rebound to the current contents at the start of every request.
+config_store = SharedConfig(CONFIG_FILE, DEFAULT_CONFIG)
+
+def save_config(changes):
+    global config
+    config = config_store.update(changes)
+
+def replace_config(data):
+    global config
+    config = config_store.replace(data)
 
 # --- Flask App Initialization ---
 app = Flask(__name__, static_folder='static', template_folder='templates')
-config = load_config()
+config = config_store.data()
 
 SESSION_DIR_PATH = initialize_session_dir()
-configure_app_logger(app, SESSION_DIR_PATH)
+configure_app_logger(app, SESSION_DIR_PATH, use_queue=config.get('log_queue', True),
+                     json_lines=config.get('log_json_lines', False), sample_rates=config.get('log_sampling'),
+                     worker=WORKER_ID)
+
+# Session artifacts (parsed wallets, AI requests/completions, results) are written off the request path.
+artifacts = ArtifactWriter(SESSION_DIR_PATH, encoding=config.get('artifact_encoding', 'json'),
+                           max_pending=config.get('artifact_queue_size', 64), logger=app.logger, worker=WORKER_ID)
+atexit.register(artifacts.close)
+
+# Paged, sorted views of the session and of filter result sets, for /api/wallets. Workers
+# keep result sets in a shared SQLite store so any of them can page through any result.
+result_store = None
+if SHARED_STATE:
+    result_store = DiskCache(os.path.join(SESSION_DIR_PATH, 'result_sets.sqlite3'),
+                             max_bytes=int(config.get('result_sets_max_mb', 256) * 1024 * 1024))
+results_query = ResultsQuery(result_store=result_store)
+
+llm_client = LLMClient(config.get('llm_base_url', NEBIUS_API_BASE_URL),
+                       pool_maxsize=config.get('llm_pool_maxsize', 10),
+                       max_retries=config.get('llm_max_retries', 3))
+atexit.register(llm_client.close)
+
+def persist_models(model_ids, fetched_at):
+    save_config({'all_models': model_ids, 'models_fetched_at': fetched_at})
+
+def fetch_model_ids():
+    model_ids, timings = llm_client.list_models(config.get('api_key'))
+    metrics.record_timings("llm.models", timings)
+    return model_ids
+
+model_catalogue = ModelCatalogue(fetch_model_ids,
+                                 ttl=config.get('model_catalogue_ttl_s', 3600),
+                                 models=config.get('all_models'),
+                                 fetched_at=config.get('models_fetched_at', 0.0),
+                                 on_refresh=persist_models, logger=app.logger)
+
+parse_cache = None
+if config.get('parse_cache_enabled', True):
+    parse_cache = ParseCache(os.path.join(CACHE_DIR, 'parse_cache.sqlite3'),
+                             max_bytes=int(config.get('parse_cache_max_mb', 512) * 1024 * 1024))
+
+completion_cache = None
+if config.get('completion_cache_enabled', True):
+    completion_cache = CompletionCache(os.path.join(CACHE_DIR, 'completion_cache.sqlite3'),
+                                       max_bytes=int(config.get('completion_cache_max_mb', 256) * 1024 * 1024))
+
+# Filter workers are started on first use so that importing the app (or the
+# debug reloader's watcher process) does not spawn them. Workers sharing state list
+# their running jobs in the session directory, so a cancel can reach any of them.
+filter_pool = None
+FILTER_JOBS_DIR = os.path.join(SESSION_DIR_PATH, 'filter_jobs') if SHARED_STATE else None
+filter_pool_lock = threading.Lock()
+
+def get_filter_pool():
+    global filter_pool
+    with filter_pool_lock:
+        if filter_pool is None:
+            filter_pool = FilterPool(os.path.join(SESSION_DIR_PATH, 'frames', WORKER_ID or ''),
+                                     workers=config.get('filter_workers', 2),
+                                     timeout=config.get('filter_timeout_s', 30),
+                                     memory_limit=int(config.get('filter_memory_mb', 2048) * 1024 * 1024),
+                                     jobs_dir=FILTER_JOBS_DIR)
+            atexit.register(filter_pool.close)
+        return filter_pool
+
+def warm_filter_pool():
+    """Starts the filter workers and publishes the new session frame before the first execute needs it."""
+    if len(session):
+        get_filter_pool().publish(session.snapshot())
+
+# The session's wallets are saved to the session directory after every ingest, and the
+# newest saved session (or the one named by 'session_restore') is reloaded at startup.
+# Workers sharing state save synchronously instead, and reload what the others saved.
+session_saver = shared_session = None
+if SHARED_STATE:
+    shared_session = SharedSession(session, os.path.join(SESSION_DIR_PATH, SESSION_SNAPSHOT_DIR))
+elif config.get('session_snapshot', True):
+    session_saver = SnapshotSaver(session, os.path.join(SESSION_DIR_PATH, SESSION_SNAPSHOT_DIR), logger=app.logger,
+                                  metrics=metrics)
+    atexit.register(session_saver.close)
+
+@contextmanager
+def session_mutation():
+    """
+    Wraps every change to the session. With shared state the change is made on
+    top of the newest shared snapshot and saved before the lock is released;
+    otherwise the snapshot is saved in the background afterwards.
+    """
+    if shared_session is not None:
+        with shared_session.mutate():
+            yield session
+        return
+    yield session
+    if session_saver is not None:
+        session_saver.request()
+
+def restore_session(path):
+    """Loads a saved session snapshot into the session store. Returns {"wallets", "version", "restore_ms"}."""
+    started = time.perf_counter()
+    meta = session.load(path)
+    restore_ms = (time.perf_counter() - started) * 1000
+    metrics.observe("session.restore", restore_ms)
+    app.logger.info(f"Restored {len(session)} wallets from {path} (saved as v{meta['version']}) in {restore_ms:.1f} ms.")
+    return {"wallets": len(session), "version": session.version, "restore_ms": round(restore_ms, 2)}
+
+def restore_on_startup(choice):
+    """Restores the newest saved session ("latest") or the named one; the session starts empty if there is none."""
+    current = os.path.basename(SESSION_DIR_PATH)
+    candidates = [snapshot for snapshot in find_snapshots(LOGS_DIR, SESSION_SNAPSHOT_DIR)
+                  if snapshot['session'] != current and choice in ('latest', snapshot['session'])]
+    if not candidates:
+        app.logger.info(f"No saved session to restore ({choice}); starting empty.")
+        return
+    try:
+        restore_session(candidates[0]['path'])
+    except Exception as e:
+        app.logger.error(f"Could not restore session {candidates[0]['session']}: {e}", exc_info=True)
+        session.clear()
+
+# With shared state, the first worker to start restores and every later one picks that up.
+with session_mutation():
+    if config.get('session_restore', 'latest') and not len(session):
+        restore_on_startup(config.get('session_restore', 'latest'))
+
+def write_metrics_summary():
+    # Each worker has its own registry, so each writes its own summary.
+    name = f"metrics_summary.{WORKER_ID}.json" if WORKER_ID else 'metrics_summary.json'
+    try:
+        metrics.write_summary(os.path.join(SESSION_DIR_PATH, name))
+    except OSError as e:
+        app.logger.warning(f"Could not write the metrics summary: {e}")
+
+def metrics_summary_loop(interval):
+    while True:
+        time.sleep(interval)
+        write_metrics_summary()
+
+atexit.register(write_metrics_summary)
+threading.Thread(target=metrics_summary_loop, args=(config.get('metrics_summary_interval_s', 60),),
+                 name='metrics-summary', daemon=True).start()
 
 @app.before_request
 def before_request_func():
+    global config
     g.session_dir = SESSION_DIR_PATH
+    g.request_started = time.perf_counter()
+    config = config_store.data()
+    if shared_session is not None and shared_session.sync():
+        app.logger.info(f"Loaded session v{session.version} ({len(session)} wallets) saved by another worker.")
+
+@app.after_request
+def after_request_func(response):
+    # Streamed responses are timed until their headers are sent; their stages are recorded separately.
+    stage = f"http.{request.endpoint or 'unknown'}"
+    metrics.observe(stage, (time.perf_counter() - g.request_started) * 1000)
+    if response.content_length:
+        metrics.add_bytes(stage, response.content_length)
+    return response
 
 # --- API Endpoints ---
 
@@ -52,10 +231,17 @@ def index():
 
 @app.route('/api/config', methods=['GET', 'POST'])
 def handle_config():
-    global config
     if request.method == 'POST':
-        config = request.json
-        save_config(config)
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"error": "The config must be a JSON object."}), 400
+        # The model catalogue is owned by the server; a stale copy from the page must not overwrite it.
+        catalogue = model_catalogue.state()
+        if catalogue['fetched_at']:
+            data['all_models'] = catalogue['models']
+            data['models_fetched_at'] = catalogue['fetched_at']
+        # The page posts the whole config, so keys it dropped are removed.
+        replace_config(data)
         app.logger.info("Configuration updated and saved.")
         return jsonify({"status": "success"})
     return jsonify(config)
@@ -69,11 +255,9 @@ def get_prompts():
 def validate_key():
     api_key = request.json.get('api_key')
     app.logger.info("Attempting to validate API key.")
-    headers = {"Authorization": f"Bearer {api_key}"}
     try:
-        response = requests.get(f"{NEBIUS_API_BASE_URL}/models", headers=headers, timeout=10)
-        response.raise_for_status()
-        app.logger.info("API key validation successful.")
+        _, timings = llm_client.list_models(api_key)
+        app.logger.info(f"API key validation successful ({timings['total_ms']} ms).")
         return jsonify({"valid": True})
     except requests.RequestException as e:
         app.logger.error(f"API key validation failed: {e}", exc_info=True)
@@ -81,133 +265,564 @@ def validate_key():
 
 @app.route('/api/models', methods=['GET'])
 def fetch_models():
-    api_key = config.get('api_key')
-    app.logger.info("Fetching model list from API.")
-    headers = {"Authorization": f"Bearer {api_key}"}
+    force = request.args.get('refresh') in ('1', 'true')
+    if force or model_catalogue.is_stale():
+        app.logger.info(f"Model catalogue {'refresh forced' if force else 'is stale'}; fetching from API.")
     try:
-        response = requests.get(f"{NEBIUS_API_BASE_URL}/models", headers=headers, timeout=10)
-        response.raise_for_status()
-        model_ids = [model['id'] for model in response.json().get('data', [])]
-        app.logger.info(f"Successfully fetched {len(model_ids)} models.")
-        return jsonify(model_ids)
+        model_ids = model_catalogue.get(force=force)
+        state = model_catalogue.state()
+        response = jsonify(model_ids)
+        response.headers['X-Models-Fetched-At'] = str(state['fetched_at'] or '')
+        response.headers['X-Models-Stale'] = 'true' if state['stale'] else 'false'
+        return response
     except requests.RequestException as e:
         app.logger.error(f"Failed to fetch models: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+def save_uploads(files, session_dir):
+    temp_dir = os.path.join(session_dir, 'temp_uploads')
+    os.makedirs(temp_dir, exist_ok=True)
+    filepaths = []
+    for file in files:
+        filepath = os.path.join(temp_dir, file.filename)
+        file.save(filepath)
+        metrics.add_bytes("upload", os.path.getsize(filepath))
+        filepaths.append(filepath)
+    return filepaths
+
+INGEST_MODES = ('replace', 'append')
+
+def ingest(wallets, mode):
+    """
+    Puts parsed wallets into the session: "replace" starts the session over,
+    "append" upserts them by wallet_address, leaving the rest of the session as is.
+    An upload that yielded no wallets leaves the session untouched in either mode.
+    """
+    if not wallets:
+        snapshot = session.snapshot()
+        app.logger.info(f"No wallets parsed; session v{snapshot.version} ({len(snapshot)} wallets) left as it was.")
+        return {"added": 0, "replaced": 0, "session_count": len(snapshot), "version": snapshot.version}
+    with session_mutation():
+        if mode == 'append':
+            counts = session.upsert(wallets)
+        else:
+            session.replace(wallets)
+            counts = {"added": len(session), "replaced": 0}
+        ingested = {**counts, "session_count": len(session), "version": session.version}
+    app.logger.info(f"Session v{ingested['version']} ({mode}): {counts['added']} wallets added, {counts['replaced']} replaced, "
+                    f"{ingested['session_count']} in total.")
+    return ingested
+
+def sse(data):
+    return f"data: {json.dumps(data)}\n\n"
+
+# An AI stream holds a server thread for as long as the model writes. Capping them per
+# process keeps threads free for parse and execute requests under a threaded server.
+stream_slots = threading.BoundedSemaphore(config.get('max_streams_per_worker', 4))
+
+class _StreamSlot:
+    """Response body that gives its stream slot back when the server closes it, whether or not it was read."""
+
+    def __init__(self, generator):
+        self._generator = generator
+        self._released = False
+
+    def __iter__(self):
+        return self._generator
+
+    def close(self):
+        try:
+            self._generator.close()
+        finally:
+            if not self._released:
+                self._released = True
+                stream_slots.release()
+
+def ai_stream_response(generator):
+    if not stream_slots.acquire(blocking=False):
+        generator.close()
+        app.logger.warning("Rejected an AI stream: every stream slot of this worker is in use.")
+        return jsonify({"error": "Too many AI streams are running; try again shortly."}), 503
+    return Response(_StreamSlot(generator), mimetype='text/event-stream')
+
+def inline_requested(value, default=True):
+    """Whether a response should carry its wallets inline ("1"/"true" or "0"/"false"; JSON booleans as-is)."""
+    if value is None:
+        return default
+    return value if isinstance(value, bool) else str(value).lower() in ('1', 'true')
+
+def json_response(data, status=200):
+    """JSON without indentation, gzipped when the client accepts it and the body is worth compressing."""
+    body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    response = Response(body, status=status, mimetype='application/json')
+    min_bytes = config.get('gzip_min_bytes', 1024)
+    if len(body) >= min_bytes and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response.set_data(gzip.compress(body, compresslevel=config.get('gzip_level', 5)))
+        response.headers['Content-Encoding'] = 'gzip'
+        metrics.add_bytes("http.gzip_saved", len(body) - response.content_length)
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
 @app.route('/api/parse-files', methods=['POST'])
 def parse_files():
-    global session_wallets
-    session_wallets.clear()
+    """
+    Parses the uploaded workbooks into the session. ?mode=append adds them to
+    the session (see ingest) instead of replacing it. The parsed wallets are
+    returned inline unless ?inline=0, in which case only their count is; page
+    through them with /api/wallets.
+    """
+    mode = request.args.get('mode', 'replace')
+    if mode not in INGEST_MODES: return jsonify({"error": f"Unknown mode '{mode}'."}), 400
     files = request.files.getlist('files')
     if not files: return jsonify({"error": "No files uploaded"}), 400
     filenames = [f.filename for f in files]
     app.logger.info(f"Received {len(filenames)} files for parsing: {', '.join(filenames)}")
-    temp_dir = os.path.join(g.session_dir, 'temp_uploads')
-    os.makedirs(temp_dir, exist_ok=True)
-    for file in files:
-        filepath = os.path.join(temp_dir, file.filename)
-        file.save(filepath)
+    filepaths = save_uploads(files, g.session_dir)
+    results = parse_workbooks(filepaths, max_workers=config.get('parse_workers'), cache=parse_cache,
+                              reader=config.get('excel_reader', 'auto'))
+    wallets, failures = [], []
+    cache_hits = cache_misses = 0
+    for filename, result in zip(filenames, results):
+        for sheet_name, error in result['sheet_errors'].items():
+            app.logger.warning(f"Error processing sheet '{sheet_name}' in file '{filename}': {error}")
+        if result['skipped']:
+            app.logger.info(f"Skipped {len(result['skipped'])} sheets without wallet info in '{filename}'.")
+        if result['error']:
+            app.logger.error(f"Failed to parse file '{filename}': {result['error']}")
+            failures.append({"file": filename, "error": result['error']})
+            continue
+        cache_hits += result['cached']
+        cache_misses += len(result['profiles']) + len(result['skipped']) + len(result['sheet_errors']) - result['cached']
+        wallets.extend(result['profiles'].values())
+    if parse_cache is not None:
+        app.logger.info(f"Parse cache: {cache_hits} sheet hits, {cache_misses} misses.")
+    if len(failures) == len(files):
+        return jsonify({"error": "Failed to parse all uploaded files.", "failures": failures}), 500
+    ingested = ingest(wallets, mode)
+    warm_filter_pool()
+    artifact_path = artifacts.write(f"parsed_{artifacts.new_id()}", wallets)
+    app.logger.info(f"Parsing complete. {len(wallets)} wallets processed. Saved to {artifact_path}")
+    if not inline_requested(request.args.get('inline')):
+        return jsonify({"count": len(wallets), **ingested, "failures": failures})
+    return jsonify({"wallets": wallets, **ingested, "failures": failures})
+
+@app.route('/api/parse-files-stream', methods=['POST'])
+def parse_files_stream():
+    mode = request.args.get('mode', 'replace')
+    if mode not in INGEST_MODES: return jsonify({"error": f"Unknown mode '{mode}'."}), 400
+    files = request.files.getlist('files')
+    if not files: return jsonify({"error": "No files uploaded"}), 400
+    filenames = [f.filename for f in files]
+    app.logger.info(f"Received {len(filenames)} files for streaming parse ({mode}): {', '.join(filenames)}")
+    filepaths = save_uploads(files, g.session_dir)
+    # ?wallets=0 leaves the profiles out of the sheet events; the page fetches them with /api/wallets.
+    include_wallets = inline_requested(request.args.get('wallets'))
+    artifact_name = f"parsed_{artifacts.new_id()}"
+    def generate():
+        started = time.perf_counter()
+        wallets, order_keys, failures, failed_files = [], [], [], set()
+        cache_hits = cache_misses = 0
+        yield sse({"event": "start", "files": filenames})
         try:
-            profiles_dict = parse_workbook(filepath)
-            session_wallets.extend(list(profiles_dict.values()))
+            events = iter_parse_workbooks(filepaths, max_workers=config.get('parse_workers'), cache=parse_cache,
+                                          reader=config.get('excel_reader', 'auto'))
+            for event in events:
+                file_idx = event['file_index']
+                filename = filenames[file_idx]
+                if event['event'] == 'workbook':
+                    yield sse({"event": "workbook", "file": filename, "file_index": file_idx, "sheets": len(event['sheet_names'])})
+                    continue
+                if event['event'] == 'file_error':
+                    app.logger.error(f"Failed to parse file '{filename}': {event['error']}")
+                    failures.append({"file": filename, "error": event['error']})
+                    failed_files.add(file_idx)
+                    yield sse({"event": "file_error", "file": filename, "file_index": file_idx, "error": event['error']})
+                    continue
+                if event['cached']:
+                    cache_hits += 1
+                else:
+                    cache_misses += 1
+                sheet_event = {"event": "sheet", "file": filename, "file_index": file_idx, "sheet_index": event['sheet_index'],
+                               "sheet": event['sheet'], "elapsed_ms": round(event['elapsed'] * 1000, 2), "cached": event['cached']}
+                if event['error']:
+                    app.logger.warning(f"Error processing sheet '{event['sheet']}' in file '{filename}': {event['error']}")
+                    sheet_event.update(status="error", error=event['error'])
+                elif event['profile'] is None:
+                    sheet_event['status'] = "skipped"
+                else:
+                    sheet_event['status'] = "parsed"
+                    if include_wallets:
+                        sheet_event['wallet'] = event['profile']
+                    wallets.append(event['profile'])
+                    order_keys.append((file_idx, event['sheet_index']))
+                yield sse(sheet_event)
         except Exception as e:
-            app.logger.error(f"Failed to parse file '{file.filename}': {e}", exc_info=True)
-            return jsonify({"error": f"Failed to parse {file.filename}."}), 500
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    artifact_path = os.path.join(g.session_dir, f"parsed_{ts}.json")
-    with open(artifact_path, 'w') as f:
-        json.dump(session_wallets, f, indent=2)
-    app.logger.info(f"Parsing complete. {len(session_wallets)} wallets processed. Saved to {artifact_path}")
-    return jsonify({"wallets": session_wallets})
+            app.logger.error(f"CRITICAL: Error during streaming parse: {e}", exc_info=True)
+            yield sse({"error": str(e)})
+        # Wallets arrive in completion order; keep the session in upload/sheet order. As with
+        # /api/parse-files, a file that failed contributes none of its wallets, even those
+        # whose sheets were streamed before the failure.
+        order = sorted((i for i, (file_idx, _) in enumerate(order_keys) if file_idx not in failed_files),
+                       key=order_keys.__getitem__)
+        ordered = [wallets[i] for i in order]
+        ingested = ingest(ordered, mode)
+        warm_filter_pool()
+        artifact_path = artifacts.write(artifact_name, ordered)
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        if parse_cache is not None:
+            app.logger.info(f"Parse cache: {cache_hits} sheet hits, {cache_misses} misses.")
+        app.logger.info(f"Streaming parse complete. {len(ordered)} wallets processed in {elapsed_ms} ms. Saved to {artifact_path}")
+        yield sse({"event": "done", "wallets": len(ordered), **ingested, "failures": failures, "elapsed_ms": elapsed_ms})
+    return Response(generate(), mimetype='text/event-stream')
+
+@app.route('/api/sessions', methods=['GET'])
+def list_sessions():
+    """
+    Saved session snapshots, newest first, that /api/sessions/<name>/restore can
+    load, and the state of the background saver ("snapshot"; None when the
+    session is not saved in the background).
+    """
+    current = os.path.basename(SESSION_DIR_PATH)
+    sessions = [{key: value for key, value in snapshot.items() if key != 'path'} | {"current": snapshot['session'] == current}
+                for snapshot in find_snapshots(LOGS_DIR, SESSION_SNAPSHOT_DIR)]
+    return jsonify({"sessions": sessions, "snapshot": session_saver.status() if session_saver is not None else None})
+
+@app.route('/api/sessions/<name>/restore', methods=['POST'])
+def restore_saved_session(name):
+    snapshot = next((s for s in find_snapshots(LOGS_DIR, SESSION_SNAPSHOT_DIR) if s['session'] == name), None)
+    if snapshot is None:
+        return jsonify({"error": f"No saved session '{name}'."}), 404
+    try:
+        with session_mutation():
+            restored = restore_session(snapshot['path'])
+    except Exception as e:
+        app.logger.error(f"Could not restore session {name}: {e}", exc_info=True)
+        return jsonify({"error": f"Could not restore session: {e}"}), 500
+    warm_filter_pool()
+    return jsonify(restored)
+
+@app.route('/api/parse-cache', methods=['GET', 'DELETE'])
+def handle_parse_cache():
+    if parse_cache is None:
+        return jsonify({"error": "Parse cache is disabled."}), 400
+    if request.method == 'DELETE':
+        file_hash = request.args.get('file_hash')
+        deleted = parse_cache.invalidate(file_hash)
+        app.logger.info(f"Parse cache invalidated ({file_hash or 'all workbooks'}): {deleted} entries removed.")
+        return jsonify({"status": "success", "deleted": deleted})
+    return jsonify(parse_cache.stats())
+
+@app.route('/api/completion-cache', methods=['GET', 'DELETE'])
+def handle_completion_cache():
+    if completion_cache is None:
+        return jsonify({"error": "Completion cache is disabled."}), 400
+    if request.method == 'DELETE':
+        model = request.args.get('model')
+        deleted = completion_cache.invalidate(model)
+        app.logger.info(f"Completion cache invalidated ({model or 'all models'}): {deleted} entries removed.")
+        return jsonify({"status": "success", "deleted": deleted})
+    return jsonify(completion_cache.stats())
+
+def cached_completion(payload):
+    """(digest, cached entry or None) for a chat payload; digest is None when the cache is disabled."""
+    if completion_cache is None:
+        return None, None
+    digest = payload_key(payload)
+    return digest, completion_cache.lookup(digest)
+
+def log_cache_hit(digest, cached, replay_ms, label=""):
+    saved_ms = max(0.0, cached['duration_ms'] - replay_ms)
+    app.logger.info(f"Completion cache hit{label} ({digest[:12]}): replayed {len(cached['chunks'])} chunks in {replay_ms:.1f} ms, "
+                    f"saving ~{saved_ms:.0f} ms of the original {cached['duration_ms']:.0f} ms stream.")
+
+def build_messages(prompt_template_file, wallets):
+    """The chat messages for one prompt template, plus the payload report (format, wallets sent, estimated tokens)."""
+    with open(os.path.join(PROMPTS_DIR, os.path.basename(prompt_template_file)), 'r') as f:
+        prompt_template = f.read()
+    final_prompt, report = build_prompt(prompt_template, wallets or [],
+                                        fmt=config.get('prompt_wallet_format', 'json_min'),
+                                        sig_digits=config.get('prompt_float_digits', 6),
+                                        token_budget=config.get('prompt_token_budget', 30000),
+                                        overflow=config.get('prompt_overflow', 'summarize'))
+    return [{"role": "user", "content": final_prompt}], report
+
+def log_payload_report(req_path, report):
+    metrics.add_bytes("llm.prompt", report['chars'])
+    app.logger.info(f"AI request payload saved to {os.path.basename(req_path)}: ~{report['estimated_tokens']} tokens "
+                    f"({report['chars']} chars, format '{report['format']}', {report['wallets_sent']}/{report['wallets_selected']} wallets, "
+                    f"overflow '{report['overflow_strategy']}').")
+    if report['over_budget']:
+        app.logger.warning(f"Prompt is still over the {report['token_budget']} token budget after reducing the wallets.")
+
+def selected_wallets(data):
+    """
+    The wallets a learn request is about: looked up in the session by
+    "addresses", so the page only has to send those, or taken from "wallets".
+    """
+    addresses = data.get('addresses')
+    if addresses is None:
+        return data.get('wallets')
+    snapshot = session.snapshot()
+    positions = snapshot.positions(addresses)
+    if len(positions) < len(addresses):
+        app.logger.warning(f"{len(addresses) - len(positions)} of {len(addresses)} selected addresses are not in the session.")
+    return snapshot.profiles(positions)
+
+def completion_artifact(model, content):
+    return {"id": "streamed_response", "object": "chat.completion", "created": int(datetime.now().timestamp()), "model": model, "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}]}
 
 @app.route('/api/learn-filter-stream', methods=['POST'])
 def learn_filter_stream():
     data = request.json
-    selected_wallets, model, prompt_template_file = data.get('wallets'), data.get('model'), data.get('promptTemplate')
+    wallets, model, prompt_template_file = selected_wallets(data), data.get('model'), data.get('promptTemplate')
     api_key = config.get('api_key')
     app.logger.info(f"--- STREAMING LEARN FILTER WORKFLOW STARTED ---")
     app.logger.info(f"Model: '{model}', Prompt: '{prompt_template_file}'.")
     try:
-        with open(os.path.join(PROMPTS_DIR, prompt_template_file), 'r') as f:
-            prompt_template = f.read()
+        messages, report = build_messages(prompt_template_file, wallets)
     except Exception as e:
         app.logger.error(f"CRITICAL: Could not read prompt file: {e}", exc_info=True)
         return Response(f"Error reading prompt file: {e}", status=500)
-    wallets_json_string = json.dumps(selected_wallets, indent=2)
-    final_prompt = prompt_template.replace('${wallets_json}', wallets_json_string)
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-    payload = {"model": model, "messages": [{"role": "user", "content": final_prompt}], "stream": True}
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    req_path = os.path.join(g.session_dir, f"ai_request_{ts}.json")
-    with open(req_path, 'w') as f: json.dump(payload, f, indent=2)
-    app.logger.info(f"AI request payload saved. Starting stream...")
+    payload = {"model": model, "messages": messages, "stream": True}
+    artifact_id = artifacts.new_id()
+    req_path = artifacts.write(f"ai_request_{artifact_id}", payload)
+    log_payload_report(req_path, report)
+    app.logger.info(f"Starting stream...")
+    digest, cached = cached_completion(payload)
     def generate():
         full_response_content = ""
+        timings = {}
         try:
-            response = requests.post(f"{NEBIUS_API_BASE_URL}/chat/completions", headers=headers, json=payload, stream=True, timeout=(10, 60))
-            response.raise_for_status()
-            app.logger.info("Stream opened successfully. Receiving data...")
-            for chunk in response.iter_lines():
-                if chunk:
-                    chunk_str = chunk.decode('utf-8')
-                    if chunk_str.startswith('data: '):
-                        json_str = chunk_str[6:]
-                        if json_str.strip() == '[DONE]':
-                            break
-                        try:
-                            json_data = json.loads(json_str)
-                            delta = json_data.get('choices', [{}])[0].get('delta', {})
-                            content_chunk = delta.get('content', '')
-                            if content_chunk:
-                                full_response_content += content_chunk
-                                yield f"data: {json.dumps({'token': content_chunk})}\n\n"
-                        except json.JSONDecodeError:
-                            app.logger.warning(f"Could not decode JSON from stream chunk: {json_str}")
-                            continue
-            app.logger.info("Stream finished.")
-            final_completion_artifact = {"id": "streamed_response", "object": "chat.completion", "created": int(datetime.now().timestamp()), "model": model, "choices": [{"index": 0, "message": {"role": "assistant", "content": full_response_content}, "finish_reason": "stop"}]}
-            resp_path = os.path.join(g.session_dir, f"ai_completion_{ts}.json")
-            with open(resp_path, 'w') as f: json.dump(final_completion_artifact, f, indent=2)
+            if cached is not None:
+                started = time.perf_counter()
+                for content_chunk in cached['chunks']:
+                    full_response_content += content_chunk
+                    yield f"data: {json.dumps({'token': content_chunk})}\n\n"
+                log_cache_hit(digest, cached, (time.perf_counter() - started) * 1000)
+            else:
+                chunks = []
+                for content_chunk in llm_client.stream_chat(api_key, model, messages, timings=timings):
+                    if not full_response_content:
+                        app.logger.info("Stream opened successfully. Receiving data...")
+                    full_response_content += content_chunk
+                    chunks.append(content_chunk)
+                    yield f"data: {json.dumps({'token': content_chunk})}\n\n"
+                if timings.get('bad_chunks'):
+                    app.logger.warning(f"Could not decode JSON from {timings['bad_chunks']} stream chunks.")
+                app.logger.info(f"Stream finished. Timings: {timings}")
+                metrics.record_timings("llm.chat", timings)
+                if digest is not None and chunks:
+                    completion_cache.store_completion(digest, model, chunks, timings['total_ms'])
+            resp_path = artifacts.write(f"ai_completion_{artifact_id}", completion_artifact(model, full_response_content))
             app.logger.info(f"Full completion artifact saved to {resp_path}")
         except requests.exceptions.Timeout:
-            app.logger.error("CRITICAL: AI API call timed out.")
+            app.logger.error(f"CRITICAL: AI API call timed out. Timings: {timings}")
             yield f"data: {json.dumps({'error': 'Request timed out.'})}\n\n"
         except Exception as e:
             app.logger.error(f"CRITICAL: Error during stream: {e}", exc_info=True)
             yield f"data: {json.dumps({'error': str(e)})}\n\n"
-    return Response(generate(), mimetype='text/event-stream')
+    return ai_stream_response(generate())
+
+@app.route('/api/learn-filter-fanout', methods=['POST'])
+def learn_filter_fanout():
+    """
+    Runs every model x prompt template combination concurrently and multiplexes
+    the token streams over one SSE response. The first event lists the jobs;
+    every later event carries its "job_id". Body: {"wallets" or "addresses",
+    "models", "prompts", optional "concurrency"}; concurrency is capped at the
+    llm_fanout_concurrency setting.
+    """
+    data = request.json
+    wallets, models, prompts = selected_wallets(data), data.get('models') or [], data.get('prompts') or []
+    max_concurrency = max(1, int(config.get('llm_fanout_concurrency', 4)))
+    try:
+        concurrency = int(str(data.get('concurrency') or max_concurrency))
+    except (TypeError, ValueError):
+        return jsonify({"error": "'concurrency' must be a positive integer."}), 400
+    if concurrency < 1:
+        return jsonify({"error": "'concurrency' must be a positive integer."}), 400
+    concurrency = min(concurrency, max_concurrency)
+    api_key = config.get('api_key')
+    if not models or not prompts:
+        return jsonify({"error": "At least one model and one prompt template are required."}), 400
+    app.logger.info(f"--- FAN-OUT LEARN FILTER WORKFLOW STARTED ---")
+    app.logger.info(f"{len(models)} model(s) x {len(prompts)} prompt(s), concurrency {concurrency}.")
+    try:
+        built = {prompt: build_messages(prompt, wallets) for prompt in prompts}
+    except Exception as e:
+        app.logger.error(f"CRITICAL: Could not read prompt file: {e}", exc_info=True)
+        return Response(f"Error reading prompt file: {e}", status=500)
+    jobs = plan_jobs(models, prompts)
+    for job in jobs:
+        job['messages'], report = built[job['prompt']]
+        job['artifact_id'] = artifacts.new_id(job['job_id'])
+        payload = {"model": job['model'], "messages": job['messages'], "stream": True}
+        req_path = artifacts.write(f"ai_request_{job['artifact_id']}", payload)
+        log_payload_report(req_path, report)
+        job['digest'], job['cached'] = cached_completion(payload)
+    app.logger.info(f"AI request payloads saved for {len(jobs)} jobs. Starting streams...")
+    def save_completion(job, chunks):
+        artifacts.write(f"ai_completion_{job['artifact_id']}", completion_artifact(job['model'], "".join(chunks)))
+    def generate():
+        by_id = {job['job_id']: job for job in jobs}
+        contents = {job_id: [] for job_id in by_id}
+        started = time.perf_counter()
+        yield sse({"jobs": [{"job_id": job['job_id'], "model": job['model'], "prompt": job['prompt']} for job in jobs]})
+        # Cached completions are replayed first; only the misses go to the API.
+        misses = []
+        for job in jobs:
+            if job['cached'] is None:
+                misses.append(job)
+                continue
+            replay_started = time.perf_counter()
+            yield sse({"job_id": job['job_id'], "status": "started"})
+            for chunk in job['cached']['chunks']:
+                yield sse({"job_id": job['job_id'], "token": chunk})
+            replay_ms = (time.perf_counter() - replay_started) * 1000
+            yield sse({"job_id": job['job_id'], "status": "done", "timings": {"cached": True, "total_ms": round(replay_ms, 2)}})
+            log_cache_hit(job['digest'], job['cached'], replay_ms, label=f" for job {job['job_id']}")
+            save_completion(job, job['cached']['chunks'])
+        for event in stream_fanout(misses, api_key, llm_client, concurrency) if misses else ():
+            job = by_id[event['job_id']]
+            if 'token' in event:
+                contents[job['job_id']].append(event['token'])
+            elif event['status'] == 'done':
+                save_completion(job, contents[job['job_id']])
+                if job['digest'] is not None and contents[job['job_id']]:
+                    completion_cache.store_completion(job['digest'], job['model'], contents[job['job_id']], event['timings']['total_ms'])
+                app.logger.info(f"Job {job['job_id']} ({job['model']}, {job['prompt']}) finished. Timings: {event['timings']}")
+                metrics.record_timings("llm.chat", event['timings'])
+            elif event['status'] == 'error':
+                app.logger.error(f"Job {job['job_id']} ({job['model']}, {job['prompt']}) failed: {event['error']}")
+            yield sse(event)
+        app.logger.info(f"Fan-out finished: {len(jobs)} jobs in {(time.perf_counter() - started):.2f}s.")
+        yield sse({"finished": True})
+    return ai_stream_response(generate())
 
 @app.route('/api/execute', methods=['POST'])
 def execute_code():
+    """
+    Runs a filter against the session. The matched wallets are kept as a result
+    set ("result_id") that /api/wallets can page through until a later ingest
+    replaces one of them; they are also returned inline unless the body has "inline": false.
+    """
     code_to_run = request.json.get('code')
+    job_id = request.json.get('job_id')
+    inline = inline_requested(request.json.get('inline'))
     app.logger.info(f"--- EXECUTE CODE WORKFLOW STARTED ---")
     app.logger.info(f"Code snippet to execute (first 100 chars): {code_to_run[:100].strip()}...")
-    if not session_wallets:
+    snapshot = session.snapshot()
+    if not len(snapshot):
         app.logger.error("Execution attempted but no wallets are loaded.")
         return jsonify({"error": "No wallets loaded to filter."}), 400
-    app.logger.info(f"Executing against {len(session_wallets)} loaded wallets.")
+    app.logger.info(f"Executing against {len(snapshot)} loaded wallets (session snapshot v{snapshot.version}).")
     try:
-        df = pd.DataFrame(session_wallets)
-        app.logger.info(f"Created pandas DataFrame for execution. Shape: {df.shape}")
-        local_namespace = {'pd': pd, 'df': df}
-        app.logger.info(">>> EXECUTING DYNAMIC CODE VIA EXEC()...")
-        exec(code_to_run, {}, local_namespace)
-        app.logger.info(">>> DYNAMIC CODE EXECUTION COMPLETE.")
-        app.logger.info("Attempting to retrieve 'result_df' from execution namespace...")
-        result_df = local_namespace.get('result_df')
-        if result_df is None:
-            app.logger.error("CRITICAL: 'result_df' was not found in the namespace.")
-            raise ValueError("'result_df' was not defined in the executed code.")
-        app.logger.info(f"SUCCESS: Retrieved 'result_df'. Type: {type(result_df)}, Shape: {result_df.shape}")
-        results = result_df.to_dict(orient='records')
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        results_path = os.path.join(g.session_dir, f"results_{ts}.json")
-        with open(results_path, 'w') as f: json.dump(results, f, indent=2)
-        app.logger.info(f"Execution complete. Filtered {len(results)} wallets. Saved to {results_path}")
-        return jsonify({"results": results})
+        # Runs in a filter worker: `df` keeps the nested shape existing prompts are
+        # written against, `flat_df` has one typed "category.metric" column per value.
+        outcome = get_filter_pool().run(code_to_run, snapshot, job_id=job_id, addresses_only=not inline)
+    except JobIdInUse as e:
+        return jsonify({"error": str(e)}), 409
     except Exception as e:
         app.logger.error(f"CRITICAL: Code execution failed: {e}", exc_info=True)
         return jsonify({"error": f"Code execution failed: {str(e)}"}), 500
+    timings = outcome['timings']
+    metrics.count(f"filter.{outcome['status']}")
+    metrics.record_timings("filter", timings)
+    if outcome['status'] != 'ok':
+        app.logger.error(f"CRITICAL: Filter job {outcome['job_id']} ended with status '{outcome['status']}': {outcome['error']} Timings: {timings}")
+        return jsonify({"error": outcome['error'], "status": outcome['status'], "job_id": outcome['job_id'], "timings": timings}), 500
+    results = outcome['results']
+    app.logger.info(f"SUCCESS: Filter job {outcome['job_id']} returned 'result_df' of shape {tuple(outcome['shape'])}. Timings: {timings}")
+    addresses = outcome['addresses']
+    result_id = None
+    if addresses is not None and all(isinstance(address, str) for address in addresses):
+        # A fresh id, not the client's job_id, bound to the session version the filter ran on.
+        result_id = results_query.add_result_set(addresses, snapshot.version)
+    elif not inline:
+        return jsonify({"error": "The filter result has no 'wallet_address' column to page by; run it with inline results.",
+                        "job_id": outcome['job_id'], "timings": timings}), 400
+    results_path = artifacts.write(f"results_{artifacts.new_id()}", results if results is not None else addresses)
+    app.logger.info(f"Execution complete. Filtered {outcome['shape'][0]} wallets. Saved to {results_path}")
+    response = {"result_id": result_id, "count": outcome['shape'][0], "version": snapshot.version,
+                "job_id": outcome['job_id'], "timings": timings}
+    if inline:
+        response['results'] = results
+    return jsonify(response)
+
+@app.route('/api/execute-batch', methods=['POST'])
+def execute_batch():
+    codes = request.json.get('codes') or []
+    job_id = request.json.get('job_id')
+    app.logger.info(f"--- BATCH EXECUTE WORKFLOW STARTED: {len(codes)} filters ---")
+    if not codes or not all(isinstance(code, str) for code in codes):
+        return jsonify({"error": "'codes' must be a non-empty list of code strings."}), 400
+    snapshot = session.snapshot()
+    if not len(snapshot):
+        app.logger.error("Batch execution attempted but no wallets are loaded.")
+        return jsonify({"error": "No wallets loaded to filter."}), 400
+    try:
+        outcome = get_filter_pool().run_batch(codes, snapshot, job_id=job_id)
+    except JobIdInUse as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        app.logger.error(f"CRITICAL: Batch execution failed: {e}", exc_info=True)
+        return jsonify({"error": f"Batch execution failed: {str(e)}"}), 500
+    for entry in outcome['filters']:
+        if entry['status'] != 'ok':
+            app.logger.warning(f"Filter {entry['index']} ({entry['source_hash'][:12]}) ended with status '{entry['status']}': {entry['error']}")
+    for entry in outcome['filters']:
+        metrics.count(f"filter.{entry['status']}")
+        metrics.record_timings("filter", entry['timings'])
+    metrics.record_timings("filter_batch", outcome['timings'])
+    passed = sum(entry['status'] == 'ok' for entry in outcome['filters'])
+    results_path = artifacts.write(f"batch_results_{artifacts.new_id()}", outcome)
+    app.logger.info(f"Batch execution complete against {len(snapshot)} wallets (session snapshot v{snapshot.version}): "
+                    f"{passed}/{len(codes)} filters ran. Timings: {outcome['timings']}. Saved to {results_path}")
+    return jsonify(outcome)
+
+@app.route('/api/wallets', methods=['GET'])
+def query_wallets():
+    """
+    One page of the session's wallets, or of a filter's result set (?result=<result_id>).
+    Query: cursor (from the previous page's "next_cursor"), limit, sort (any
+    "category.metric" column), order (asc|desc), fields (comma-separated
+    columns or categories) and format (records|compact). Gzipped on request.
+    """
+    args = request.args
+    fields = [field for field in args.get('fields', '').split(',') if field] or None
+    try:
+        page = results_query.query(session.snapshot(), cursor=args.get('cursor'),
+                                   limit=args.get('limit', DEFAULT_LIMIT, type=int), sort=args.get('sort') or None,
+                                   order=args.get('order', 'asc'), fields=fields, result_id=args.get('result') or None,
+                                   fmt=args.get('format', 'records'))
+    except StaleCursor as e:
+        return jsonify({"error": str(e)}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return json_response(page)
+
+@app.route('/api/wallets/columns', methods=['GET'])
+def wallet_columns():
+    """The columns /api/wallets can sort on and project."""
+    snapshot = session.snapshot()
+    return jsonify({"version": snapshot.version, "total": len(snapshot), "columns": results_query.columns(snapshot)})
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Stage latencies, bytes and counters: JSON by default, Prometheus text with ?format=prometheus."""
+    if request.args.get('format') == 'prometheus':
+        return Response(metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+    return jsonify(metrics.snapshot())
+
+@app.route('/api/execute/<job_id>/cancel', methods=['POST'])
+def cancel_execution(job_id):
+    cancelled = filter_pool is not None and filter_pool.cancel(job_id)
+    if not cancelled and FILTER_JOBS_DIR is not None:
+        cancelled = signal_cancel(FILTER_JOBS_DIR, job_id)
+    if not cancelled:
+        return jsonify({"error": f"No running filter job '{job_id}'."}), 404
+    app.logger.info(f"Cancellation requested for filter job {job_id}.")
+    return jsonify({"status": "success"})
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
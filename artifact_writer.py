@@ -0,0 +1,112 @@
+import gzip
+import itertools
+import json
+import os
+import queue
+import threading
+from datetime import datetime
+
+from metrics import metrics
+
+def _write_json(data, path):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+def _write_json_min(data, path):
+    with open(path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+
+def _ndjson_lines(data):
+    for item in (data if isinstance(data, list) else [data]):
+        yield json.dumps(item, separators=(',', ':')) + "\n"
+
+def _write_ndjson(data, path):
+    with open(path, 'w') as f:
+        f.writelines(_ndjson_lines(data))
+
+def _write_ndjson_gz(data, path):
+    with gzip.open(path, 'wt', compresslevel=5) as f:
+        f.writelines(_ndjson_lines(data))
+
+# name -> (file extension, writer(data, file path)).
+ENCODINGS = {
+    "json": (".json", _write_json),
+    "json_min": (".json", _write_json_min),
+    "ndjson": (".ndjson", _write_ndjson),
+    "ndjson.gz": (".ndjson.gz", _write_ndjson_gz),
+}
+
+_STOP = object()
+
+class ArtifactWriter:
+    """
+    Writes session artifacts on a background thread so request handlers only pay
+    for queueing them. `write` returns the final path at once; the file appears
+    there atomically (written to a temp name, then renamed). The queue holds at
+    most `max_pending` artifacts; beyond that `write` blocks until the writer
+    catches up. List artifacts written as NDJSON get one line per item.
+    The writer takes ownership of the data: do not mutate it after queueing.
+    Processes writing to one directory pass a `worker` id to keep ids unique.
+    """
+
+    def __init__(self, directory, encoding="json", max_pending=64, logger=None, worker=None):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown artifact encoding '{encoding}'. Choose one of: {', '.join(ENCODINGS)}.")
+        self.directory = directory
+        self.encoding = encoding
+        self.logger = logger
+        self.worker = worker
+        self.written = 0
+        self.failed = 0
+        self._ids = itertools.count(1)
+        self._ids_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='artifact-writer', daemon=True)
+        self._thread.start()
+
+    def new_id(self, suffix=None):
+        """A unique artifact id, increasing within the process: "{timestamp}[_{worker}]_{sequence}[_{suffix}]"."""
+        with self._ids_lock:
+            sequence = next(self._ids)
+        worker = f"_{self.worker}" if self.worker else ""
+        artifact_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}{worker}_{sequence:06d}"
+        return f"{artifact_id}_{suffix}" if suffix else artifact_id
+
+    def write(self, name, data, encoding=None):
+        """Queues `data` to be written as `name` plus the encoding's extension. Returns the final path."""
+        if self._closed:
+            raise RuntimeError("ArtifactWriter is closed.")
+        extension, _ = ENCODINGS[encoding or self.encoding]
+        path = os.path.join(self.directory, f"{name}{extension}")
+        self._queue.put((path, data, encoding or self.encoding))
+        return path
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                path, data, encoding = item
+                tmp_path = f"{path}.tmp"
+                try:
+                    with metrics.timer("artifact.write"):
+                        ENCODINGS[encoding][1](data, tmp_path)
+                        os.replace(tmp_path, path)
+                    metrics.add_bytes("artifact.write", os.path.getsize(path))
+                    self.written += 1
+                except Exception as e:
+                    self.failed += 1
+                    if self.logger:
+                        self.logger.error(f"Could not write artifact {os.path.basename(path)}: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    def close(self):
+        """Writes what is queued, then stops the writer thread. Registered with atexit by the app."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
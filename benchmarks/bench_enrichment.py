@@ -0,0 +1,76 @@
+"""
+Checks that the batch enrichment engine matches create_enriched_profile, then
+times both on a synthetic wallet set.
+
+    python -m benchmarks.bench_enrichment --wallets 10000 --trades 60
+"""
+import argparse
+import math
+import random
+import sys
+import time
+
+from enrichment import enrich_profiles
+from parser import create_enriched_profile
+from benchmarks.synthetic import edge_case_wallets, raw_wallets
+
+def _same(a, b, path=""):
+    """Yields the paths where two profiles differ beyond floating-point noise."""
+    if isinstance(a, dict) and isinstance(b, dict):
+        if list(a) != list(b):
+            yield f"{path}: keys {list(a)} != {list(b)}"
+            return
+        for key in a:
+            yield from _same(a[key], b[key], f"{path}.{key}")
+    elif isinstance(a, (int, float)) and isinstance(b, (int, float)) and not isinstance(a, bool):
+        if not math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9):
+            yield f"{path}: {a!r} != {b!r}"
+    elif a != b:
+        yield f"{path}: {a!r} != {b!r}"
+
+def scalar_outcomes(raws):
+    outcomes = []
+    for raw in raws:
+        try:
+            outcomes.append((create_enriched_profile(raw), None))
+        except Exception as e:
+            outcomes.append((None, e))
+    return outcomes
+
+def check_equivalence(raws):
+    """Returns a list of human-readable mismatches between the two engines."""
+    mismatches = []
+    for i, ((expected, expected_error), (actual, actual_error)) in enumerate(zip(scalar_outcomes(raws), enrich_profiles(raws))):
+        if type(expected_error) is not type(actual_error):
+            mismatches.append(f"wallet {i}: error {expected_error!r} != {actual_error!r}")
+        elif expected is not None:
+            mismatches.extend(f"wallet {i}{diff}" for diff in _same(expected, actual))
+    return mismatches
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--wallets", type=int, default=2000)
+    ap.add_argument("--trades", type=int, default=60)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    raws = edge_case_wallets(random.Random(args.seed)) + raw_wallets(args.wallets, args.trades, seed=args.seed)
+    mismatches = check_equivalence(raws)
+    if mismatches:
+        print(f"MISMATCH in {len(mismatches)} metric(s):")
+        print("\n".join(mismatches[:20]))
+        return 1
+    print(f"Equivalence OK on {len(raws)} wallets.")
+
+    started = time.perf_counter()
+    scalar_outcomes(raws)
+    scalar_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    enrich_profiles(raws)
+    batch_seconds = time.perf_counter() - started
+    print(f"create_enriched_profile: {scalar_seconds:8.3f} s")
+    print(f"enrich_profiles:         {batch_seconds:8.3f} s  ({scalar_seconds / batch_seconds:.1f}x)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Runs the pooled LLM client against the local stub API: checks that streams and
+model listings survive injected 503s through retries, then compares per-call
+latency and connection count with unpooled requests.get calls.
+
+    python -m benchmarks.bench_llm_client --calls 200
+"""
+import argparse
+import statistics
+import sys
+import time
+
+import requests
+
+from llm_client import LLMClient
+from benchmarks.stub_llm_server import REPLY, start_stub_server
+
+def _summary(values):
+    values = sorted(values)
+    return f"p50 {statistics.median(values):7.2f} ms  p95 {values[int(len(values) * 0.95) - 1]:7.2f} ms"
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--calls", type=int, default=200)
+    args = ap.parse_args(argv)
+
+    server, base_url = start_stub_server(fail_every=2)
+    client = LLMClient(base_url, backoff_base=0.01)
+    streamed = "".join(client.stream_chat("key", "stub/fast-model", [{"role": "user", "content": "hi"}]))
+    model_ids, timings = client.list_models("key")
+    if streamed != REPLY or not model_ids:
+        print("MISMATCH: the client did not recover from injected failures.")
+        return 1
+    retried = sum(call["attempts"] > 1 for call in client.recent_calls())
+    print(f"Retries OK: {server.state.requests} stub requests for 2 calls, {retried} call(s) retried.")
+    client.close()
+    server.shutdown()
+
+    server, base_url = start_stub_server()
+    unpooled = []
+    for _ in range(args.calls):
+        started = time.perf_counter()
+        requests.get(f"{base_url}/models", headers={"Authorization": "Bearer key"}, timeout=10).raise_for_status()
+        unpooled.append((time.perf_counter() - started) * 1000)
+    unpooled_connections = len(server.state.connections)
+
+    server.state.connections.clear()
+    client = LLMClient(base_url)
+    pooled = []
+    for _ in range(args.calls):
+        _, timings = client.list_models("key")
+        pooled.append(timings["total_ms"])
+    ttft = []
+    for _ in range(args.calls // 10):
+        timings = {}
+        for _ in client.stream_chat("key", "stub/fast-model", [{"role": "user", "content": "hi"}], timings=timings):
+            pass
+        ttft.append(timings["ttft_ms"])
+    print(f"requests.get per call: {_summary(unpooled)}  ({unpooled_connections} connections)")
+    print(f"LLMClient (pooled):    {_summary(pooled)}  ({len(server.state.connections)} connections)")
+    print(f"stream time to first token: {_summary(ttft)}")
+    client.close()
+    server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Writes a large synthetic workbook, checks that every available reader backend
+parses it to the same profiles as the pandas reader, then times each backend.
+
+    python -m benchmarks.bench_readers --sheets 200 --trades 150
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from parser import parse_workbook
+from readers import READERS, resolve_reader
+from benchmarks.bench_enrichment import _same
+from benchmarks.synthetic import write_workbook
+
+def available_readers():
+    names = []
+    for name in READERS:
+        try:
+            names.append(resolve_reader(name))
+        except ValueError as e:
+            print(f"{name:9s} skipped: {e}")
+    return names
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sheets", type=int, default=200)
+    ap.add_argument("--trades", type=int, default=150)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_workbook(os.path.join(tmp, "bench.xlsx"), args.sheets, args.trades, seed=args.seed)
+        print(f"Workbook: {args.sheets} sheets, {os.path.getsize(path) / 1e6:.1f} MB")
+
+        timings, expected = {}, None
+        for name in available_readers():
+            best = float("inf")
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                profiles = parse_workbook(path, reader=name)
+                best = min(best, time.perf_counter() - started)
+            if expected is None:
+                expected = profiles
+            mismatches = list(_same(expected, profiles))
+            if mismatches:
+                print(f"MISMATCH between pandas and {name} in {len(mismatches)} value(s):")
+                print("\n".join(mismatches[:20]))
+                return 1
+            timings[name] = best
+
+    baseline = timings["pandas"]
+    for name, seconds in timings.items():
+        print(f"{name:9s} {seconds:8.3f} s  {seconds / args.sheets * 1e3:7.2f} ms/sheet  ({baseline / seconds:.1f}x)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""
+Checks that the column-typed sheet parser reproduces the original row-by-row
+parser exactly, then reports the per-trade-row cost of both.
+
+    python -m benchmarks.bench_sanitize --sheets 200 --trades 200
+"""
+import argparse
+import random
+import sys
+import time
+
+from parser import parse_sheet_to_raw_data
+from benchmarks import reference
+from benchmarks.synthetic import sheet_frame, sheet_rows
+
+def _time(fn, frames):
+    started = time.perf_counter()
+    for frame in frames:
+        fn(frame)
+    return time.perf_counter() - started
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sheets", type=int, default=200)
+    ap.add_argument("--trades", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    frames = [sheet_frame(sheet_rows(rng, args.trades, noisy=i % 2 == 0)) for i in range(args.sheets)]
+    for i, frame in enumerate(frames):
+        if parse_sheet_to_raw_data(frame) != reference.parse_sheet_to_raw_data(frame):
+            print(f"MISMATCH on sheet {i}")
+            return 1
+    print(f"Identical output on {len(frames)} sheets.")
+
+    rows = args.sheets * args.trades
+    before = _time(reference.parse_sheet_to_raw_data, frames)
+    after = _time(parse_sheet_to_raw_data, frames)
+    print(f"row-by-row:   {before * 1e6 / rows:7.2f} us/row")
+    print(f"column-typed: {after * 1e6 / rows:7.2f} us/row  ({before / after:.1f}x)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Frozen copy of the original row-by-row sheet parser, kept as the reference the
+column-typed path in parser.py must reproduce exactly.
+"""
+import re
+
+import pandas as pd
+
+def sanitize(raw: str):
+    """Clean a raw spreadsheet cell string into number, dict, or original."""
+    if raw is None:
+        return None
+    raw = str(raw).strip()
+    if raw in ("", "N/A", "-"):
+        return None
+    if raw.endswith("%"):
+        try:
+            return float(raw[:-1])
+        except ValueError:
+            return raw
+    m = re.match(r"^([+-]?\d+(\.\d+)?)\s*(SOL|USDC)$", raw, re.IGNORECASE)
+    if m:
+        return {"value": float(m.group(1)), "currency": m.group(3).upper()}
+    m = re.match(r"^([+-]?\d+(\.\d+)?)\s*(sec|min|h|day)s?$", raw, re.IGNORECASE)
+    if m:
+        v = float(m.group(1))
+        unit = m.group(3).lower()
+        factors = {"sec": 1, "min": 60, "h": 3600, "day": 86400}
+        return v * factors[unit]
+    if re.match(r"^[\d,]+\.\d+$", raw) or re.match(r"^[\d,]+$", raw):
+        try:
+            return float(raw.replace(",", ""))
+        except ValueError:
+            return raw
+    try:
+        return float(raw)
+    except ValueError:
+        return raw
+
+def parse_si(s: str):
+    """Convert SI suffixes K/M/B into floats."""
+    if s is None:
+        return None
+    s = str(s).strip().upper()
+    m = re.match(r"^([+-]?\d+(\.\d+)?)([KMB])$", s)
+    if m:
+        num = float(m.group(1))
+        suf = m.group(3)
+        mult = {"K": 1e3, "M": 1e6, "B": 1e9}[suf]
+        return num * mult
+    try:
+        return float(s)
+    except (ValueError, TypeError):
+        return None
+
+def parse_sheet_to_raw_data(df: pd.DataFrame):
+    """Parse one sheet into a raw structure for later processing."""
+    data = df.fillna("").astype(str).values.tolist()
+    max_row = len(data)
+    
+    wallet_info = {}
+    anchor_row = next((i for i, row in enumerate(data) if str(row[0]).strip().lower().startswith("wallet")), 0)
+    for r in (anchor_row, anchor_row + 2):
+        if r + 1 >= max_row: continue
+        for c, raw_h in enumerate(data[r]):
+            h = str(raw_h).strip()
+            if not h: continue
+            val = data[r + 1][c]
+            if h.lower() != "balance":
+                 wallet_info[h] = sanitize(val)
+
+    token_anchor_row = next((i for i, row in enumerate(data) if str(row[0]).strip().lower() == "token"), -1)
+    trades = []
+    daily_pnl = {}
+    if token_anchor_row != -1:
+        headers = [str(h).strip() for h in data[token_anchor_row]]
+        spl_col_idx = headers.index("SPL Income") if "SPL Income" in headers else -1
+        mcap_col_idx = headers.index("MCAP 1st Buy / Last Tx / Now") if "MCAP 1st Buy / Last Tx / Now" in headers else -1
+        
+        current_date = None
+        for r in range(token_anchor_row + 1, max_row):
+            row_str = str(data[r][0]).strip()
+            if row_str.lower().startswith("related wallets"): break
+            
+            m = re.match(r"(\d{2}\.\d{2}\.\d{4}):", row_str)
+            if m:
+                current_date = pd.to_datetime(m.group(1), dayfirst=True).date().isoformat()
+                daily_pnl.setdefault(current_date, 0.0)
+            
+            if spl_col_idx == -1 or not data[r][spl_col_idx].strip(): continue
+
+            trade = {}
+            for c, h in enumerate(headers):
+                raw = data[r][c]
+                if c == mcap_col_idx:
+                    parts = str(raw).strip().split()
+                    trade["market_cap"] = {
+                        "on_first_buy": parse_si(parts[0]) if len(parts) > 0 else None,
+                        "on_last_tx": parse_si(parts[1]) if len(parts) > 1 else None,
+                        "now": parse_si(parts[2]) if len(parts) > 2 else None,
+                    }
+                else:
+                    trade[h] = sanitize(raw)
+            
+            if current_date and isinstance(trade.get('Delta Sol'), dict):
+                daily_pnl[current_date] += trade['Delta Sol'].get('value', 0.0)
+            trades.append(trade)
+
+    return { "wallet_info": wallet_info, "trades": trades, "daily_pnl": daily_pnl }
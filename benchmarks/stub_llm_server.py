@@ -0,0 +1,114 @@
+"""
+A local stand-in for the OpenAI-compatible API: GET /models and streaming
+POST /chat/completions, with optional latency and injected 429/5xx failures.
+Point "llm_base_url" in config.json at it to run the app without the real API.
+
+    python -m benchmarks.stub_llm_server --port 8765 --fail-every 3
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODELS = ["stub/fast-model", "stub/slow-model"]
+REPLY = "result_df = df[df['performance_and_risk'].apply(lambda x: x['pnl_sol']) > 10]"
+
+class StubState:
+    def __init__(self, latency=0.0, token_delay=0.0, fail_every=0, fail_status=503):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.fail_every = fail_every
+        self.fail_status = fail_status
+        self.requests = 0
+        self.connections = set()
+        self.lock = threading.Lock()
+
+    def should_fail(self):
+        with self.lock:
+            self.requests += 1
+            return self.fail_every and self.requests % self.fail_every == 0
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so client pooling is observable
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _start(self):
+        """Common request handling. Returns False if a failure was injected."""
+        state = self.server.state
+        with state.lock:
+            state.connections.add(self.client_address)
+        if self.headers.get("Content-Length"):
+            self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(state.latency)
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            self._reply(401, {"error": "missing api key"})
+            return False
+        if state.should_fail():
+            self._reply(state.fail_status, {"error": "injected failure"})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self.path.endswith("/models"):
+            return self._reply(404, {"error": "not found"})
+        if self._start():
+            self._reply(200, {"object": "list", "data": [{"id": model, "object": "model"} for model in MODELS]})
+
+    def _chunk(self, data):
+        line = f"data: {data}\n\n".encode()
+        self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            return self._reply(404, {"error": "not found"})
+        if not self._start():
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i in range(0, len(REPLY), 8):
+            time.sleep(self.server.state.token_delay)
+            self._chunk(json.dumps({"choices": [{"index": 0, "delta": {"content": REPLY[i:i + 8]}}]}))
+        self._chunk("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+def start_stub_server(port=0, **options):
+    """Starts the stub on a background thread. Returns (server, base_url); call server.shutdown() to stop."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    server.state = StubState(**options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds before each response")
+    ap.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    ap.add_argument("--fail-every", type=int, default=0, help="answer every Nth request with --fail-status")
+    ap.add_argument("--fail-status", type=int, default=503)
+    args = ap.parse_args(argv)
+    server, base_url = start_stub_server(args.port, latency=args.latency, token_delay=args.token_delay,
+                                         fail_every=args.fail_every, fail_status=args.fail_status)
+    print(f"Stub API listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+The benchmark suite: times parse_workbook, create_enriched_profile (and the
+batch enrichment engine), reloading a saved session snapshot, and the
+/api/parse-files and /api/execute endpoints end to end on synthetic
+wallet-report workbooks, then compares the results with a stored baseline.
+
+    python -m benchmarks.suite                          # "default" scale, compare with baselines/default.json
+    python -m benchmarks.suite --scale large
+    python -m benchmarks.suite --sheets 10000 --trades 10 --only parse
+    python -m benchmarks.suite --save-baseline default  # record the current numbers
+
+Workbooks are generated once into benchmarks/corpus/ and reused. Timings are
+the best of --repeat runs (median for per-request latencies). Each run also
+times a fixed calibration workload, and baseline timings are scaled by how
+much faster or slower this machine runs it than the one that recorded them; a
+benchmark more than --tolerance slower than its scaled baseline fails the run.
+"""
+import argparse
+import atexit
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from enrichment import enrich_profiles
+from parser import create_enriched_profile, parse_workbook
+from session_store import SessionStore
+from benchmarks.synthetic import cached_workbook, raw_wallets
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINES_DIR = os.path.join(HERE, "baselines")
+CORPUS_DIR = os.path.join(HERE, "corpus")
+
+# name -> (sheets, trades per sheet); sheets scale 1..10k, trades 10..100k.
+SCALES = {
+    "smoke": (5, 50),
+    "default": (200, 150),
+    "large": (2000, 300),
+    "wide": (10000, 10),
+    "deep": (10, 100000),
+}
+BENCHMARKS = ("parse", "enrich", "restore", "api")
+EXECUTE_CODE = "result_df = flat_df[(flat_df['performance_and_risk.pnl_sol'] > 0) & (flat_df['timing_and_frequency.total_trades'] > 20)]"
+
+def _best(fn, repeat):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def bench_parse(path, n_sheets, repeat, reader):
+    seconds, profiles = _best(lambda: parse_workbook(path, reader=reader), repeat)
+    return {"seconds": round(seconds, 4), "ms_per_sheet": round(seconds * 1000 / n_sheets, 3), "wallets": len(profiles)}
+
+def bench_enrich(n_wallets, n_trades, repeat, seed):
+    raws = raw_wallets(n_wallets, n_trades, seed=seed)
+    scalar, _ = _best(lambda: [create_enriched_profile(raw) for raw in raws], repeat)
+    batch, _ = _best(lambda: enrich_profiles(raws), repeat)
+    return {"create_enriched_profile_seconds": round(scalar, 4), "enrich_profiles_seconds": round(batch, 4),
+            "wallets": n_wallets}
+
+def bench_restore(n_wallets, n_trades, repeat, seed):
+    """
+    Saves a session of n_wallets enriched profiles, then times SessionStore.load
+    against rebuilding it with replace(). One wallet carries a raw string where
+    its ROI would be, as sanitize() leaves odd cells, and the restored session
+    must give back exactly the profiles that were saved.
+    """
+    profiles = [profile for profile, _ in enrich_profiles(raw_wallets(n_wallets, n_trades, seed=seed))]
+    profiles[0]["performance_and_risk"]["roi_percent"] = "n/a"
+    store = SessionStore()
+    rebuild, _ = _best(lambda: store.replace(profiles), repeat)
+    with tempfile.TemporaryDirectory() as directory:
+        # A fresh directory each time: save() skips a version the directory already holds.
+        save, path = _best(lambda: _saved(store, tempfile.mkdtemp(dir=directory)), repeat)
+        load, restored = _best(lambda: _loaded(path), repeat)
+        if restored.snapshot().profiles() != store.snapshot().profiles():
+            raise RuntimeError("The restored session differs from the one saved.")
+    return {"save_seconds": round(save, 4), "load_seconds": round(load, 4), "rebuild_seconds": round(rebuild, 4),
+            "wallets": n_wallets}
+
+def _saved(store, path):
+    store.save(path)
+    return path
+
+def _loaded(path):
+    store = SessionStore()
+    store.load(path)
+    return store
+
+def bench_api(path, repeat, executes):
+    """
+    Runs the Flask app in-process. The app writes config.json, LOGS/ and CACHE/
+    relative to the cwd until it exits, so this moves into a scratch directory
+    for the rest of the run and removes it at exit; run it last.
+    """
+    scratch = tempfile.mkdtemp(prefix="alpha_sieve_bench_")
+    atexit.register(shutil.rmtree, scratch, True)  # registered before the app's handlers, so it runs after them
+    os.chdir(scratch)
+    with open("config.json", "w") as f:
+        json.dump({"api_key": "", "starred_models": [], "all_models": [], "selected_model": "",
+                   "parse_cache_enabled": False, "completion_cache_enabled": False, "session_restore": False}, f)
+    import app as app_module
+    client = app_module.app.test_client()
+
+    def upload():
+        with open(path, "rb") as f:
+            response = client.post("/api/parse-files", data={"files": (f, os.path.basename(path))},
+                                   content_type="multipart/form-data")
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/parse-files failed: {response.get_json()}")
+        return response.get_json()
+
+    parse_seconds, parsed = _best(upload, repeat)
+    latencies = []
+    for i in range(executes + 1):
+        started = time.perf_counter()
+        response = client.post("/api/execute", json={"code": EXECUTE_CODE})
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/execute failed: {response.get_json()}")
+        if i:  # the first run waits for the filter workers to start
+            latencies.append(elapsed)
+    matched = len(response.get_json()["results"])
+    return {"parse_files_seconds": round(parse_seconds, 4), "execute_p50_ms": round(statistics.median(latencies) * 1000, 2),
+            "execute_max_ms": round(max(latencies) * 1000, 2), "wallets": len(parsed["wallets"]), "matched": matched}
+
+def calibrate(repeat=5):
+    """
+    Seconds this machine takes for a fixed mix of interpreter, JSON and pandas
+    work, roughly the kind the benchmarks do. Comparing it across machines lets
+    a baseline recorded elsewhere be scaled to this one.
+    """
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({"key": rng.integers(0, 100, 200_000), "value": rng.normal(size=200_000)})
+    records = [{"token": f"TOK{i % 40}", "delta": i * 0.5, "tags": [i, str(i)]} for i in range(20_000)]
+
+    def workload():
+        total = sum(len(json.loads(json.dumps(record))) for record in records)
+        total += sum(i * i % 7 for i in range(300_000))
+        return total, frame.groupby("key")["value"].agg(["sum", "std"]), frame[frame["value"] > 0].sort_values("value")
+
+    seconds, _ = _best(workload, repeat)
+    return round(seconds, 4)
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {"python": platform.python_version(), "pandas": pd.__version__, "machine": platform.machine(),
+            "cpus": os.cpu_count(), "commit": commit or None}
+
+# Lower is better for these; the rest are context.
+TIMED_KEYS = ("seconds", "ms_per_sheet", "create_enriched_profile_seconds", "enrich_profiles_seconds",
+              "load_seconds", "parse_files_seconds", "execute_p50_ms")
+
+def compare(results, baseline, tolerance):
+    """
+    Prints each timing against the baseline, scaled by the two runs' calibration
+    times. Returns the names of those that regressed beyond `tolerance`.
+    """
+    regressions = []
+    if baseline["params"] != results["params"]:
+        print(f"Baseline was recorded with {baseline['params']}, not {results['params']}; comparing anyway.")
+    speed = 1.0
+    if baseline.get("calibration_seconds"):
+        speed = results["calibration_seconds"] / baseline["calibration_seconds"]
+        print(f"  calibration {baseline['calibration_seconds']:.3f} -> {results['calibration_seconds']:.3f} s; "
+              f"baseline timings scaled by {speed:.2f}")
+    for bench, values in results["benchmarks"].items():
+        for key, value in values.items():
+            before = baseline["benchmarks"].get(bench, {}).get(key)
+            if key not in TIMED_KEYS or not before:
+                continue
+            before *= speed
+            change = value / before - 1
+            flag = "REGRESSION" if change > tolerance else ""
+            print(f"  {bench}.{key:34s} {before:10.3f} -> {value:10.3f}  {change:+7.1%} {flag}")
+            if flag:
+                regressions.append(f"{bench}.{key}")
+    return regressions
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scale", choices=SCALES, default="default")
+    ap.add_argument("--sheets", type=int, help="overrides the scale's sheet count (1..10000)")
+    ap.add_argument("--trades", type=int, help="overrides the scale's trades per sheet (10..100000)")
+    ap.add_argument("--only", choices=BENCHMARKS, action="append", help="run only these benchmarks (repeatable)")
+    ap.add_argument("--reader", default="auto", help="workbook reader backend for parse_workbook")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--executes", type=int, default=20, help="/api/execute requests to time")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--baseline", help="baseline name to compare with (default: the scale name)")
+    ap.add_argument("--save-baseline", metavar="NAME", help="store the results as baselines/NAME.json")
+    ap.add_argument("--tolerance", type=float, default=0.5,
+                    help="allowed slowdown against the calibrated baseline before a regression is reported")
+    ap.add_argument("--output", help="also write the results JSON here")
+    args = ap.parse_args(argv)
+    output = os.path.abspath(args.output) if args.output else None
+
+    n_sheets, n_trades = SCALES[args.scale]
+    n_sheets, n_trades = args.sheets or n_sheets, args.trades or n_trades
+    selected = args.only or BENCHMARKS
+    started = time.perf_counter()
+    path = None
+    if {"parse", "api"} & set(selected):  # the others generate their wallets in memory
+        path = cached_workbook(CORPUS_DIR, n_sheets, n_trades, seed=args.seed)
+        print(f"Workbook: {n_sheets} sheets x ~{n_trades} trades, {os.path.getsize(path) / 1e6:.1f} MB "
+              f"(ready in {time.perf_counter() - started:.1f} s)")
+
+    results = {"params": {"sheets": n_sheets, "trades": n_trades, "seed": args.seed, "reader": args.reader},
+               "environment": environment(), "calibration_seconds": calibrate(), "benchmarks": {}}
+    if "parse" in selected:
+        results["benchmarks"]["parse"] = bench_parse(path, n_sheets, args.repeat, args.reader)
+        print(f"parse_workbook:  {results['benchmarks']['parse']}")
+    if "enrich" in selected:
+        results["benchmarks"]["enrich"] = bench_enrich(n_sheets, n_trades, args.repeat, args.seed)
+        print(f"enrichment:      {results['benchmarks']['enrich']}")
+    if "restore" in selected:
+        results["benchmarks"]["restore"] = bench_restore(n_sheets, n_trades, args.repeat, args.seed)
+        print(f"session restore: {results['benchmarks']['restore']}")
+    if "api" in selected:
+        results["benchmarks"]["api"] = bench_api(path, args.repeat, args.executes)
+        print(f"api end to end:  {results['benchmarks']['api']}")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        baseline_path = os.path.join(BASELINES_DIR, f"{args.save_baseline}.json")
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+        return 0
+
+    baseline_path = os.path.join(BASELINES_DIR, f"{args.baseline or args.scale}.json")
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}; run with --save-baseline to record one.")
+        return 0
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"Compared with baselines/{os.path.basename(baseline_path)} (commit {baseline['environment'].get('commit')}):")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    print("No regressions.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+import os
+import random
+import re
+import string
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+PLATFORMS = ["Raydium", "Pump", "Jupiter", "Meteora", None]
+
+def wallet_address(rng):
+    return "".join(rng.choice(string.ascii_letters + string.digits) for _ in range(44))
+
+def sol(value):
+    return {"value": value, "currency": "SOL"}
+
+def raw_wallet(rng, n_trades, n_tokens=30):
+    """One wallet in the raw structure parse_sheet_to_raw_data produces."""
+    trades, daily_pnl = [], {}
+    for t in range(n_trades):
+        if t % 7 == 0:
+            current_date = f"2024-03-{t // 7 % 28 + 1:02d}"
+            daily_pnl.setdefault(current_date, 0.0)
+        delta = round(rng.uniform(-5, 15), 3)
+        trades.append({
+            "Token": f"TOK{rng.randrange(n_tokens)}",
+            "1st Buy On": rng.choice(PLATFORMS),
+            "Spent Sol": sol(round(rng.uniform(0.1, 10), 3)),
+            "Delta Sol": sol(delta),
+            "Delta %": rng.choice([round(rng.uniform(-100, 400), 1), -100.0, None]),
+            "SPL Income": float(rng.randrange(1_000_000)),
+            "market_cap": {
+                "on_first_buy": rng.choice([rng.uniform(1e3, 9e5), None]),
+                "on_last_tx": rng.uniform(1e6, 9e8),
+                "now": rng.uniform(1e9, 9e9),
+            },
+            "Duration": rng.choice([float(rng.randrange(1, 59) * rng.choice([1, 60, 3600, 86400])), None]),
+        })
+        daily_pnl[current_date] += delta
+    return {
+        "wallet_info": {
+            "Wallet": wallet_address(rng),
+            "PnL": sol(round(rng.uniform(-50, 200), 2)),
+            "ROI": round(rng.uniform(-90, 500), 1),
+            "WinRate": round(rng.uniform(0, 100), 1),
+            "Tokens": float(n_trades),
+            "Trades Period": float(rng.randrange(1, 90) * 86400),
+            "Total Fees": sol(round(rng.uniform(0.1, 5), 3)),
+        },
+        "trades": trades,
+        "daily_pnl": daily_pnl,
+    }
+
+def edge_case_wallets(rng):
+    """Raw wallets that exercise the corners of create_enriched_profile."""
+    constant = raw_wallet(rng, 5)
+    for trade in constant['trades']:
+        trade['Delta Sol'] = sol(0.1)
+        trade['Spent Sol'] = sol(0.1)
+    missing_keys = raw_wallet(rng, 4)
+    for trade in missing_keys['trades']:
+        del trade['Delta Sol']
+        del trade['Token']
+    return [
+        raw_wallet(rng, 0),
+        raw_wallet(rng, 1),
+        raw_wallet(rng, 2),
+        raw_wallet(rng, 3),
+        constant,
+        missing_keys,
+        {"wallet_info": {"Wallet": wallet_address(rng)}, "trades": [], "daily_pnl": {}},
+        # Cells the columnar path cannot represent; both paths must agree, errors included.
+        {**raw_wallet(rng, 3), "trades": [{"Delta Sol": None}]},
+        {**raw_wallet(rng, 3), "trades": [{"Delta Sol": sol(1.0), "Duration": "3 weeks"}]},
+        {**raw_wallet(rng, 3), "trades": [{"Delta Sol": sol(1.0), "Delta %": "n/a"}]},
+        {**raw_wallet(rng, 3), "wallet_info": {"Wallet": "x", "PnL": None}},
+    ]
+
+def raw_wallets(n_wallets, n_trades, seed=0):
+    """`n_wallets` raw wallets with around `n_trades` trades each."""
+    rng = random.Random(seed)
+    return [raw_wallet(rng, rng.randint(max(1, n_trades // 2), n_trades * 3 // 2 + 1)) for _ in range(n_wallets)]
+
+# --- Sheet layout ---
+
+TOKEN_HEADERS = ["Token", "1st Buy On", "Spent Sol", "Delta Sol", "Delta %", "SPL Income",
+                 "MCAP 1st Buy / Last Tx / Now", "Duration"]
+
+# Cells real reports occasionally carry, mixed in when `noisy` is set.
+NOISE = ["", "-", "N/A", " 12,345.5 ", "7 sol", "abc%", "1.5 USDC", "3 days", "n/a", "0x1F", "12.5", "Infinity", "1e3", ",", ",,"]
+
+_PLAIN_NUMBER_RE = re.compile(r"^-?\d+(\.\d+)?$")
+
+def _si(rng):
+    value, suffix = rng.choice([(rng.uniform(1, 999), "K"), (rng.uniform(1, 999), "M"), (rng.uniform(1, 9), "B")])
+    return f"{value:.1f}{suffix}"
+
+def sheet_rows(rng, n_trades, address=None, noisy=False, related_wallets=3):
+    """
+    Cell rows of one wallet report sheet, in the layout parse_sheet_to_raw_data
+    expects: the "Wallet" header/value block, a "Token" table whose trades are
+    grouped under "dd.mm.yyyy:" date rows, and a "Related wallets" terminator.
+    """
+    address = address or wallet_address(rng)
+    rows = [
+        ["Wallet", "PnL", "ROI", "WinRate"],
+        [address, f"{rng.uniform(-50, 200):.2f} SOL", f"{rng.uniform(-90, 500):.1f}%", f"{rng.uniform(0, 100):.1f}%"],
+        ["Tokens", "Trades Period", "Total Fees", "Balance"],
+        [str(n_trades), f"{rng.randint(1, 90)} days", f"{rng.uniform(0.1, 5):.3f} SOL", f"{rng.uniform(0, 50):.2f} SOL"],
+        [],
+        TOKEN_HEADERS,
+    ]
+    day = rng.randint(1, 28)
+    for t in range(n_trades):
+        if t % 7 == 0:
+            rows.append([f"{day:02d}.03.2024:"])
+            day = day % 28 + 1
+        row = [
+            f"TOK{rng.randrange(40)}",
+            rng.choice(["Raydium", "Pump", "Jupiter", ""]),
+            f"{rng.uniform(0.1, 10):.3f} SOL",
+            f"{rng.uniform(-5, 15):+.3f} SOL",
+            rng.choice([f"{rng.uniform(-100, 400):.1f}%", "-100%"]),
+            f"{rng.uniform(1, 1e6):,.0f}",
+            f"{_si(rng)} {_si(rng)} {_si(rng)}",
+            f"{rng.randint(1, 59)} {rng.choice(['sec', 'min', 'h', 'day', 'days', 'mins'])}",
+        ]
+        if noisy and rng.random() < 0.1:
+            row[rng.randrange(len(row))] = rng.choice(NOISE)
+        rows.append(row)
+    rows.append(["Related wallets"])
+    rows.append(["Wallet", "Common tokens"])
+    for _ in range(related_wallets):
+        rows.append([wallet_address(rng), str(rng.randint(1, 20))])
+    return rows
+
+def sheet_frame(rows):
+    """The DataFrame pandas would hand parse_sheet_to_raw_data for these rows (dtype=str, header=None)."""
+    width = max(len(row) for row in rows)
+    return pd.DataFrame([[cell if cell != "" else np.nan for cell in row] + [np.nan] * (width - len(row)) for row in rows],
+                        dtype=object)
+
+def write_workbook(path, n_sheets, n_trades, seed=0, noisy=False):
+    """
+    Writes an .xlsx of `n_sheets` wallet report sheets with around `n_trades`
+    trades each. Cells that look like plain numbers are stored as numbers, the
+    way exported reports store them.
+    """
+    rng = random.Random(seed)
+    book = openpyxl.Workbook(write_only=True)
+    for s in range(n_sheets):
+        sheet = book.create_sheet(f"Wallet {s + 1}")
+        rows = sheet_rows(rng, rng.randint(max(1, n_trades // 2), n_trades * 3 // 2 + 1), noisy=noisy)
+        for row in rows:
+            sheet.append([float(cell) if _PLAIN_NUMBER_RE.match(cell) else (cell or None) for cell in row])
+    book.save(path)
+    return path
+
+def cached_workbook(directory, n_sheets, n_trades, seed=0):
+    """
+    The path of a workbook written by write_workbook with these parameters,
+    generated on first use and reused afterwards (large ones take minutes).
+    """
+    path = os.path.join(directory, f"synthetic_{n_sheets}x{n_trades}_s{seed}.xlsx")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp.xlsx"
+        write_workbook(tmp_path, n_sheets, n_trades, seed=seed)
+        os.replace(tmp_path, path)
+    return path
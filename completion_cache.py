@@ -0,0 +1,41 @@
+import hashlib
+import json
+import time
+
+from disk_cache import DiskCache
+
+def payload_key(payload):
+    """SHA-256 of the chat payload in canonical JSON, so equal requests hash equally regardless of key order."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class CompletionCache:
+    """
+    Caches finished streamed completions per payload hash (model, messages and
+    the serialized wallets, so model, template and wallet set all take part).
+    An entry keeps the chunks as they were streamed, so a hit can be replayed
+    through the same SSE protocol, and how long the original stream took.
+    Entries are tagged with their model.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.store = DiskCache(path, max_bytes=max_bytes)
+
+    @staticmethod
+    def _key(digest):
+        return f"completion:{digest}"
+
+    def lookup(self, digest):
+        """The cached entry ({"model", "chunks", "duration_ms", "created"}), or None."""
+        return self.store.get(self._key(digest))
+
+    def store_completion(self, digest, model, chunks, duration_ms):
+        entry = {"model": model, "chunks": list(chunks), "duration_ms": duration_ms, "created": time.time()}
+        self.store.set(self._key(digest), entry, tag=model)
+
+    def invalidate(self, model=None):
+        """Drops the entries of one model, or every entry if no model is given."""
+        return self.store.invalidate(model)
+
+    def stats(self):
+        return self.store.stats()
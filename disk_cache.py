@@ -0,0 +1,117 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+class DiskCache:
+    """
+    A small SQLite-backed store for JSON-serializable values, evicting the least
+    recently used entries once the stored (compressed) payloads exceed `max_bytes`.
+    Entries may carry a `tag` so that related keys can be invalidated together.
+    The byte total lives in the database itself, kept by triggers, and writes
+    check it inside their own transaction, so the budget holds for every thread
+    and process sharing the file.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._transaction():
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, tag TEXT, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_tag ON entries (tag)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)")
+            # Caches written before the totals table existed start from their current size.
+            self._conn.execute("INSERT OR IGNORE INTO totals VALUES (0, (SELECT COALESCE(SUM(size), 0) FROM entries))")
+            self._conn.execute("CREATE TRIGGER IF NOT EXISTS entries_added AFTER INSERT ON entries "
+                               "BEGIN UPDATE totals SET bytes = bytes + new.size; END")
+            self._conn.execute("CREATE TRIGGER IF NOT EXISTS entries_removed AFTER DELETE ON entries "
+                               "BEGIN UPDATE totals SET bytes = bytes - old.size; END")
+            self._conn.execute("CREATE TRIGGER IF NOT EXISTS entries_resized AFTER UPDATE OF size ON entries "
+                               "BEGIN UPDATE totals SET bytes = bytes + new.size - old.size; END")
+
+    @contextmanager
+    def _transaction(self):
+        """A write transaction, taken up front so that writers in other processes queue behind it."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _total_bytes(self):
+        return self._conn.execute("SELECT bytes FROM totals").fetchone()[0]
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys):
+        """Returns a dict of the keys that are present, marking them as recently used."""
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit.
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(f"SELECT key, value FROM entries WHERE key IN ({placeholders})", batch).fetchall()
+                for key, value in rows:
+                    found[key] = json.loads(zlib.decompress(value))
+                if rows:
+                    now = time.time()
+                    self._conn.executemany("UPDATE entries SET accessed = ? WHERE key = ?", [(now, key) for key, _ in rows])
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key, value, tag=None):
+        blob = zlib.compress(json.dumps(value).encode('utf-8'))
+        with self._lock, self._transaction():
+            self._conn.execute(
+                "INSERT INTO entries (key, tag, value, size, accessed) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET tag = excluded.tag, value = excluded.value, "
+                "size = excluded.size, accessed = excluded.accessed",
+                (key, tag, blob, len(blob), time.time()),
+            )
+            total = self._total_bytes()
+            if total > self.max_bytes:
+                self._evict(total)
+
+    def invalidate(self, tag=None):
+        """Drops every entry with the given tag, or the whole cache if no tag is given. Returns the count."""
+        with self._lock:
+            if tag is None:
+                return self._conn.execute("DELETE FROM entries").rowcount
+            return self._conn.execute("DELETE FROM entries WHERE tag = ?", (tag,)).rowcount
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            return {"entries": entries, "bytes": self._total_bytes(), "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+    def _evict(self, total):
+        """Deletes least recently used entries until the cache is back under 90% of its budget."""
+        target = int(self.max_bytes * 0.9)
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+            if total <= target:
+                break
+            doomed.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
@@ -0,0 +1,236 @@
+import numpy as np
+import pandas as pd
+
+# --- Columnar extraction ---
+
+class _Irregular(Exception):
+    """Trades holding values the columnar path cannot represent faithfully."""
+
+_NUMERIC_TYPES = {float, int, type(None)}
+
+def _numeric(values):
+    """Converts a list of numbers and Nones to a float array (None -> NaN); rejects anything else."""
+    if not set(map(type, values)) <= _NUMERIC_TYPES:
+        raise _Irregular()
+    array = np.array(values, dtype=float)
+    if np.isinf(array).any() or np.isnan(array).sum() != values.count(None):
+        raise _Irregular()
+    return array
+
+def _labels(values):
+    """Interns labels (str or number) as integer codes, None -> -1. Codes are local to one wallet."""
+    types = set(map(type, values))
+    if not types <= {str, float, int, type(None)} or (float in types and any(v != v for v in values)):
+        raise _Irregular()
+    codes = {}
+    return np.array([codes.setdefault(v, len(codes)) if v is not None else -1 for v in values], dtype=np.int64)
+
+def _columns(raw_data):
+    """
+    Flattens one wallet's trades and daily PnLs into column arrays. Raises if the
+    wallet holds a value the columnar path cannot represent.
+    """
+    trades = raw_data.get('trades', [])
+    delta = [t.get('Delta Sol', {}) for t in trades]
+    spent = [t.get('Spent Sol', {}) for t in trades]
+    market_cap = [t.get('market_cap', {}) for t in trades]
+    if not set(map(type, delta)) | set(map(type, spent)) | set(map(type, market_cap)) <= {dict}:
+        raise _Irregular()
+    return {
+        'pnl': _numeric([d.get('value') for d in delta]),
+        'delta_pct': _numeric([t.get('Delta %') for t in trades]),
+        'spent': _numeric([d.get('value') for d in spent]),
+        'duration': _numeric([t.get('Duration') for t in trades]),
+        'mc_buy': _numeric([m.get('on_first_buy') for m in market_cap]),
+        'platform': _labels([t.get('1st Buy On') or None for t in trades]),
+        'token': _labels([t.get('Token') for t in trades]),
+        'daily_pnl': _numeric(list(raw_data.get('daily_pnl', {}).values())),
+    }
+
+# --- Grouped aggregates ---
+
+def _group_std(series, group, size, count):
+    """Sample standard deviation per group, exactly 0.0 for constant groups or fewer than two values."""
+    grouped = series.groupby(group)
+    std = grouped.std(ddof=1).reindex(range(size)).to_numpy()
+    constant = (grouped.max() == grouped.min()).reindex(range(size), fill_value=True).to_numpy()
+    return np.where((count > 1) & ~constant, std, 0.0)
+
+def _aggregate(frame, daily, size):
+    """Computes the per-wallet statistics behind every enriched metric. Returns a dict of arrays."""
+    w = frame['wallet']
+    pnl, spent, dur, mc = frame['pnl'], frame['spent'], frame['duration'], frame['mc_buy']
+    wins, losses = pnl > 0, pnl <= 0
+
+    def mean(series):
+        return series.groupby(w).mean().reindex(range(size)).fillna(0.0).to_numpy()
+
+    def median(series):
+        return series.groupby(w).median().reindex(range(size)).fillna(0.0).to_numpy()
+
+    def count(series):
+        return series.groupby(w).count().reindex(range(size), fill_value=0).to_numpy()
+
+    agg = {}
+    pnl_count = count(pnl)
+    agg['pnl_mean'] = mean(pnl)
+    agg['pnl_std'] = _group_std(pnl, w, size, pnl_count)
+    agg['win_mean'] = mean(pnl.where(wins))
+    agg['loss_mean'] = mean(pnl.where(losses))
+
+    # Sample skewness over the non-null PnLs, zero below three trades or for constant PnL.
+    z = (pnl - agg['pnl_mean'][w]) / np.where(agg['pnl_std'] == 0, np.nan, agg['pnl_std'])[w]
+    third = (z ** 3).groupby(w).sum().reindex(range(size), fill_value=0.0).to_numpy()
+    n = pnl_count.astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        skew = n / ((n - 1) * (n - 2)) * third
+    agg['skewness'] = np.where((pnl_count >= 3) & (agg['pnl_std'] != 0), skew, 0.0)
+
+    # Max drawdown of the cumulative PnL, starting from a zero peak.
+    traded = frame[pnl.notna()]
+    cumulative = traded['pnl'].groupby(traded['wallet']).cumsum()
+    peak = np.maximum(cumulative.groupby(traded['wallet']).cummax(), 0.0)
+    drawdown = (peak - cumulative).groupby(traded['wallet']).max()
+    agg['max_drawdown'] = 0.0 - np.maximum(drawdown.reindex(range(size), fill_value=0.0).to_numpy(), 0.0)
+
+    agg['full_loss_count'] = (frame['delta_pct'] <= -99.9).groupby(w).sum().reindex(range(size), fill_value=0).to_numpy()
+
+    agg['spent_mean'] = mean(spent)
+    agg['spent_median'] = median(spent)
+    agg['spent_std'] = _group_std(spent, w, size, count(spent))
+    agg['mc_mean'] = mean(mc)
+    agg['mc_median'] = median(mc)
+    agg['mc_std'] = _group_std(mc, w, size, count(mc))
+    agg['mc_win_mean'] = mean(mc.where(wins))
+    agg['mc_loss_mean'] = mean(mc.where(losses))
+
+    # PnL per (wallet, token); concentration compares the best token to all profitable ones.
+    by_token = frame[(frame['token'] >= 0) & pnl.notna()]
+    token_pnl = by_token.groupby(['wallet', 'token'], sort=False)['pnl'].sum()
+    positive = token_pnl[token_pnl > 0].groupby(level=0)
+    agg['token_pnl_total'] = positive.sum().reindex(range(size), fill_value=0.0).to_numpy()
+    agg['token_pnl_top'] = positive.max().reindex(range(size), fill_value=0.0).to_numpy()
+
+    agg['hold_mean'] = mean(dur)
+    agg['hold_median'] = median(dur)
+    agg['hold_win_mean'] = mean(dur.where(wins))
+    agg['hold_loss_mean'] = mean(dur.where(losses))
+
+    platforms = frame[frame['platform'] >= 0].groupby(['wallet', 'platform'], sort=False).size()
+    agg['platform_max'] = platforms.groupby(level=0).max().reindex(range(size), fill_value=0).to_numpy()
+
+    daily_count = daily['pnl'].groupby(daily['wallet']).count().reindex(range(size), fill_value=0).to_numpy()
+    agg['daily_std'] = _group_std(daily['pnl'], daily['wallet'], size, daily_count)
+    return agg
+
+# --- Assembly ---
+
+def _assemble(raw_data, trade_count, agg, i, safe_divide):
+    """Builds one wallet's profile from its aggregates, mirroring create_enriched_profile."""
+    info = raw_data.get('wallet_info', {})
+    avg_win_pnl, avg_loss_pnl = float(agg['win_mean'][i]), float(agg['loss_mean'][i])
+    win_rate = info.get('WinRate', 0.0) / 100.0 if info.get('WinRate') is not None else 0.0
+    loss_rate = 1.0 - win_rate
+    per_trade_pnl_std = float(agg['pnl_std'][i])
+
+    performance_and_risk = {
+        "pnl_sol": info.get('PnL', {}).get('value'),
+        "roi_percent": info.get('ROI'),
+        "win_rate_percent": info.get('WinRate'),
+        "sharpe_ratio_proxy": safe_divide(float(agg['pnl_mean'][i]), per_trade_pnl_std),
+        "expectancy_per_trade_sol": (win_rate * avg_win_pnl) + (loss_rate * avg_loss_pnl),
+        "avg_win_pnl_sol": avg_win_pnl,
+        "avg_loss_pnl_sol": avg_loss_pnl,
+        "win_loss_pnl_ratio": safe_divide(abs(avg_win_pnl), abs(avg_loss_pnl)),
+        "per_trade_pnl_std_dev_sol": per_trade_pnl_std,
+        "daily_pnl_std_dev_sol": float(agg['daily_std'][i]),
+        "pnl_skewness": float(agg['skewness'][i]),
+        "max_drawdown_sol": float(agg['max_drawdown'][i]),
+        "full_loss_trade_count": int(agg['full_loss_count'][i]),
+        "pnl_to_fees_ratio": safe_divide(info.get('PnL', {}).get('value'), info.get('Total Fees', {}).get('value'))
+    }
+
+    avg_trade_size, avg_mc_on_buy = float(agg['spent_mean'][i]), float(agg['mc_mean'][i])
+    sizing_and_market_profile = {
+        "avg_trade_size_sol": avg_trade_size,
+        "median_trade_size_sol": float(agg['spent_median'][i]),
+        "trade_size_coeff_of_variation": safe_divide(float(agg['spent_std'][i]), avg_trade_size),
+        "avg_mc_on_buy": avg_mc_on_buy,
+        "median_mc_on_buy": float(agg['mc_median'][i]),
+        "mc_on_buy_coeff_of_variation": safe_divide(float(agg['mc_std'][i]), avg_mc_on_buy),
+        "avg_mc_on_buy_winners": float(agg['mc_win_mean'][i]),
+        "avg_mc_on_buy_losers": float(agg['mc_loss_mean'][i]),
+        "token_concentration_pnl_percent": safe_divide(float(agg['token_pnl_top'][i]) * 100, float(agg['token_pnl_total'][i]))
+    }
+
+    total_trades = info.get('Tokens', trade_count)
+    trading_period_in_seconds = info.get('Trades Period', 0.0)
+    trading_period_in_days = safe_divide(trading_period_in_seconds, 86400) if trading_period_in_seconds else 0.0
+    avg_hold, median_hold = float(agg['hold_mean'][i]), float(agg['hold_median'][i])
+
+    timing_and_frequency = {
+        "total_trades": total_trades,
+        "trading_period_days": trading_period_in_days,
+        "trades_per_day": safe_divide(total_trades, trading_period_in_days) if trading_period_in_days > 0 else total_trades,
+        "avg_hold_seconds": avg_hold,
+        "median_hold_seconds": median_hold,
+        "hold_time_avg_to_median_ratio": safe_divide(avg_hold, median_hold),
+        "avg_hold_winners_seconds": float(agg['hold_win_mean'][i]),
+        "avg_hold_losers_seconds": float(agg['hold_loss_mean'][i]),
+        "platform_concentration_percent": safe_divide(int(agg['platform_max'][i]) * 100, total_trades) if total_trades > 0 else 0
+    }
+
+    return {
+        "wallet_address": info.get('Wallet'),
+        "performance_and_risk": performance_and_risk,
+        "sizing_and_market_profile": sizing_and_market_profile,
+        "timing_and_frequency": timing_and_frequency
+    }
+
+# --- Batch entry point ---
+
+TRADE_COLUMNS = ('pnl', 'delta_pct', 'spent', 'duration', 'mc_buy', 'platform', 'token')
+
+def enrich_profiles(raw_datas):
+    """
+    Batch equivalent of parser.create_enriched_profile. Flattens the trades of all
+    wallets into one columnar frame and computes every metric with grouped,
+    vectorized operations. Returns one (profile, error) tuple per raw_data, in order;
+    `error` is the exception create_enriched_profile would have raised, else None.
+    Wallets whose trades hold values the columnar path cannot represent (non-numeric
+    cells, NaN, malformed SOL amounts) are handed to create_enriched_profile as-is.
+    """
+    # Deferred: parser imports this module.
+    from parser import _safe_divide, create_enriched_profile
+
+    raw_datas = list(raw_datas)
+    regular, wallet_columns = [], []
+    for i, raw_data in enumerate(raw_datas):
+        try:
+            wallet_columns.append(_columns(raw_data))
+            regular.append(i)
+        except Exception:
+            pass
+
+    trade_counts = [len(c['pnl']) for c in wallet_columns]
+    daily_pnl = [c.pop('daily_pnl') for c in wallet_columns]
+    frame = pd.DataFrame({name: np.concatenate([c[name] for c in wallet_columns]) if wallet_columns else np.array([])
+                          for name in TRADE_COLUMNS})
+    frame['wallet'] = np.repeat(np.arange(len(regular)), trade_counts)
+    daily = pd.DataFrame({'wallet': np.repeat(np.arange(len(regular)), [len(d) for d in daily_pnl]),
+                          'pnl': np.concatenate(daily_pnl) if daily_pnl else np.array([])})
+    results = [None] * len(raw_datas)
+    agg = _aggregate(frame, daily, len(regular))
+    for slot, i in enumerate(regular):
+        try:
+            results[i] = (_assemble(raw_datas[i], trade_counts[slot], agg, slot, _safe_divide), None)
+        except Exception as e:
+            results[i] = (None, e)
+
+    for i, result in enumerate(results):
+        if result is None:
+            try:
+                results[i] = (create_enriched_profile(raw_datas[i]), None)
+            except Exception as e:
+                results[i] = (None, e)
+    return results
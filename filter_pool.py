@@ -0,0 +1,475 @@
+import hashlib
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import pandas as pd
+
+from frame_files import append_frame, link_frame, read_frame, read_meta, write_frame
+from session_store import nested_frame
+
+POLL_INTERVAL = 0.05
+_JOB_ID_RE = re.compile(r"^[\w-]{1,64}$")
+STARTUP_TIMEOUT = 60
+COMPILED_CACHE_SIZE = 512
+
+# --- Worker process ---
+
+def source_hash(code):
+    return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+def _load(path, frames):
+    """The (flat, nested) frames published at `path`, mapped once per worker and kept until the next version."""
+    if path not in frames:
+        frames.clear()
+        flat, meta = read_frame(path)
+        frames[path] = (flat, nested_frame(flat, meta["layout"]))
+    return frames[path]
+
+def _compile(code, compiled):
+    """The code object for `code`, from the worker's LRU of compiled filters keyed by source hash."""
+    digest = source_hash(code)
+    cached = digest in compiled
+    if cached:
+        compiled.move_to_end(digest)
+    else:
+        compiled[digest] = compile(code, f"<filter {digest[:12]}>", "exec")
+        if len(compiled) > COMPILED_CACHE_SIZE:
+            compiled.popitem(last=False)
+    return compiled[digest], cached
+
+def _evaluate(code, flat, nested, compiled):
+    """Runs one filter against shallow copies of the frames and returns its result_df."""
+    code_object, cached = _compile(code, compiled)
+    local_namespace = {'pd': pd, 'df': nested.copy(deep=False), 'flat_df': flat.copy(deep=False)}
+    exec(code_object, {}, local_namespace)
+    result_df = local_namespace.get('result_df')
+    if result_df is None:
+        raise ValueError("'result_df' was not defined in the executed code.")
+    return result_df, cached
+
+def _matched_addresses(result_df, flat):
+    """Wallet addresses of the rows a filter kept, or None if they cannot be told from its result."""
+    if 'wallet_address' in result_df.columns:
+        addresses = result_df['wallet_address']
+    elif result_df.index.isin(flat.index).all():
+        addresses = flat['wallet_address'].loc[result_df.index]
+    else:
+        return None
+    return [address if isinstance(address, str) else None for address in addresses.tolist()]
+
+def _failure(e):
+    if isinstance(e, MemoryError):
+        return {"status": "memory_limit", "error": "Filter ran out of memory."}
+    return {"status": "error", "error": f"Code execution failed: {e}"}
+
+def _run_job(job, frames, compiled):
+    timings = {}
+    started = time.perf_counter()
+    flat, nested = _load(job["frame"], frames)
+    timings["load_ms"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    result_df, _ = _evaluate(job["code"], flat, nested, compiled)
+    timings["exec_ms"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    addresses = _matched_addresses(result_df, flat)
+    results = None if job.get("addresses_only") else result_df.to_dict(orient='records')
+    timings["serialize_ms"] = (time.perf_counter() - started) * 1000
+    return {"status": "ok", "error": None, "results": results, "addresses": addresses,
+            "shape": list(result_df.shape), "timings": timings}
+
+def _run_batch(job, frames, compiled, conn):
+    """Evaluates each of the job's filters against one frame, sending one reply per filter as it finishes."""
+    started = time.perf_counter()
+    try:
+        flat, nested = _load(job["frame"], frames)
+    except Exception as e:
+        for _ in job["codes"]:
+            conn.send({**_failure(e), "timings": {}})
+        return
+    load_ms = (time.perf_counter() - started) * 1000
+    for code in job["codes"]:
+        started = time.perf_counter()
+        try:
+            result_df, cached = _evaluate(code, flat, nested, compiled)
+            reply = {"status": "ok", "error": None, "match_count": len(result_df),
+                     "addresses": _matched_addresses(result_df, flat), "compiled_cached": cached}
+        except Exception as e:
+            reply = _failure(e)
+        reply["timings"] = {"load_ms": load_ms, "exec_ms": (time.perf_counter() - started) * 1000}
+        load_ms = 0.0
+        conn.send(reply)
+
+def _limit_memory(memory_limit):
+    """Caps the worker's private memory so runaway allocations raise MemoryError; mapped frames do not count."""
+    try:
+        import resource
+        resource.setrlimit(resource.RLIMIT_DATA, (memory_limit, memory_limit))
+    except (ImportError, ValueError, OSError):
+        pass  # not supported here; the parent's RSS check still applies
+
+def _worker_main(conn, memory_limit):
+    """Serves filter jobs from `conn` until it receives None or the pipe closes."""
+    _limit_memory(memory_limit)
+    frames, compiled = {}, OrderedDict()
+    conn.send("ready")
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        if "codes" in job:
+            _run_batch(job, frames, compiled, conn)
+            continue
+        try:
+            reply = _run_job(job, frames, compiled)
+        except Exception as e:
+            reply = {**_failure(e), "timings": {}}
+        conn.send(reply)
+
+# --- Parent side ---
+
+def _rss_bytes(pid):
+    """Resident set size of a process, or None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+class JobIdInUse(ValueError):
+    """A job with the requested id is already running."""
+
+def _job_file(jobs_dir, job_id, kind):
+    return os.path.join(jobs_dir, f"{job_id}.{kind}") if jobs_dir and _JOB_ID_RE.match(job_id) else None
+
+def signal_cancel(jobs_dir, job_id):
+    """
+    Asks whichever process runs `job_id` with this `jobs_dir` to cancel it,
+    through a flag file it polls. Returns False if no such job is running.
+    """
+    running = _job_file(jobs_dir, job_id, "running")
+    if running is None or not os.path.exists(running):
+        return False
+    with open(_job_file(jobs_dir, job_id, "cancel"), 'w'):
+        pass
+    return True
+
+class _Cancellation:
+    """A job's cancel flag, set by cancel() in this process or by signal_cancel() from any other."""
+
+    def __init__(self, flag_path=None):
+        self._event = threading.Event()
+        self.flag_path = flag_path
+
+    def set(self):
+        self._event.set()
+
+    def is_set(self):
+        if not self._event.is_set() and self.flag_path is not None and os.path.exists(self.flag_path):
+            self._event.set()
+        return self._event.is_set()
+
+class _Worker:
+    def __init__(self, context, memory_limit):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, memory_limit), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+def _rounded(timings):
+    return {key: round(value, 2) for key, value in timings.items()}
+
+class FilterPool:
+    """
+    Runs filter code in a pool of warm worker processes, away from the request
+    thread. The session frame is published once per version as memory-mapped
+    column files (frame_files) that every worker maps instead of receiving a
+    pickled copy per call; a version reached by upserts is published as the
+    previous frame plus the changed rows. Workers keep compiled filters keyed by source hash,
+    so resubmitted code is not compiled again.
+
+    Each run gets a wall-clock `timeout` and an RSS `memory_limit`; a worker
+    that exceeds either, or whose job is cancelled, is killed and replaced.
+
+    Given a `jobs_dir` shared with other processes, running jobs are listed
+    there so that signal_cancel() can cancel them from any of those processes.
+    """
+
+    def __init__(self, frames_dir, workers=2, timeout=30.0, memory_limit=2048 * 1024 * 1024, jobs_dir=None):
+        self.frames_dir = frames_dir
+        self.jobs_dir = jobs_dir
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self._context = multiprocessing.get_context("spawn")
+        # LIFO, so the most recently used worker (frame mapped, filters compiled) is reused first.
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._published = {}  # snapshot version -> frame path
+        self._users = {}  # snapshot version -> jobs still using its frame
+        self._cancelled = {}  # job id -> _Cancellation
+        os.makedirs(frames_dir, exist_ok=True)
+        if jobs_dir:
+            os.makedirs(jobs_dir, exist_ok=True)
+        for _ in range(workers):
+            self._spawn()
+
+    def _spawn(self):
+        """Starts a worker and adds it to the pool once it has finished importing, so jobs only meet warm workers."""
+        def start():
+            worker = _Worker(self._context, self.memory_limit)
+            try:
+                if worker.conn.poll(STARTUP_TIMEOUT) and worker.conn.recv() == "ready":
+                    self._idle.put(worker)
+                    return
+            except (EOFError, OSError):
+                pass
+            worker.kill()
+        threading.Thread(target=start, daemon=True).start()
+
+    def publish(self, snapshot):
+        """Writes a snapshot's frame for the workers, once per version. Returns its path."""
+        return self._publish(snapshot, hold=False)
+
+    def _publish(self, snapshot, hold):
+        """publish(), and with `hold` keeps the frame on disk until the job calls _release_frame()."""
+        with self._lock:
+            path = self._published.get(snapshot.version)
+            if path is None:
+                path = os.path.join(self.frames_dir, f"v{snapshot.version}")
+                self._write(snapshot, path)
+                self._published[snapshot.version] = path
+            if hold:
+                self._users[snapshot.version] = self._users.get(snapshot.version, 0) + 1
+            self._collect()
+            return path
+
+    def _write(self, snapshot, path):
+        """
+        Writes a snapshot's frame to `path`; called with the lock held. A
+        version that follows on from the newest published one by upserts
+        starts as hard links to that frame's files and appends only the changes.
+        """
+        meta = {"layout": snapshot.layout, "version": snapshot.version, "lineage": snapshot.lineage}
+        base = max(self._published, default=None)
+        changes = None
+        if base is not None and base < snapshot.version:
+            if (read_meta(self._published[base]) or {}).get("lineage") == snapshot.lineage:
+                changes = snapshot.changes_since(base)
+        if changes:
+            link_frame(self._published[base], path)
+            if append_frame(path, changes, meta):
+                return
+            shutil.rmtree(path, ignore_errors=True)  # due for compaction: start from nothing
+        write_frame(snapshot.frame, path, meta)
+
+    def _release_frame(self, version):
+        with self._lock:
+            self._users[version] -= 1
+            self._collect()
+
+    def _collect(self):
+        """
+        Deletes the frames of superseded versions that no job uses any more;
+        called with the lock held. Workers that still map an older version keep
+        their pages alive after the unlink.
+        """
+        newest = max(self._published)
+        for version in [version for version in self._published if version != newest and not self._users.get(version)]:
+            shutil.rmtree(self._published.pop(version), ignore_errors=True)
+            self._users.pop(version, None)
+
+    def cancel(self, job_id):
+        """Cancels a job running in this process. Returns False if no such job is running here."""
+        with self._lock:
+            event = self._cancelled.get(job_id)
+        if event is None:
+            return False
+        event.set()
+        return True
+
+    def _register(self, job_id):
+        """
+        Claims a job id, or a fresh one if none is given. Raises JobIdInUse when
+        a job with that id is already running here or, through `jobs_dir`, in
+        another process; its cancel flag would otherwise be shared.
+        """
+        job_id = job_id or uuid.uuid4().hex
+        with self._lock:
+            if job_id in self._cancelled:
+                raise JobIdInUse(f"Filter job '{job_id}' is already running.")
+            running = _job_file(self.jobs_dir, job_id, "running")
+            if running is not None:
+                try:
+                    os.close(os.open(running, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                except FileExistsError:
+                    raise JobIdInUse(f"Filter job '{job_id}' is already running.")
+            self._cancelled[job_id] = _Cancellation(_job_file(self.jobs_dir, job_id, "cancel"))
+            return job_id, self._cancelled[job_id]
+
+    def _unregister(self, job_id):
+        with self._lock:
+            self._cancelled.pop(job_id, None)
+        for kind in ("running", "cancel"):
+            path = _job_file(self.jobs_dir, job_id, kind)
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+    def _acquire(self, cancelled, deadline, timeout):
+        """An idle worker, or (None, failure reply) if the job is cancelled or times out first."""
+        while not cancelled.is_set() and time.monotonic() < deadline:
+            try:
+                return self._idle.get(timeout=POLL_INTERVAL), None
+            except queue.Empty:
+                pass
+        if cancelled.is_set():
+            return None, {"status": "cancelled", "error": "Filter execution was cancelled.", "timings": {}}
+        return None, {"status": "timeout", "error": f"No filter worker became free within {timeout:g} s.", "timings": {}}
+
+    def _receive(self, worker, cancelled, deadline, timeout):
+        """
+        Waits for the worker's next reply, enforcing the limits. Returns
+        (reply, failed); a failed worker must not serve another job.
+        """
+        failure = None
+        try:
+            while not worker.conn.poll(POLL_INTERVAL):
+                rss = _rss_bytes(worker.process.pid)
+                if cancelled.is_set():
+                    failure = ("cancelled", "Filter execution was cancelled.")
+                elif time.monotonic() > deadline:
+                    failure = ("timeout", f"Filter execution exceeded the {timeout:g} s time limit.")
+                elif rss is not None and rss > self.memory_limit:
+                    failure = ("memory_limit", f"Filter execution exceeded the {self.memory_limit // (1024 * 1024)} MB memory limit.")
+                elif not worker.process.is_alive():
+                    failure = ("crashed", f"Filter worker exited with code {worker.process.exitcode}.")
+                if failure:
+                    break
+            else:
+                return worker.conn.recv(), False
+        except (EOFError, OSError) as e:
+            failure = ("crashed", f"Filter worker failed: {e}")
+        return {"status": failure[0], "error": failure[1], "timings": {}}, True
+
+    def _release(self, worker, failed):
+        """Returns a worker to the pool, or kills it and starts a fresh one in its place."""
+        if failed:
+            worker.kill()
+            self._spawn()
+        else:
+            self._idle.put(worker)
+
+    def run(self, code, snapshot, job_id=None, timeout=None, addresses_only=False):
+        """
+        Runs `code` against `snapshot` in a worker and returns an outcome dict:
+        {"job_id", "status", "results", "addresses", "shape", "error", "timings"},
+        where status is "ok", "error", "timeout", "memory_limit", "cancelled" or
+        "crashed" and timings are in milliseconds. The worker always sends back the
+        matched wallet addresses; with `addresses_only` it leaves out the result records.
+        """
+        timeout = timeout or self.timeout
+        job_id, cancelled = self._register(job_id)
+        started = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        frame = None
+        try:
+            frame = self._publish(snapshot, hold=True)
+            publish_ms = (time.perf_counter() - started) * 1000
+            worker, reply = self._acquire(cancelled, deadline, timeout)
+            queue_ms = (time.perf_counter() - started) * 1000 - publish_ms
+            if worker is not None:
+                failed = True
+                try:
+                    worker.conn.send({"code": code, "frame": frame, "addresses_only": addresses_only})
+                    reply, failed = self._receive(worker, cancelled, deadline, timeout)
+                finally:
+                    self._release(worker, failed)
+        finally:
+            if frame is not None:
+                self._release_frame(snapshot.version)
+            self._unregister(job_id)
+        outcome = {"job_id": job_id, "results": None, "addresses": None, "shape": None,
+                   **{key: value for key, value in reply.items() if key != "timings"}}
+        outcome["timings"] = _rounded({"publish_ms": publish_ms, "queue_ms": queue_ms, **reply["timings"],
+                                       "total_ms": (time.perf_counter() - started) * 1000})
+        return outcome
+
+    def run_batch(self, codes, snapshot, job_id=None, timeout=None):
+        """
+        Evaluates many filters against one snapshot in a single worker. `timeout`
+        applies to each filter; a filter that times out, crashes or runs out of
+        memory fails alone and the rest continue on a replacement worker.
+
+        Returns {"job_id", "filters", "timings"}, with one dict per code in
+        "filters": {"index", "source_hash", "status", "error", "match_count",
+        "addresses", "compiled_cached", "timings"}.
+        """
+        codes = list(codes)
+        timeout = timeout or self.timeout
+        job_id, cancelled = self._register(job_id)
+        started = time.perf_counter()
+        filters = [{"index": i, "source_hash": source_hash(code), "status": None, "error": None,
+                    "match_count": None, "addresses": None, "compiled_cached": False, "timings": {}}
+                   for i, code in enumerate(codes)]
+        frame = None
+        try:
+            frame = self._publish(snapshot, hold=True)
+            publish_ms = (time.perf_counter() - started) * 1000
+            queue_ms, remaining = 0.0, list(range(len(codes)))
+            while remaining:
+                waited = time.perf_counter()
+                worker, reply = self._acquire(cancelled, time.monotonic() + timeout, timeout)
+                queue_ms += (time.perf_counter() - waited) * 1000
+                if worker is None:
+                    for i in remaining:
+                        filters[i].update(reply)
+                    break
+                failed = True
+                try:
+                    worker.conn.send({"codes": [codes[i] for i in remaining], "frame": frame})
+                    while remaining:
+                        reply, failed = self._receive(worker, cancelled, time.monotonic() + timeout, timeout)
+                        filters[remaining.pop(0)].update(reply)
+                        if failed:
+                            break
+                finally:
+                    self._release(worker, failed)
+                if cancelled.is_set():
+                    for i in remaining:
+                        filters[i].update({"status": "cancelled", "error": "Filter execution was cancelled."})
+                    break
+        finally:
+            if frame is not None:
+                self._release_frame(snapshot.version)
+            self._unregister(job_id)
+        for entry in filters:
+            entry["timings"] = _rounded(entry["timings"])
+        timings = _rounded({"publish_ms": publish_ms, "queue_ms": queue_ms, "total_ms": (time.perf_counter() - started) * 1000})
+        return {"job_id": job_id, "filters": filters, "timings": timings}
+
+    def close(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.kill()
+        with self._lock:
+            for path in self._published.values():
+                shutil.rmtree(path, ignore_errors=True)
+            self._published, self._users = {}, {}
@@ -0,0 +1,243 @@
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+
+MANIFEST = "manifest.json"
+MAX_CHUNKS = 16
+
+def _json_value(value):
+    return value.item() if isinstance(value, np.generic) else str(value)
+
+def _column_arrays(column):
+    """
+    (values, mask, encoding) for one column; mask is None when nothing is
+    missing. Object columns that hold anything besides strings, such as a
+    metric mixing numbers with raw cells sanitize() kept, are stored as one
+    JSON document per value with encoding "json"; every other encoding is None.
+    """
+    if isinstance(column.dtype, pd.api.extensions.ExtensionDtype) and column.dtype.kind in "iufb":
+        mask = column.isna().to_numpy()
+        return column.to_numpy(dtype=column.dtype.numpy_dtype, na_value=0), mask if mask.any() else None, None
+    if column.dtype.kind in "iufbmM":
+        return column.to_numpy(), None, None
+    mask = column.isna().to_numpy()
+    values = column.to_numpy(dtype=object, copy=True)
+    encoding = None
+    if any(not isinstance(value, str) for value in values[~mask]):
+        encoding = "json"
+        values[~mask] = [json.dumps(value, default=_json_value) for value in values[~mask]]
+    values[mask] = ""
+    return np.asarray(values, dtype=str), mask if mask.any() else None, encoding
+
+def merge_rows(frame, rows, targets):
+    """
+    `frame` with `rows` merged in: row i of `rows` takes the place of row
+    targets[i] of `frame`, or, when targets[i] is past its end, is appended in
+    the order given. This is the change one SessionStore.upsert makes.
+    """
+    n = len(frame)
+    if not n:
+        return rows.reset_index(drop=True)
+    combined = pd.concat([frame, rows], ignore_index=True)
+    targets = np.asarray(targets)
+    replaced = targets < n
+    if not replaced.any():
+        return combined
+    order = np.arange(n)
+    order[targets[replaced]] = n + np.flatnonzero(replaced)
+    order = np.concatenate([order, n + np.flatnonzero(~replaced)])
+    return combined.take(order).reset_index(drop=True)
+
+def _read_manifest(path):
+    """The manifest of the frame at `path`, or None if there is none (or it cannot be read)."""
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if "chunks" not in manifest:  # written before frames had chunks: one base chunk
+        manifest["chunks"] = [{"data": manifest.get("data"), "rows": manifest["rows"], "columns": manifest["columns"],
+                               "targets": None, "version": manifest["meta"].get("version")}]
+    return manifest
+
+def read_meta(path):
+    """The meta of the frame at `path`, or None if there is none."""
+    manifest = _read_manifest(path)
+    return manifest["meta"] if manifest is not None else None
+
+def _data_dirs(manifest):
+    return {chunk["data"] for chunk in manifest["chunks"] if chunk["data"]} if manifest else set()
+
+def _write_chunk(path, frame, version, targets=None):
+    """Writes `frame` to a fresh data directory inside `path`; returns its manifest entry."""
+    data_dir = f"data-{uuid.uuid4().hex}"
+    os.makedirs(os.path.join(path, data_dir))
+    columns = []
+    for i, name in enumerate(frame.columns):
+        values, mask, encoding = _column_arrays(frame[name])
+        entry = {"name": name, "dtype": str(frame[name].dtype), "values": f"{data_dir}/c{i}.npy", "mask": None}
+        if encoding:
+            entry["encoding"] = encoding
+        np.save(os.path.join(path, entry["values"]), values, allow_pickle=False)
+        if mask is not None:
+            entry["mask"] = f"{data_dir}/c{i}.mask.npy"
+            np.save(os.path.join(path, entry["mask"]), mask, allow_pickle=False)
+        columns.append(entry)
+    chunk = {"data": data_dir, "rows": len(frame), "columns": columns, "targets": None, "version": version}
+    if targets is not None:
+        chunk["targets"] = f"{data_dir}/targets.npy"
+        np.save(os.path.join(path, chunk["targets"]), np.asarray(targets, dtype=np.int64), allow_pickle=False)
+    return chunk
+
+def _commit(path, manifest, previous):
+    """
+    Renames `manifest` into place, then removes everything that neither it
+    nor the `previous` manifest names; readers still loading the previous
+    frame keep their data.
+    """
+    manifest_path = os.path.join(path, MANIFEST)
+    tmp_path = f"{manifest_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+    keep = {MANIFEST} | _data_dirs(manifest) | _data_dirs(previous)
+    for name in os.listdir(path):
+        if name not in keep:
+            stale = os.path.join(path, name)
+            if os.path.isdir(stale):
+                shutil.rmtree(stale, ignore_errors=True)
+            else:
+                os.remove(stale)
+
+def write_frame(frame, path, meta=None):
+    """
+    Writes a flat frame as one .npy file per column plus a JSON manifest, so
+    other processes can map the columns instead of unpickling them. The
+    columns go to a fresh data directory inside `path` and the manifest naming
+    them is renamed into place last, so a reader (or a crash) sees the old
+    frame or the new one, never neither. The data the replaced manifest named
+    is kept for readers still loading it; older data is removed.
+    """
+    meta = meta or {}
+    os.makedirs(path, exist_ok=True)
+    previous = _read_manifest(path)
+    chunk = _write_chunk(path, frame, meta.get("version"))
+    _commit(path, {"rows": len(frame), "chunks": [chunk], "meta": meta}, previous)
+    return path
+
+def append_frame(path, changes, meta=None):
+    """
+    Brings the frame at `path` up to date by appending `changes`, a list of
+    (version, rows, targets) as merge_rows takes them, each as a chunk of its
+    own: the cost follows the size of the changes, not of the frame. Returns
+    False, writing nothing, when the frame already has MAX_CHUNKS chunks or
+    its appended rows would outnumber its base chunk; the caller then writes
+    the whole frame with write_frame, which compacts it into one chunk.
+    """
+    previous = _read_manifest(path)
+    if previous is None or not changes:
+        return False
+    chunks = previous["chunks"]
+    appended = sum(chunk["rows"] for chunk in chunks[1:]) + sum(len(rows) for _, rows, _ in changes)
+    if len(chunks) + len(changes) > MAX_CHUNKS or appended > chunks[0]["rows"]:
+        return False
+    rows_total = previous["rows"]
+    for version, rows, targets in changes:
+        chunks = chunks + [_write_chunk(path, rows, version, targets)]
+        rows_total += int((np.asarray(targets) >= rows_total).sum())
+    _commit(path, {"rows": rows_total, "chunks": chunks, "meta": meta or {}}, previous)
+    return True
+
+def link_frame(source, path):
+    """
+    Makes `path` a copy of the frame at `source` whose data files are hard
+    links (plain copies where links are not supported). Data files are never
+    changed once written, so later writes to either frame leave the other alone.
+    """
+    manifest = _read_manifest(source)
+    os.makedirs(path, exist_ok=True)
+    for data_dir in _data_dirs(manifest):
+        os.makedirs(os.path.join(path, data_dir), exist_ok=True)
+        for name in os.listdir(os.path.join(source, data_dir)):
+            try:
+                os.link(os.path.join(source, data_dir, name), os.path.join(path, data_dir, name))
+            except OSError:
+                shutil.copyfile(os.path.join(source, data_dir, name), os.path.join(path, data_dir, name))
+    _commit(path, manifest, None)
+    return path
+
+def _read_chunk(path, chunk, mmap):
+    mode = 'r' if mmap else None
+    data = {}
+    for entry in chunk["columns"]:
+        values = np.load(os.path.join(path, entry["values"]), mmap_mode=mode, allow_pickle=False)
+        mask = np.load(os.path.join(path, entry["mask"]), allow_pickle=False) if entry["mask"] else None
+        dtype = pd.api.types.pandas_dtype(entry["dtype"])
+        if isinstance(dtype, pd.api.extensions.ExtensionDtype) and dtype.kind in "iufb":
+            mask = mask if mask is not None else np.zeros(len(values), dtype=bool)
+            data[entry["name"]] = dtype.construct_array_type()(values, mask)
+        elif entry.get("encoding") == "json":
+            column = np.full(len(values), None, dtype=object)
+            for position in np.flatnonzero(~mask if mask is not None else np.ones(len(values), dtype=bool)):
+                column[position] = json.loads(values[position])
+            data[entry["name"]] = pd.array(column, dtype=dtype)
+        elif values.dtype.kind == "U":
+            column = values.astype(object)
+            if mask is not None:
+                column[mask] = None
+            data[entry["name"]] = pd.array(column, dtype=dtype)
+        else:
+            data[entry["name"]] = values
+    rows = pd.DataFrame(data, index=pd.RangeIndex(chunk["rows"]), copy=False)
+    targets = np.load(os.path.join(path, chunk["targets"]), allow_pickle=False) if chunk["targets"] else None
+    return rows, targets
+
+def _read(path, read):
+    """Calls read(manifest) on the newest manifest, starting over if two newer writes remove its data meanwhile."""
+    while True:
+        manifest = _read_manifest(path)
+        if manifest is None:
+            raise FileNotFoundError(os.path.join(path, MANIFEST))
+        try:
+            return read(manifest)
+        except FileNotFoundError:
+            if _data_dirs(_read_manifest(path)) in (set(), _data_dirs(manifest)):
+                raise
+
+def read_frame(path, mmap=True):
+    """
+    Reads a frame written by write_frame (and append_frame). Returns (frame,
+    meta). With `mmap`, numeric columns of a frame in one chunk are read-only
+    views of the mapped files, shared with every other process reading the
+    same frame; appended chunks are merged into a copy.
+    """
+    def read(manifest):
+        frame = None
+        for chunk in manifest["chunks"]:
+            rows, targets = _read_chunk(path, chunk, mmap)
+            frame = rows if frame is None else merge_rows(frame, rows, targets)
+        return frame, manifest["meta"]
+    return _read(path, read)
+
+def read_changes(path, since):
+    """
+    The chunks of the frame at `path` appended after version `since`, as
+    (changes, meta) with changes as append_frame takes them, or (None, meta)
+    when they do not follow on from `since` (the frame was rewritten).
+    """
+    def read(manifest):
+        chunks = manifest["chunks"]
+        versions = [chunk["version"] for chunk in chunks]
+        if since is None or since not in versions:
+            return None, manifest["meta"]
+        start = versions.index(since) + 1
+        changes = []
+        for chunk in chunks[start:]:
+            rows, targets = _read_chunk(path, chunk, mmap=False)
+            changes.append((chunk["version"], rows, targets))
+        return changes, manifest["meta"]
+    return _read(path, read)
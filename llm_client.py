@@ -0,0 +1,232 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # optional; without it AsyncLLMClient is unavailable and fan-out runs LLMClient on threads
+    httpx = None
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+def backoff_delay(attempt, retry_after=None, base=0.5, cap=8.0):
+    """Full-jitter exponential backoff, or a numeric Retry-After header value when the server sent one."""
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), cap)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def _delta_content(data):
+    """The content of one streamed chat chunk, or None if the chunk is not valid JSON."""
+    try:
+        return json.loads(data).get('choices', [{}])[0].get('delta', {}).get('content') or ''
+    except json.JSONDecodeError:
+        return None
+
+class LLMClient:
+    """
+    One pooled, keep-alive HTTP client for an OpenAI-compatible API (Nebius AI
+    Studio). Requests that fail with a connection error or a 429/5xx status are
+    retried up to `max_retries` times with full-jitter exponential backoff,
+    honouring a numeric Retry-After header. Streams are only retried before
+    their first byte has been handed to the caller.
+
+    Every call records its timings in milliseconds: `connect_ms` from sending the
+    successful attempt until its response headers arrive (connection set-up
+    included, so it drops on a reused connection), `ttft_ms` until the first
+    streamed token and `total_ms` including retries.
+    Safe to share between threads.
+    """
+
+    def __init__(self, base_url, pool_maxsize=10, max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 connect_timeout=10, read_timeout=60, history=200):
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self._calls = deque(maxlen=history)
+
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        return backoff_delay(attempt, retry_after, self.backoff_base, self.backoff_max)
+
+    def _request(self, method, path, api_key, timings, **kwargs):
+        """Sends a request with retries. Returns the successful response; raises requests.RequestException otherwise."""
+        headers = {"Authorization": f"Bearer {api_key}", **kwargs.pop('headers', {})}
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.max_retries + 1):
+            timings['attempts'] = attempt + 1
+            try:
+                response = self.session.request(method, f"{self.base_url}{path}", headers=headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+            timings['status'] = response.status_code
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = self._backoff(attempt, response)
+                response.close()
+                time.sleep(delay)
+                continue
+            if not response.ok:
+                # Release the pooled connection first; a streamed response would otherwise hold it.
+                response.close()
+                response.raise_for_status()
+            return response
+
+    def _record(self, timings, started):
+        timings['total_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        with self._lock:
+            self._calls.append(timings)
+        return timings
+
+    def list_models(self, api_key):
+        """GET /models. Returns (model ids, timings)."""
+        started = time.perf_counter()
+        timings = {"endpoint": "models", "status": None, "attempts": 0}
+        try:
+            response = self._request('GET', '/models', api_key, timings)
+            timings['connect_ms'] = round(response.elapsed.total_seconds() * 1000, 2)
+            model_ids = [model['id'] for model in response.json().get('data', [])]
+        except Exception as e:
+            timings['error'] = str(e)
+            raise
+        finally:
+            self._record(timings, started)
+        return model_ids, timings
+
+    def stream_chat(self, api_key, model, messages, timings=None):
+        """
+        POST /chat/completions with stream=True. Yields content chunks as they
+        arrive. Pass a dict as `timings` to have it filled in while streaming.
+        """
+        started = time.perf_counter()
+        timings = timings if timings is not None else {}
+        timings.update({"endpoint": "chat", "model": model, "status": None, "attempts": 0})
+        payload = {"model": model, "messages": messages, "stream": True}
+        try:
+            response = self._request('POST', '/chat/completions', api_key, timings, json=payload, stream=True)
+            timings['connect_ms'] = round(response.elapsed.total_seconds() * 1000, 2)
+            done = False
+            with response:
+                # Read to the end of the body even after [DONE] so the connection goes back to the pool.
+                for line in response.iter_lines():
+                    if done or not line or not line.startswith(b'data: '):
+                        continue
+                    data = line[6:].decode('utf-8')
+                    if data.strip() == '[DONE]':
+                        done = True
+                        continue
+                    content = _delta_content(data)
+                    if content is None:
+                        timings['bad_chunks'] = timings.get('bad_chunks', 0) + 1
+                        continue
+                    if content:
+                        if 'ttft_ms' not in timings:
+                            timings['ttft_ms'] = round((time.perf_counter() - started) * 1000, 2)
+                        yield content
+        except Exception as e:
+            timings['error'] = str(e)
+            raise
+        finally:
+            self._record(timings, started)
+
+    def recent_calls(self):
+        """Timings of the most recent calls, oldest first."""
+        with self._lock:
+            return list(self._calls)
+
+    def close(self):
+        self.session.close()
+
+class AsyncLLMClient:
+    """
+    The asyncio counterpart of LLMClient for running many streams at once, on
+    one pooled httpx.AsyncClient of at most `max_connections` connections. Same
+    retry policy and timings as LLMClient. Requires httpx.
+    """
+
+    def __init__(self, base_url, max_connections=8, max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 connect_timeout=10, read_timeout=60):
+        if httpx is None:
+            raise RuntimeError("AsyncLLMClient requires httpx (pip install httpx).")
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections))
+
+    async def _open_stream(self, api_key, payload, timings):
+        """Opens the streaming request with retries. Returns the open response; raises httpx.HTTPError otherwise."""
+        headers = {"Authorization": f"Bearer {api_key}"}
+        for attempt in range(self.max_retries + 1):
+            timings['attempts'] = attempt + 1
+            request = self.client.build_request('POST', f"{self.base_url}/chat/completions", headers=headers, json=payload)
+            try:
+                response = await self.client.send(request, stream=True)
+            except (httpx.ConnectError, httpx.TimeoutException):
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, None, self.backoff_base, self.backoff_max))
+                continue
+            timings['status'] = response.status_code
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                await response.aclose()
+                await asyncio.sleep(backoff_delay(attempt, response.headers.get('Retry-After'),
+                                                  self.backoff_base, self.backoff_max))
+                continue
+            if response.is_error:
+                await response.aclose()
+                response.raise_for_status()
+            return response
+
+    async def stream_chat(self, api_key, model, messages, timings=None):
+        """POST /chat/completions with stream=True. Yields content chunks as they arrive; see LLMClient.stream_chat."""
+        started = time.perf_counter()
+        timings = timings if timings is not None else {}
+        timings.update({"endpoint": "chat", "model": model, "status": None, "attempts": 0})
+        payload = {"model": model, "messages": messages, "stream": True}
+        try:
+            response = await self._open_stream(api_key, payload, timings)
+            timings['connect_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            done = False
+            try:
+                async for line in response.aiter_lines():
+                    if done or not line.startswith('data: '):
+                        continue
+                    data = line[6:]
+                    if data.strip() == '[DONE]':
+                        done = True
+                        continue
+                    content = _delta_content(data)
+                    if content is None:
+                        timings['bad_chunks'] = timings.get('bad_chunks', 0) + 1
+                        continue
+                    if content:
+                        if 'ttft_ms' not in timings:
+                            timings['ttft_ms'] = round((time.perf_counter() - started) * 1000, 2)
+                        yield content
+            finally:
+                await response.aclose()
+        except Exception as e:
+            timings['error'] = str(e)
+            raise
+        finally:
+            timings['total_ms'] = round((time.perf_counter() - started) * 1000, 2)
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,102 @@
+import asyncio
+import itertools
+import queue
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_client import AsyncLLMClient, httpx
+
+_END = object()
+
+def plan_jobs(models, prompts):
+    """One job per (prompt, model) pair, each with a random job id that is also safe to use in file names."""
+    return [{"job_id": uuid.uuid4().hex[:12], "model": model, "prompt": prompt}
+            for prompt, model in itertools.product(prompts, models)]
+
+async def _threaded_stream(client, api_key, model, messages, timings):
+    """LLMClient.stream_chat driven from the event loop, one executor hop per chunk (used when httpx is missing)."""
+    chunks = client.stream_chat(api_key, model, messages, timings=timings)
+    try:
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, _END)
+            if chunk is _END:
+                return
+            yield chunk
+    finally:
+        try:
+            chunks.close()
+        except ValueError:  # cancelled while a worker thread was still inside next(); it finishes on its own
+            pass
+
+async def _fan_out(jobs, api_key, llm_client, concurrency, emit):
+    semaphore = asyncio.Semaphore(concurrency)
+    async_client = None
+    if httpx is not None:
+        connect_timeout, read_timeout = llm_client.timeout
+        async_client = AsyncLLMClient(llm_client.base_url, max_connections=concurrency,
+                                      max_retries=llm_client.max_retries, backoff_base=llm_client.backoff_base,
+                                      backoff_max=llm_client.backoff_max, connect_timeout=connect_timeout,
+                                      read_timeout=read_timeout)
+    else:
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(concurrency, thread_name_prefix='fanout'))
+
+    async def run(job):
+        async with semaphore:
+            job_id, timings = job['job_id'], {}
+            emit({"job_id": job_id, "status": "started"})
+            if async_client is not None:
+                chunks = async_client.stream_chat(api_key, job['model'], job['messages'], timings=timings)
+            else:
+                chunks = _threaded_stream(llm_client, api_key, job['model'], job['messages'], timings)
+            try:
+                async for chunk in chunks:
+                    emit({"job_id": job_id, "token": chunk})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                emit({"job_id": job_id, "status": "error", "error": str(e), "timings": timings})
+            else:
+                emit({"job_id": job_id, "status": "done", "timings": timings})
+            finally:
+                await chunks.aclose()
+
+    try:
+        await asyncio.gather(*(run(job) for job in jobs))
+    finally:
+        if async_client is not None:
+            await async_client.aclose()
+
+def stream_fanout(jobs, api_key, llm_client, concurrency=4):
+    """
+    Runs every job's chat completion concurrently, at most `concurrency` at a
+    time, on an event loop in a background thread, and yields their events in
+    arrival order: {"job_id", "status": "started"}, {"job_id", "token"} per
+    chunk, then {"job_id", "status": "done" | "error", "timings"[, "error"]}.
+    Each job needs "job_id", "model" and "messages". Uses AsyncLLMClient when
+    httpx is installed, otherwise `llm_client` on worker threads. Closing the
+    generator early cancels the jobs still running.
+    """
+    events = queue.Queue()
+    loop = asyncio.new_event_loop()
+    main = loop.create_task(_fan_out(jobs, api_key, llm_client, max(1, concurrency), events.put))
+
+    def run():
+        try:
+            loop.run_until_complete(main)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
+            events.put(_END)
+
+    thread = threading.Thread(target=run, name='llm-fanout', daemon=True)
+    thread.start()
+    try:
+        while (event := events.get()) is not _END:
+            yield event
+    finally:
+        if thread.is_alive():
+            loop.call_soon_threadsafe(main.cancel)
@@ -1,6 +1,11 @@
 import os
+import copy
+import json
+import queue
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import threading
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from datetime import datetime
 
 LOGS_DIR = './LOGS'
@@ -29,10 +34,74 @@ def initialize_session_dir():
     os.environ[SESSION_ENV_VAR] = session_dir_path
     return session_dir_path
 
-def configure_app_logger(app, session_path):
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, plus the traceback if there is one."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps one in every 1/rate records below WARNING per logger name, e.g.
+    {"werkzeug": 0.1} keeps every tenth request line. Warnings and errors, and
+    loggers without a rate, always pass. Deterministic, so counts stay exact.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = {name: rate for name, rate in rates.items() if rate < 1}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        rate = self.rates.get(record.name)
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        if rate <= 0:
+            return False
+        with self._lock:
+            count = self._counts.get(record.name, 0)
+            self._counts[record.name] = count + 1
+        return count % round(1 / rate) == 0
+
+class _PreparedQueueHandler(QueueHandler):
+    """
+    A QueueHandler that resolves the message and traceback text on the calling
+    thread but leaves formatting to the listener's handlers, so the text and
+    JSON-lines outputs can share one queue.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def configure_app_logger(app, session_path, use_queue=True, json_lines=False, sample_rates=None, worker=None):
     """
     Configures the entire logging system to unify app logs and request logs
     into a single, consistently formatted stream to both file and console.
+
+    With `use_queue` (the default) the loggers only enqueue records and a
+    QueueListener thread does the file and console I/O, stopped (and drained)
+    at exit. `json_lines` also writes main.jsonl with one JSON object per
+    record; `sample_rates` ({logger name: fraction}) thins out chatty loggers.
+    Processes sharing a session directory pass a `worker` id, which goes into
+    the file names so they do not rotate each other's files.
+    Returns the QueueListener, or None when logging synchronously.
     """
     # 1. Define a standard format for ALL log messages
     formatter = logging.Formatter(
@@ -40,7 +109,8 @@ def configure_app_logger(app, session_path):
     )
 
     # 2. Create the handler for writing to the session log file
-    log_file = os.path.join(session_path, 'main.log')
+    log_name = f"main.{worker}" if worker else 'main'
+    log_file = os.path.join(session_path, f"{log_name}.log")
     file_handler = RotatingFileHandler(log_file, maxBytes=1024 * 1024, backupCount=5)
     file_handler.setFormatter(formatter)
     
@@ -48,19 +118,39 @@ def configure_app_logger(app, session_path):
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
 
-    # 4. Hijack the Werkzeug logger (handles the GET/POST requests)
+    handlers = [file_handler, console_handler]
+    if json_lines:
+        jsonl_handler = RotatingFileHandler(os.path.join(session_path, f"{log_name}.jsonl"), maxBytes=1024 * 1024, backupCount=5)
+        jsonl_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(jsonl_handler)
+
+    # 4. Put a queue between the loggers and the handlers, so callers never wait on I/O
+    listener = None
+    attached = handlers
+    if use_queue:
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        attached = [_PreparedQueueHandler(log_queue)]
+    if sample_rates:
+        for handler in attached:
+            handler.addFilter(SamplingFilter(sample_rates))
+
+    # 5. Hijack the Werkzeug logger (handles the GET/POST requests)
     werkzeug_logger = logging.getLogger('werkzeug')
     werkzeug_logger.handlers.clear()
-    werkzeug_logger.addHandler(file_handler)
-    werkzeug_logger.addHandler(console_handler)
+    for handler in attached:
+        werkzeug_logger.addHandler(handler)
     werkzeug_logger.setLevel(logging.INFO)
     werkzeug_logger.propagate = False
 
-    # 5. Configure the main app's logger
+    # 6. Configure the main app's logger
     app.logger.handlers.clear()
-    app.logger.addHandler(file_handler)
-    app.logger.addHandler(console_handler)
+    for handler in attached:
+        app.logger.addHandler(handler)
     app.logger.setLevel(logging.INFO)
     app.logger.propagate = False
 
-    app.logger.info(f"Unified logger configured for session: {os.path.basename(session_path)}")
\ No newline at end of file
+    app.logger.info(f"Unified logger configured for session: {os.path.basename(session_path)}")
+    return listener
\ No newline at end of file
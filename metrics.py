@@ -0,0 +1,142 @@
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the latency buckets, in milliseconds.
+BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+PROMETHEUS_PREFIX = "alpha_sieve"
+
+class Histogram:
+    """Latency histogram over BUCKETS_MS (plus an overflow bucket), with count, sum, min and max."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, ms):
+        self.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.sum += ms
+        self.min = ms if self.min is None else min(self.min, ms)
+        self.max = ms if self.max is None else max(self.max, ms)
+
+    def quantile(self, q):
+        """Estimated from the buckets: the upper bound of the bucket holding the q-th observation, capped at max."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS_MS + (self.max,), self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count, "sum_ms": round(self.sum, 2), "mean_ms": round(self.sum / self.count, 2),
+                "min_ms": round(self.min, 2), "max_ms": round(self.max, 2),
+                "p50_ms": round(self.quantile(0.5), 2), "p95_ms": round(self.quantile(0.95), 2),
+                "p99_ms": round(self.quantile(0.99), 2)}
+
+class Metrics:
+    """
+    Per-process registry of stage latencies (histograms, in milliseconds), byte
+    totals and event counters, keyed by dotted stage names such as
+    "parse.excel_load". Stages that run in worker processes report their timings
+    in their results and are recorded here by the parent.
+    Safe to share between threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._bytes = {}
+        self._counters = {}
+        self.started = time.time()
+
+    def observe(self, stage, ms):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(ms)
+
+    def add_bytes(self, stage, n):
+        with self._lock:
+            self._bytes[stage] = self._bytes.get(stage, 0) + n
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def record_timings(self, prefix, timings):
+        """Observes every "<name>_ms" value of a timings dict as stage "<prefix>.<name>"."""
+        for key, value in timings.items():
+            if key.endswith('_ms') and isinstance(value, (int, float)):
+                self.observe(f"{prefix}.{key[:-3]}", value)
+
+    @contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, (time.perf_counter() - started) * 1000)
+
+    def timed(self, stage):
+        """Decorator form of timer()."""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "uptime_s": round(time.time() - self.started, 1),
+                "stages": {stage: histogram.summary() for stage, histogram in sorted(self._histograms.items())},
+                "bytes": dict(sorted(self._bytes.items())),
+                "counters": dict(sorted(self._counters.items())),
+            }
+
+    def prometheus(self):
+        """The registry in the Prometheus text exposition format (latencies in seconds)."""
+        lines = [f"# HELP {PROMETHEUS_PREFIX}_stage_seconds Latency of instrumented stages.",
+                 f"# TYPE {PROMETHEUS_PREFIX}_stage_seconds histogram"]
+        with self._lock:
+            for stage, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, n in zip(BUCKETS_MS, histogram.buckets):
+                    cumulative += n
+                    lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound / 1000:g}"}} {cumulative}')
+                lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum / 1000:.6f}')
+                lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+            lines += [f"# HELP {PROMETHEUS_PREFIX}_stage_bytes_total Bytes handled by instrumented stages.",
+                      f"# TYPE {PROMETHEUS_PREFIX}_stage_bytes_total counter"]
+            lines += [f'{PROMETHEUS_PREFIX}_stage_bytes_total{{stage="{stage}"}} {n}' for stage, n in sorted(self._bytes.items())]
+            lines += [f"# HELP {PROMETHEUS_PREFIX}_events_total Counted events.",
+                      f"# TYPE {PROMETHEUS_PREFIX}_events_total counter"]
+            lines += [f'{PROMETHEUS_PREFIX}_events_total{{event="{name}"}} {n}' for name, n in sorted(self._counters.items())]
+        return "\n".join(lines) + "\n"
+
+    def write_summary(self, path):
+        """Writes snapshot() as JSON, atomically."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+# The process-wide registry.
+metrics = Metrics()
@@ -0,0 +1,63 @@
+import threading
+import time
+
+class ModelCatalogue:
+    """
+    The remote model list, served from memory. A list older than `ttl` seconds
+    is still returned at once while a background refresh replaces it; the remote
+    API is called in the foreground only when nothing is cached yet or the
+    caller forces a refresh. Every successful refresh is handed to `on_refresh`
+    (model ids, fetch time) so it can be persisted.
+    """
+
+    def __init__(self, fetch, ttl=3600, models=None, fetched_at=0.0, on_refresh=None, logger=None):
+        self._fetch = fetch
+        self.ttl = ttl
+        self._models = list(models) if models else None
+        self._fetched_at = fetched_at if models else 0.0
+        self._on_refresh = on_refresh
+        self._logger = logger
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def is_stale(self):
+        return self._models is None or time.time() - self._fetched_at > self.ttl
+
+    def state(self):
+        return {"models": list(self._models or []), "fetched_at": self._fetched_at or None, "stale": self.is_stale(),
+                "refreshing": self._refreshing}
+
+    def refresh(self):
+        """Fetches the list now. Raises whatever `fetch` raises; the cached list is kept on failure."""
+        models = list(self._fetch())
+        fetched_at = time.time()
+        with self._lock:
+            self._models, self._fetched_at = models, fetched_at
+        if self._on_refresh is not None:
+            self._on_refresh(models, fetched_at)
+        return models
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        def run():
+            try:
+                models = self.refresh()
+                if self._logger:
+                    self._logger.info(f"Model catalogue refreshed in the background: {len(models)} models.")
+            except Exception as e:
+                if self._logger:
+                    self._logger.warning(f"Background model catalogue refresh failed: {e}")
+            finally:
+                self._refreshing = False
+        threading.Thread(target=run, daemon=True).start()
+
+    def get(self, force=False):
+        """The model ids: cached, refreshed in the background when stale, fetched now when empty or forced."""
+        if force or self._models is None:
+            return self.refresh()
+        if self.is_stale():
+            self._refresh_in_background()
+        return list(self._models)
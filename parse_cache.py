@@ -0,0 +1,61 @@
+import hashlib
+
+from disk_cache import DiskCache
+from parser import PARSER_VERSION
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ParseCache:
+    """
+    Caches parse results per workbook content hash, sheet name and parser version.
+    A workbook entry records its sheet names so a fully cached workbook never has to
+    be opened again; sheet entries hold the enriched profile (or the skip
+    outcome) for one sheet. Sheets that failed are not cached, so they are parsed
+    again next time rather than keep failing after a fix or a passing reader
+    problem. All entries of a workbook are tagged with its hash.
+    """
+
+    def __init__(self, path, max_bytes=512 * 1024 * 1024):
+        self.store = DiskCache(path, max_bytes=max_bytes)
+
+    @staticmethod
+    def _workbook_key(digest):
+        return f"workbook:{PARSER_VERSION}:{digest}"
+
+    @staticmethod
+    def _sheet_key(digest, sheet_name):
+        return f"sheet:{PARSER_VERSION}:{digest}:{sheet_name}"
+
+    def lookup(self, digest):
+        """
+        Returns (sheet_names, outcomes): the workbook's sheet names, or None if the
+        workbook is unknown, and the cached outcomes keyed by sheet name.
+        """
+        sheet_names = self.store.get(self._workbook_key(digest))
+        if sheet_names is None:
+            return None, {}
+        keys = {self._sheet_key(digest, name): name for name in sheet_names}
+        found = self.store.get_many(keys)
+        return sheet_names, {keys[key]: outcome for key, outcome in found.items()}
+
+    def store_workbook(self, digest, sheet_names):
+        self.store.set(self._workbook_key(digest), list(sheet_names), tag=digest)
+
+    def store_sheet(self, digest, outcome):
+        if outcome['error']:
+            return
+        entry = {"sheet": outcome['sheet'], "profile": outcome['profile'], "error": outcome['error']}
+        self.store.set(self._sheet_key(digest, outcome['sheet']), entry, tag=digest)
+
+    def invalidate(self, digest=None):
+        """Drops the entries of one workbook, or of every workbook if no hash is given."""
+        return self.store.invalidate(digest)
+
+    def stats(self):
+        return self.store.stats()
@@ -0,0 +1,213 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import metrics
+from parse_cache import file_hash
+from parser import parse_sheets
+from readers import open_workbook, resolve_reader
+
+SHEETS_PER_TASK = 8
+
+# --- Worker tasks (run inside the process pool) ---
+
+def _parse_head(path, sheets_per_task, reader):
+    """Opens a workbook, lists its sheets and parses the first chunk of them."""
+    with open_workbook(path, reader) as workbook:
+        sheet_names = list(workbook.sheet_names)
+        return sheet_names, parse_sheets(workbook, sheet_names[:sheets_per_task])
+
+def _parse_chunk(path, sheet_names, reader):
+    """Parses one chunk of sheets from a workbook."""
+    with open_workbook(path, reader) as workbook:
+        return parse_sheets(workbook, sheet_names)
+
+# --- Scheduling ---
+
+def _describe(exc):
+    return f"{type(exc).__name__}: {exc}"
+
+def _chunk_tasks(path, file_idx, sheet_names, indices, sheets_per_task, reader):
+    """Tasks parsing the sheets at `indices`; each task is tagged (file_idx, sheet indices)."""
+    batches = [indices[start:start + sheets_per_task] for start in range(0, len(indices), sheets_per_task)]
+    return [(_parse_chunk, (path, [sheet_names[i] for i in batch], reader), (file_idx, batch)) for batch in batches]
+
+def _sheet_event(file_idx, sheet_idx, outcome, cached):
+    return {"event": "sheet", "file_index": file_idx, "sheet_index": sheet_idx, "cached": cached, **outcome}
+
+def _run_serially(backlog):
+    while backlog:
+        fn, args, tag = backlog.popleft()
+        try:
+            yield tag, fn(*args), None
+        except Exception as e:
+            yield tag, None, e
+
+def _run_on_pool(backlog, workers, max_in_flight):
+    """
+    Runs the backlog's tasks on a process pool, yielding (tag, result, error) as
+    they finish. A worker that dies (killed for memory, crashed in a reader)
+    breaks the whole pool: the pool is replaced and the tasks it was running are
+    queued again, once each. A task caught in a second break fails with
+    BrokenProcessPool, so a workbook that kills its worker fails on its own.
+    """
+    pending = {}  # future -> (task, retried)
+    retries = deque()
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while backlog or retries or pending:
+            lost = []
+            while (retries or backlog) and len(pending) < max_in_flight:
+                source = retries if retries else backlog
+                task = source.popleft()
+                try:
+                    pending[pool.submit(task[0], *task[1])] = (task, source is retries)
+                except BrokenProcessPool as e:
+                    lost.append((task, source is retries, e))
+                    break
+            if not lost:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task, retried = pending.pop(future)
+                    try:
+                        outcome = future.result()
+                    except BrokenProcessPool as e:
+                        lost.append((task, retried, e))
+                        continue
+                    except Exception as e:
+                        yield task[2], None, e
+                        continue
+                    yield task[2], outcome, None
+            if lost:
+                pool.shutdown(wait=False, cancel_futures=True)
+                lost.extend((task, retried, lost[0][2]) for task, retried in pending.values())
+                pending.clear()
+                for task, retried, error in lost:
+                    if retried:
+                        yield task[2], None, error
+                    else:
+                        retries.append(task)
+                pool = ProcessPoolExecutor(max_workers=workers)
+        pool.shutdown()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def iter_parse_workbooks(paths, max_workers=None, sheets_per_task=SHEETS_PER_TASK, max_in_flight=None, cache=None,
+                         reader="auto"):
+    """
+    Parses several workbooks on a process pool and yields events as soon as they
+    are produced, in completion order:
+
+      {"event": "workbook", "file_index", "sheet_names", "cached"}  once a workbook is opened
+      {"event": "sheet", "file_index", "sheet_index", "sheet", "profile", "error", "elapsed", "stages", "cached"}
+      {"event": "file_error", "file_index", "error"}                at most once per workbook
+
+    Each workbook is first opened by one task that lists its sheets and parses the
+    first chunk; the rest of its sheets are fanned out in chunks of `sheets_per_task`.
+    No more than `max_in_flight` tasks (default: twice the worker count) are queued
+    on the pool at a time, so finished results never pile up faster than the caller
+    consumes them.
+
+    With a ParseCache, sheets already parsed from a workbook with the same content
+    are answered from the cache (elapsed 0, cached True) and only the rest are
+    scheduled; a fully cached workbook is never opened.
+
+    A task whose pool worker dies is retried once on a fresh pool; if it dies
+    again, its workbook gets a file_error and the other workbooks carry on.
+
+    The stage timings of parsed sheets are recorded in metrics as "parse.<stage>".
+
+    `reader` names the workbook reader backend (see readers.READERS); an unknown
+    or unavailable backend raises ValueError before anything is scheduled.
+    """
+    paths = list(paths)
+    reader = resolve_reader(reader)
+    workers = max_workers or os.cpu_count() or 1
+    backlog = deque()
+    digests = [None] * len(paths)
+    failed = set()
+
+    for file_idx, path in enumerate(paths):
+        if cache is not None:
+            try:
+                digests[file_idx] = file_hash(path)
+            except OSError as e:
+                failed.add(file_idx)
+                yield {"event": "file_error", "file_index": file_idx, "error": _describe(e)}
+                continue
+            sheet_names, outcomes = cache.lookup(digests[file_idx])
+            if sheet_names is not None:
+                yield {"event": "workbook", "file_index": file_idx, "sheet_names": sheet_names, "cached": True}
+                missing = []
+                for sheet_idx, sheet_name in enumerate(sheet_names):
+                    if sheet_name in outcomes:
+                        yield _sheet_event(file_idx, sheet_idx, {**outcomes[sheet_name], "elapsed": 0.0, "stages": {}},
+                                           cached=True)
+                    else:
+                        missing.append(sheet_idx)
+                backlog.extend(_chunk_tasks(path, file_idx, sheet_names, missing, sheets_per_task, reader))
+                continue
+        backlog.append((_parse_head, (path, sheets_per_task, reader), (file_idx, None)))
+
+    if workers <= 1:
+        completions = _run_serially(backlog)
+    else:
+        completions = _run_on_pool(backlog, workers, max_in_flight or workers * 2)
+
+    for (file_idx, indices), outcome, error in completions:
+        if error is not None:
+            if file_idx not in failed:
+                failed.add(file_idx)
+                yield {"event": "file_error", "file_index": file_idx, "error": _describe(error)}
+            continue
+        digest = digests[file_idx]
+        if indices is None:
+            sheet_names, outcome = outcome
+            if digest is not None:
+                cache.store_workbook(digest, sheet_names)
+            yield {"event": "workbook", "file_index": file_idx, "sheet_names": sheet_names, "cached": False}
+            indices = list(range(len(outcome)))
+            # Queue this workbook's remaining chunks ahead of other workbooks so
+            # files tend to finish one after another rather than all at the end.
+            remaining = list(range(len(outcome), len(sheet_names)))
+            backlog.extendleft(reversed(_chunk_tasks(paths[file_idx], file_idx, sheet_names, remaining, sheets_per_task, reader)))
+        for sheet_idx, sheet in zip(indices, outcome):
+            if digest is not None:
+                cache.store_sheet(digest, sheet)
+            metrics.record_timings("parse", sheet["stages"])
+            yield _sheet_event(file_idx, sheet_idx, sheet, cached=False)
+
+def parse_workbooks(paths, max_workers=None, sheets_per_task=SHEETS_PER_TASK, cache=None, reader="auto"):
+    """
+    Parses several workbooks in parallel and waits for all of them.
+
+    Returns one result dict per path, in the order of `paths`:
+    {"path", "profiles", "skipped", "sheet_errors", "cached", "error"}, where
+    "cached" counts the sheets answered from the parse cache. Profiles keep the
+    workbook's sheet order. A workbook that cannot be read (or kills its worker twice)
+    gets an "error" message and no profiles, without aborting the rest of the batch.
+    """
+    paths = list(paths)
+    results = [{"path": path, "profiles": {}, "skipped": [], "sheet_errors": {}, "cached": 0, "error": None} for path in paths]
+    sheets = [{} for _ in paths]
+    for event in iter_parse_workbooks(paths, max_workers=max_workers, sheets_per_task=sheets_per_task,
+                                      cache=cache, reader=reader):
+        if event['event'] == 'file_error':
+            results[event['file_index']]['error'] = event['error']
+        elif event['event'] == 'sheet':
+            sheets[event['file_index']][event['sheet_index']] = event
+
+    for result, outcomes in zip(results, sheets):
+        if result['error']:
+            continue
+        for sheet_index in sorted(outcomes):
+            outcome = outcomes[sheet_index]
+            result['cached'] += outcome['cached']
+            if outcome['error']:
+                result['sheet_errors'][outcome['sheet']] = outcome['error']
+            elif outcome['profile'] is None:
+                result['skipped'].append(outcome['sheet'])
+            else:
+                result['profiles'][outcome['sheet']] = outcome['profile']
+    return results
@@ -4,31 +4,46 @@ import pandas as pd
 import statistics
 from collections import Counter
 import math
+import time
+import functools
+from datetime import date
+
+from enrichment import enrich_profiles
+from readers import open_workbook
+
+# Bump whenever parsing or enrichment output changes, so cached parse results are not reused.
+PARSER_VERSION = "2"
 
 # --- Utility functions ---
 
+_EMPTY_CELLS = ("", "N/A", "-")
+_CURRENCY_RE = re.compile(r"^([+-]?\d+(\.\d+)?)\s*(SOL|USDC)$", re.IGNORECASE)
+_DURATION_RE = re.compile(r"^([+-]?\d+(\.\d+)?)\s*(sec|min|h|day)s?$", re.IGNORECASE)
+_DURATION_FACTORS = {"sec": 1, "min": 60, "h": 3600, "day": 86400}
+_GROUPED_NUMBER_RE = re.compile(r"^[\d,]+(\.\d+)?$")
+_SI_RE = re.compile(r"^([+-]?\d+(\.\d+)?)([KMB])$")
+_SI_MULTIPLIERS = {"K": 1e3, "M": 1e6, "B": 1e9}
+_DATE_ROW_RE = re.compile(r"(\d{2}\.\d{2}\.\d{4}):")
+
 def sanitize(raw: str):
     """Clean a raw spreadsheet cell string into number, dict, or original."""
     if raw is None:
         return None
     raw = str(raw).strip()
-    if raw in ("", "N/A", "-"):
+    if raw in _EMPTY_CELLS:
         return None
     if raw.endswith("%"):
         try:
             return float(raw[:-1])
         except ValueError:
             return raw
-    m = re.match(r"^([+-]?\d+(\.\d+)?)\s*(SOL|USDC)$", raw, re.IGNORECASE)
+    m = _CURRENCY_RE.match(raw)
     if m:
         return {"value": float(m.group(1)), "currency": m.group(3).upper()}
-    m = re.match(r"^([+-]?\d+(\.\d+)?)\s*(sec|min|h|day)s?$", raw, re.IGNORECASE)
+    m = _DURATION_RE.match(raw)
     if m:
-        v = float(m.group(1))
-        unit = m.group(3).lower()
-        factors = {"sec": 1, "min": 60, "h": 3600, "day": 86400}
-        return v * factors[unit]
-    if re.match(r"^[\d,]+\.\d+$", raw) or re.match(r"^[\d,]+$", raw):
+        return float(m.group(1)) * _DURATION_FACTORS[m.group(3).lower()]
+    if _GROUPED_NUMBER_RE.match(raw):
         try:
             return float(raw.replace(",", ""))
         except ValueError:
@@ -43,17 +58,99 @@ def parse_si(s: str):
     if s is None:
         return None
     s = str(s).strip().upper()
-    m = re.match(r"^([+-]?\d+(\.\d+)?)([KMB])$", s)
+    m = _SI_RE.match(s)
     if m:
-        num = float(m.group(1))
-        suf = m.group(3)
-        mult = {"K": 1e3, "M": 1e6, "B": 1e9}[suf]
-        return num * mult
+        return float(m.group(1)) * _SI_MULTIPLIERS[m.group(3)]
     try:
         return float(s)
     except (ValueError, TypeError):
         return None
 
+# --- Column-typed sanitization ---
+# Each converter takes one column of stripped cell strings and returns the same
+# values sanitize() would, taking a single precompiled match for the cell format
+# the column's header promises and deferring anything else to sanitize().
+
+def _sanitize_currency_column(cells):
+    out = []
+    for raw in cells:
+        m = _CURRENCY_RE.match(raw)
+        out.append({"value": float(m.group(1)), "currency": m.group(3).upper()} if m else sanitize(raw))
+    return out
+
+def _sanitize_duration_column(cells):
+    out = []
+    for raw in cells:
+        m = _DURATION_RE.match(raw)
+        out.append(float(m.group(1)) * _DURATION_FACTORS[m.group(3).lower()] if m else sanitize(raw))
+    return out
+
+def _sanitize_percent_column(cells):
+    out = []
+    for raw in cells:
+        if raw.endswith("%"):
+            try:
+                out.append(float(raw[:-1]))
+            except ValueError:
+                out.append(raw)
+        else:
+            out.append(sanitize(raw))
+    return out
+
+def _sanitize_number_column(cells):
+    out = []
+    for raw in cells:
+        # A plain or comma-grouped number cannot be mistaken for any earlier sanitize() case.
+        if _GROUPED_NUMBER_RE.match(raw):
+            try:
+                out.append(float(raw.replace(",", "")))
+            except ValueError:  # commas and no digits, kept as is like sanitize() does
+                out.append(raw)
+        else:
+            out.append(sanitize(raw))
+    return out
+
+_FLOAT_WORDS = {"inf", "infinity", "nan"}
+
+def _sanitize_text_column(cells):
+    out = []
+    for raw in cells:
+        # Cells starting with a letter only become numbers when float() spells them out.
+        if raw[:1].isalpha() and raw not in _EMPTY_CELLS and not raw.endswith("%") and raw.lower() not in _FLOAT_WORDS:
+            out.append(raw)
+        else:
+            out.append(sanitize(raw))
+    return out
+
+def _sanitize_generic_column(cells):
+    return [sanitize(raw) for raw in cells]
+
+def _parse_mcap_column(cells):
+    out = []
+    for raw in cells:
+        parts = raw.split()
+        out.append({
+            "on_first_buy": parse_si(parts[0]) if len(parts) > 0 else None,
+            "on_last_tx": parse_si(parts[1]) if len(parts) > 1 else None,
+            "now": parse_si(parts[2]) if len(parts) > 2 else None,
+        })
+    return out
+
+def _column_converter(header):
+    """Infers a trade column's cell format once from its header ("Delta Sol", "Duration", "Delta %"...)."""
+    h = header.lower()
+    if h.endswith(" sol") or h.endswith(" usdc"):
+        return _sanitize_currency_column
+    if h == "duration":
+        return _sanitize_duration_column
+    if h.endswith("%"):
+        return _sanitize_percent_column
+    if h.endswith("income"):
+        return _sanitize_number_column
+    if h in ("token", "1st buy on"):
+        return _sanitize_text_column
+    return _sanitize_generic_column
+
 def _safe_divide(numerator, denominator):
     """Helper for safe division to avoid ZeroDivisionError."""
     if denominator is None or numerator is None or denominator == 0 or (isinstance(denominator, float) and math.isnan(denominator)):
@@ -100,58 +197,84 @@ def _max_drawdown(pnl_series):
 
 # --- Core Parsing ---
 
+MCAP_HEADER = "MCAP 1st Buy / Last Tx / Now"
+
+def _strings(cells):
+    """A row or column of the sheet's cell array as a list of str, like DataFrame.astype(str)."""
+    values = cells.tolist()
+    if set(map(type, values)) <= {str}:
+        return values
+    return [v if isinstance(v, str) else str(v) for v in values]
+
+@functools.lru_cache(maxsize=4096)
+def _iso_date(day_first):
+    """ISO date of a "dd.mm.yyyy" string; unusual values get pandas' day-first parsing."""
+    day, month, year = day_first.split(".")
+    try:
+        return date(int(year), int(month), int(day)).isoformat()
+    except ValueError:
+        return pd.to_datetime(day_first, dayfirst=True).date().isoformat()
+
 def parse_sheet_to_raw_data(df: pd.DataFrame):
-    """Parse one sheet into a raw structure for later processing."""
-    data = df.fillna("").astype(str).values.tolist()
-    max_row = len(data)
-    
+    """
+    Parse one sheet into a raw structure for later processing. Only the first
+    column is scanned row by row (for anchors and date separators); the trade
+    table is sanitized a whole column at a time.
+    """
+    cells = df.to_numpy(dtype=object, copy=True)
+    cells[pd.isna(cells)] = ""
+    max_row = len(cells)
+    first_col = [v.strip().lower() for v in _strings(cells[:, 0])] if cells.shape[1] else [""] * max_row
+
     wallet_info = {}
-    anchor_row = next((i for i, row in enumerate(data) if str(row[0]).strip().lower().startswith("wallet")), 0)
+    anchor_row = next((i for i, v in enumerate(first_col) if v.startswith("wallet")), 0)
     for r in (anchor_row, anchor_row + 2):
         if r + 1 >= max_row: continue
-        for c, raw_h in enumerate(data[r]):
-            h = str(raw_h).strip()
+        header_row, value_row = _strings(cells[r]), _strings(cells[r + 1])
+        for c, raw_h in enumerate(header_row):
+            h = raw_h.strip()
             if not h: continue
-            val = data[r + 1][c]
             if h.lower() != "balance":
-                 wallet_info[h] = sanitize(val)
+                 wallet_info[h] = sanitize(value_row[c])
 
-    token_anchor_row = next((i for i, row in enumerate(data) if str(row[0]).strip().lower() == "token"), -1)
+    token_anchor_row = next((i for i, v in enumerate(first_col) if v == "token"), -1)
     trades = []
     daily_pnl = {}
     if token_anchor_row != -1:
-        headers = [str(h).strip() for h in data[token_anchor_row]]
+        headers = [h.strip() for h in _strings(cells[token_anchor_row])]
         spl_col_idx = headers.index("SPL Income") if "SPL Income" in headers else -1
-        mcap_col_idx = headers.index("MCAP 1st Buy / Last Tx / Now") if "MCAP 1st Buy / Last Tx / Now" in headers else -1
-        
-        current_date = None
-        for r in range(token_anchor_row + 1, max_row):
-            row_str = str(data[r][0]).strip()
-            if row_str.lower().startswith("related wallets"): break
-            
-            m = re.match(r"(\d{2}\.\d{2}\.\d{4}):", row_str)
+        mcap_col_idx = headers.index(MCAP_HEADER) if MCAP_HEADER in headers else -1
+
+        end_row = next((r for r in range(token_anchor_row + 1, max_row) if first_col[r].startswith("related wallets")), max_row)
+        block = cells[token_anchor_row + 1:end_row]
+
+        # Date separator rows ("dd.mm.yyyy:") open a new day for the trades below them.
+        row_dates, current_date = [], None
+        for row_str in _strings(block[:, 0]):
+            m = _DATE_ROW_RE.match(row_str.strip())
             if m:
-                current_date = pd.to_datetime(m.group(1), dayfirst=True).date().isoformat()
+                current_date = _iso_date(m.group(1))
                 daily_pnl.setdefault(current_date, 0.0)
-            
-            if spl_col_idx == -1 or not data[r][spl_col_idx].strip(): continue
+            row_dates.append(current_date)
 
-            trade = {}
+        if spl_col_idx != -1:
+            is_trade = [bool(v.strip()) for v in _strings(block[:, spl_col_idx])]
+            trade_rows = block[is_trade]
+            trade_dates = [d for d, keep in zip(row_dates, is_trade) if keep]
+            keys, columns = [], []
             for c, h in enumerate(headers):
-                raw = data[r][c]
+                column = [v.strip() for v in _strings(trade_rows[:, c])]
                 if c == mcap_col_idx:
-                    parts = str(raw).strip().split()
-                    trade["market_cap"] = {
-                        "on_first_buy": parse_si(parts[0]) if len(parts) > 0 else None,
-                        "on_last_tx": parse_si(parts[1]) if len(parts) > 1 else None,
-                        "now": parse_si(parts[2]) if len(parts) > 2 else None,
-                    }
+                    keys.append("market_cap")
+                    columns.append(_parse_mcap_column(column))
                 else:
-                    trade[h] = sanitize(raw)
-            
-            if current_date and isinstance(trade.get('Delta Sol'), dict):
-                daily_pnl[current_date] += trade['Delta Sol'].get('value', 0.0)
-            trades.append(trade)
+                    keys.append(h)
+                    columns.append(_column_converter(h)(column))
+            trades = [dict(zip(keys, values)) for values in zip(*columns)] if columns else [{} for _ in trade_dates]
+
+            for trade, current_date in zip(trades, trade_dates):
+                if current_date and isinstance(trade.get('Delta Sol'), dict):
+                    daily_pnl[current_date] += trade['Delta Sol'].get('value', 0.0)
 
     return { "wallet_info": wallet_info, "trades": trades, "daily_pnl": daily_pnl }
 
@@ -255,28 +378,75 @@ def create_enriched_profile(raw_data):
 
 # --- Main execution flow ---
 
-def parse_workbook(path: str):
+def _read_sheet(workbook, sheet_name, stages):
+    """
+    Reads one sheet of an open workbook into raw data. Returns None if the sheet holds no wallet.
+    Records the time spent loading and parsing the sheet in `stages` (milliseconds).
+    """
+    started = time.perf_counter()
+    df = workbook.read_sheet(sheet_name)
+    loaded = time.perf_counter()
+    stages["excel_load_ms"] = (loaded - started) * 1000
+    raw_data = parse_sheet_to_raw_data(df)
+    stages["parse_sheet_ms"] = (time.perf_counter() - loaded) * 1000
+    if not raw_data.get('wallet_info') or not raw_data['wallet_info'].get('Wallet'):
+        return None
+    return raw_data
+
+def parse_sheets(workbook, sheet_names):
+    """
+    Parses the given sheets of a workbook opened with readers.open_workbook, in order. Returns one outcome dict
+    per sheet: {"sheet", "profile", "error", "elapsed", "stages"}, where "profile" is None for
+    sheets without wallet info or that failed, and "elapsed" is in seconds.
+    The sheets' wallets are enriched together in one batch; each sheet's elapsed
+    time includes an even share of that batch. "stages" splits the time into
+    excel_load_ms, parse_sheet_ms and enrich_ms, as far as the sheet got.
+    """
+    outcomes, raw_datas, enriched_outcomes = [], [], []
+    for sheet_name in sheet_names:
+        started = time.perf_counter()
+        outcome = {"sheet": sheet_name, "profile": None, "error": None, "stages": {}}
+        try:
+            raw_data = _read_sheet(workbook, sheet_name, outcome["stages"])
+            if raw_data is not None:
+                raw_datas.append(raw_data)
+                enriched_outcomes.append(outcome)
+        except Exception as e:
+            outcome["error"] = str(e)
+        outcome["elapsed"] = time.perf_counter() - started
+        outcomes.append(outcome)
+
+    if raw_datas:
+        started = time.perf_counter()
+        enriched = enrich_profiles(raw_datas)
+        share = (time.perf_counter() - started) / len(raw_datas)
+        for outcome, (profile, error) in zip(enriched_outcomes, enriched):
+            outcome["profile"] = profile
+            outcome["error"] = str(error) if error is not None else None
+            outcome["elapsed"] += share
+            outcome["stages"]["enrich_ms"] = share * 1000
+    return outcomes
+
+def parse_workbook(path: str, reader: str = "auto"):
     """
     Parses an entire Excel workbook and returns a dictionary of enriched profiles,
-    keyed by sheet name.
+    keyed by sheet name. `reader` picks the backend (see readers.READERS).
     """
     try:
-        xls = pd.ExcelFile(path)
+        workbook = open_workbook(path, reader)
     except Exception as e:
         print(f"Error reading Excel file {path}: {e}")
         return {}
-        
+
     all_profiles = {}
-    for sheet_name in xls.sheet_names:
-        try:
-            df = xls.parse(sheet_name=sheet_name, header=None, dtype=str)
-            raw_data = parse_sheet_to_raw_data(df)
-            if not raw_data.get('wallet_info') or not raw_data['wallet_info'].get('Wallet'):
-                print(f"Skipping sheet '{sheet_name}' in '{path}' - no wallet info found.")
-                continue
-            enriched_profile = create_enriched_profile(raw_data)
-            all_profiles[sheet_name] = enriched_profile
-        except Exception as e:
-            print(f"Error processing sheet '{sheet_name}' in file '{path}': {e}")
-            continue
-    return all_profiles
\ No newline at end of file
+    with workbook:
+        outcomes = parse_sheets(workbook, workbook.sheet_names)
+    for outcome in outcomes:
+        sheet_name = outcome['sheet']
+        if outcome['error']:
+            print(f"Error processing sheet '{sheet_name}' in file '{path}': {outcome['error']}")
+        elif outcome['profile'] is None:
+            print(f"Skipping sheet '{sheet_name}' in '{path}' - no wallet info found.")
+        else:
+            all_profiles[sheet_name] = outcome['profile']
+    return all_profiles
@@ -0,0 +1,146 @@
+import csv
+import io
+import json
+import math
+import re
+
+import pandas as pd
+
+from session_store import flatten_profile
+
+FORMATS = ("json", "json_min", "table")
+OVERFLOW_STRATEGIES = ("sample", "summarize")
+PLACEHOLDER = '${wallets_json}'
+SUMMARY_STATS = ("mean", "min", "25%", "50%", "75%", "max")
+
+_TOKEN_PIECE_RE = re.compile(r"[A-Za-z]+|\d+|\s*\n\s*|\s{2,}|[^\sA-Za-z\d]")
+
+def estimate_tokens(text):
+    """
+    Rough BPE token count without a tokenizer: letters count one token per four
+    characters, digits one per three, a line break or indentation run one, every
+    other non-space character one. Errs high on JSON and CSV, which is the safe
+    side for a budget.
+    """
+    tokens = 0
+    for piece in _TOKEN_PIECE_RE.findall(text):
+        if piece[0].isalpha():
+            tokens += math.ceil(len(piece) / 4)
+        elif piece[0].isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        else:  # punctuation, or a whitespace run
+            tokens += 1
+    return tokens
+
+def round_floats(value, sig_digits):
+    """Rounds every float in a nested structure to `sig_digits` significant digits; NaN/inf become None."""
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            return None
+        rounded = float(f"{value:.{sig_digits}g}")
+        return int(rounded) if rounded.is_integer() and abs(rounded) < 1e15 else rounded
+    if isinstance(value, dict):
+        return {key: round_floats(item, sig_digits) for key, item in value.items()}
+    if isinstance(value, list):
+        return [round_floats(item, sig_digits) for item in value]
+    return value
+
+def _table(rows, index_label=None):
+    """
+    CSV with one header line of flattened "category.metric" names, one line per
+    row. `rows` is a list of flat dicts, or a dict of them labelled in a first
+    `index_label` column.
+    """
+    labelled = rows.items() if index_label else ((None, row) for row in rows)
+    columns = list(dict.fromkeys(key for row in (rows.values() if index_label else rows) for key in row))
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(([index_label] if index_label else []) + columns)
+    for label, row in labelled:
+        writer.writerow(([label] if index_label else []) + ["" if row.get(c) is None else row.get(c) for c in columns])
+    return out.getvalue()
+
+def serialize_wallets(wallets, fmt="json_min", sig_digits=None):
+    """
+    Wallet profiles as prompt text: "json" (indented, as the prompts were
+    written against), "json_min" (no whitespace) or "table" (CSV, one row per
+    wallet). `sig_digits` rounds floats first.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown wallet format '{fmt}'. Choose one of: {', '.join(FORMATS)}.")
+    if sig_digits:
+        wallets = round_floats(wallets, sig_digits)
+    if fmt == "json":
+        return json.dumps(wallets, indent=2)
+    if fmt == "json_min":
+        return json.dumps(wallets, separators=(",", ":"))
+    return _table([flatten_profile(wallet) for wallet in wallets])
+
+def summarize_wallets(wallets):
+    """
+    Per-metric distribution (mean, min, quartiles, max) over the wallets, keyed
+    by "category.metric"; empty when no metric is numeric (or there are no wallets).
+    """
+    frame = pd.DataFrame([flatten_profile(wallet) for wallet in wallets])
+    numeric = frame.apply(pd.to_numeric, errors="coerce").dropna(axis=1, how="all")
+    if numeric.columns.empty:
+        return {}
+    described = numeric.describe().loc[list(SUMMARY_STATS)]
+    return {stat: {column: (None if pd.isna(value) else float(value)) for column, value in row.items()}
+            for stat, row in described.iterrows()}
+
+def _spread(n, k):
+    """k indices spread evenly over range(n), so a sample keeps the selection's order and extremes."""
+    return [round(i * (n - 1) / (k - 1)) for i in range(k)] if k > 1 else [0][:k]
+
+def _summarized_text(wallets, summary, sample, fmt, sig_digits):
+    if fmt == "table":
+        return (f"Summary of all {len(wallets)} selected wallets:\n{_table(summary, index_label='stat')}\n"
+                f"Sample of {len(sample)} of those wallets:\n{serialize_wallets(sample, fmt, sig_digits)}")
+    body = {"total_wallets": len(wallets), "summary": summary, "wallets_sample": round_floats(sample, sig_digits) if sig_digits else sample}
+    return json.dumps(body, indent=2) if fmt == "json" else json.dumps(body, separators=(",", ":"))
+
+def build_prompt(template, wallets, fmt="json_min", sig_digits=None, token_budget=None, overflow="summarize"):
+    """
+    Fills ${wallets_json} in `template` with the serialized wallets. When the
+    estimated prompt exceeds `token_budget`, the wallets are cut down to the
+    largest evenly spread sample that fits ("sample") or to a per-metric summary
+    of all of them plus such a sample ("summarize").
+    Returns (prompt, report) where `report` describes what was sent.
+    """
+    if overflow not in OVERFLOW_STRATEGIES:
+        raise ValueError(f"Unknown overflow strategy '{overflow}'. Choose one of: {', '.join(OVERFLOW_STRATEGIES)}.")
+
+    summary = None
+
+    def render(k, summarized):
+        sample = [wallets[i] for i in _spread(len(wallets), k)]
+        if summarized:
+            text = _summarized_text(wallets, summary, sample, fmt, sig_digits)
+        else:
+            text = serialize_wallets(sample, fmt, sig_digits)
+        prompt = template.replace(PLACEHOLDER, text)
+        return prompt, estimate_tokens(prompt)
+
+    prompt, tokens = render(len(wallets), False)
+    strategy, sent = "none", len(wallets)
+    if token_budget and tokens > token_budget and wallets:
+        strategy = overflow
+        summarized = overflow == "summarize"
+        if summarized:
+            summary = summarize_wallets(wallets)
+            summary = round_floats(summary, sig_digits) if sig_digits else summary
+        # Largest k whose prompt fits, by bisection; k = 0 (summary alone, or no wallets) is the floor.
+        low, high = 0, len(wallets) - 1
+        while low < high:
+            mid = (low + high + 1) // 2
+            if render(mid, summarized)[1] <= token_budget:
+                low = mid
+            else:
+                high = mid - 1
+        sent = low
+        prompt, tokens = render(sent, summarized)
+    report = {"format": fmt, "sig_digits": sig_digits, "wallets_selected": len(wallets), "wallets_sent": sent,
+              "overflow_strategy": strategy, "estimated_tokens": tokens, "chars": len(prompt),
+              "token_budget": token_budget, "over_budget": bool(token_budget and tokens > token_budget)}
+    return prompt, report
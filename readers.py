@@ -0,0 +1,145 @@
+from datetime import date, datetime, time, timedelta
+
+import openpyxl
+import pandas as pd
+
+try:
+    import python_calamine
+except ImportError:  # optional, faster backend
+    python_calamine = None
+
+# Strings pandas.read_excel turns into NaN by default; the streaming readers do the
+# same so every backend hands parse_sheet_to_raw_data identical cells.
+NA_STRINGS = frozenset({
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+})
+
+def _rows_until_terminator(rows):
+    """
+    Collects rows up to and including the "Related wallets" row that ends the
+    token table, trimming trailing empty cells and trailing empty rows the way
+    pandas does. Stops early only once the wallet and token anchors have been
+    seen, so the result parses exactly like the full sheet.
+    """
+    collected, last_filled = [], 0
+    seen_wallet = seen_token = False
+    for row in rows:
+        while row and row[-1] is None:
+            row.pop()
+        collected.append(row)
+        if not row:
+            continue
+        last_filled = len(collected)
+        first = row[0].strip().lower() if row[0] is not None else ""
+        if first.startswith("wallet"):
+            seen_wallet = True
+        elif first == "token":
+            seen_token = seen_wallet
+        elif first.startswith("related wallets") and seen_token:
+            break
+    collected = collected[:last_filled]
+    width = max((len(row) for row in collected), default=0)
+    return pd.DataFrame([row + [None] * (width - len(row)) for row in collected], dtype=object)
+
+# --- Backends ---
+
+class PandasReader:
+    """pd.ExcelFile with the default engine; loads every sheet in full."""
+
+    def __init__(self, path):
+        self._xls = pd.ExcelFile(path)
+        self.sheet_names = list(self._xls.sheet_names)
+
+    def read_sheet(self, sheet_name):
+        return self._xls.parse(sheet_name=sheet_name, header=None, dtype=str)
+
+    def close(self):
+        self._xls.close()
+
+class OpenpyxlReader:
+    """openpyxl in read-only mode, streaming rows and stopping at the "Related wallets" row."""
+
+    def __init__(self, path):
+        self._book = openpyxl.load_workbook(path, read_only=True, data_only=True, keep_links=False)
+        self.sheet_names = list(self._book.sheetnames)
+
+    @staticmethod
+    def _cell(cell):
+        value = cell.value
+        if value is None or cell.data_type == 'e':
+            return None
+        if cell.data_type == 'n' and int(value) == value:
+            value = int(value)
+        text = str(value)
+        return None if text in NA_STRINGS else text
+
+    def read_sheet(self, sheet_name):
+        sheet = self._book[sheet_name]
+        sheet.reset_dimensions()
+        return _rows_until_terminator([self._cell(cell) for cell in row] for row in sheet.iter_rows())
+
+    def close(self):
+        self._book.close()
+
+class CalamineReader:
+    """The Rust calamine engine (python-calamine), stopping at the "Related wallets" row."""
+
+    def __init__(self, path):
+        self._book = python_calamine.CalamineWorkbook.from_path(path)
+        self.sheet_names = list(self._book.sheet_names)
+
+    @staticmethod
+    def _cell(value):
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        elif isinstance(value, (datetime, date)) and not isinstance(value, time):
+            value = pd.Timestamp(value)
+        elif isinstance(value, timedelta):
+            value = pd.Timedelta(value)
+        text = str(value)
+        return None if text in NA_STRINGS else text
+
+    def read_sheet(self, sheet_name):
+        sheet = self._book.get_sheet_by_name(sheet_name)
+        return _rows_until_terminator([self._cell(value) for value in row] for row in sheet.iter_rows())
+
+    def close(self):
+        self._book.close()
+
+READERS = {"pandas": PandasReader, "openpyxl": OpenpyxlReader, "calamine": CalamineReader}
+
+def resolve_reader(reader="auto"):
+    """Maps a configured reader name to an available backend name."""
+    if reader in (None, "", "auto"):
+        return "calamine" if python_calamine is not None else "openpyxl"
+    if reader not in READERS:
+        raise ValueError(f"Unknown excel reader '{reader}'. Choose one of: auto, {', '.join(READERS)}.")
+    if reader == "calamine" and python_calamine is None:
+        raise ValueError("The 'calamine' excel reader needs the python-calamine package.")
+    return reader
+
+class open_workbook:
+    """
+    Opens a workbook with the named reader backend ("pandas", "openpyxl",
+    "calamine" or "auto"). Use as a context manager; the result has
+    `sheet_names` and `read_sheet(name)`, which returns the sheet as a
+    header-less DataFrame of strings, NaN for empty cells.
+    """
+
+    def __init__(self, path, reader="auto"):
+        self.reader = resolve_reader(reader)
+        self._workbook = READERS[self.reader](path)
+        self.sheet_names = self._workbook.sheet_names
+
+    def read_sheet(self, sheet_name):
+        return self._workbook.read_sheet(sheet_name)
+
+    def close(self):
+        self._workbook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,220 @@
+import base64
+import binascii
+import json
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from session_store import SEP, _plain_values
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+FORMATS = ("records", "compact")
+ORDERS = ("asc", "desc")
+
+class StaleCursor(ValueError):
+    """The session changed under the cursor or result set in a way paging cannot follow; the query has to start over."""
+
+def encode_cursor(state):
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise ValueError("Malformed cursor.")
+    if not isinstance(state, dict) or not {"v", "o", "s", "d", "r"} <= state.keys():
+        raise ValueError("Malformed cursor.")
+    # bool is an int subclass, so the offset and version are checked by exact type.
+    if (type(state["v"]) is not int or type(state["o"]) is not int or state["o"] < 0
+            or not isinstance(state["d"], bool)
+            or not all(state[key] is None or isinstance(state[key], str) for key in ("s", "r"))):
+        raise ValueError("Malformed cursor.")
+    return state
+
+def _resolve_fields(fields, flat, layout):
+    """
+    Projected columns, wallet_address first. A field is a flat "category.metric"
+    column or a whole category, which stands for all of its columns.
+    """
+    columns = ["wallet_address"] if "wallet_address" in flat.columns else []
+    for field in fields or flat.columns:
+        if field in flat.columns:
+            expanded = [field]
+        elif layout.get(field):
+            expanded = [f"{field}{SEP}{sub_key}" for sub_key in layout[field] if f"{field}{SEP}{sub_key}" in flat.columns]
+        else:
+            raise ValueError(f"Unknown field '{field}'.")
+        columns.extend(column for column in expanded if column not in columns)
+    return columns
+
+def _nest(columns, rows, layout):
+    """Compact rows back in the nested profile shape, holding only the projected metrics."""
+    items = []
+    for row in rows:
+        item = {}
+        for column, value in zip(columns, row):
+            key, _, sub_key = column.partition(SEP)
+            if sub_key and layout.get(key) is not None:
+                item.setdefault(key, {})[sub_key] = value
+            else:
+                item[column] = value
+        items.append(item)
+    return items
+
+class ResultsQuery:
+    """
+    Serves the session's wallets a page at a time: sorted on any flat
+    "category.metric" column, projected to the requested fields, and optionally
+    restricted to a filter's result set. Cursors are opaque offsets bound to the
+    session version, sort and result set they were issued for. Upserts only
+    replace rows in place or append them (rows never move), so a result set
+    keeps paging on later versions as long as none of its wallets was replaced,
+    and so does an unsorted cursor over the whole session; anything else on a
+    later version is a StaleCursor. Sort orders are
+    computed once per (version, result set, sort) and kept in a small LRU, so
+    paging through a large session does not sort it again for every page.
+    Given a `result_store` (a DiskCache), result sets are also written there,
+    so worker processes sharing it can page through each other's results.
+    Safe to share between threads.
+    """
+
+    def __init__(self, max_result_sets=32, max_orders=16, result_store=None):
+        self._lock = threading.Lock()
+        self._result_sets = OrderedDict()  # result_id -> {"version", "addresses"}
+        self._orders = OrderedDict()  # (version, result_id, sort, descending) -> row positions
+        self.max_result_sets = max_result_sets
+        self.max_orders = max_orders
+        self.result_store = result_store
+
+    def add_result_set(self, addresses, version):
+        """
+        Remembers a filter's matched addresses, found on session `version`, and
+        returns the new result set's id. The oldest sets are dropped past the limit.
+        """
+        result_id = uuid.uuid4().hex
+        result_set = {"version": version, "addresses": [address for address in addresses if address is not None]}
+        if self.result_store is not None:
+            self.result_store.set(f"result_set:{result_id}", result_set)
+        self._remember(result_id, result_set)
+        return result_id
+
+    def _remember(self, result_id, result_set):
+        with self._lock:
+            self._result_sets[result_id] = result_set
+            self._result_sets.move_to_end(result_id)
+            while len(self._result_sets) > self.max_result_sets:
+                self._result_sets.popitem(last=False)
+
+    def result_set(self, result_id):
+        with self._lock:
+            if result_id in self._result_sets:
+                return self._result_sets[result_id]
+        result_set = self.result_store.get(f"result_set:{result_id}") if self.result_store is not None else None
+        if result_set is None:
+            raise KeyError(result_id)
+        self._remember(result_id, result_set)
+        return result_set
+
+    def _rows(self, snapshot, result_id):
+        if result_id is None:
+            return np.arange(len(snapshot))
+        try:
+            result_set = self.result_set(result_id)
+        except KeyError:
+            raise ValueError(f"Unknown or expired result set '{result_id}'.")
+        if result_set["version"] != snapshot.version:
+            changes = snapshot.changes_since(result_set["version"])
+            if changes is None:
+                raise StaleCursor(f"Result set '{result_id}' was found on session v{result_set['version']}, which has "
+                                  f"since been replaced (now v{snapshot.version}). Run the filter again.")
+            changed = {address for _, rows, _ in changes if 'wallet_address' in rows.columns
+                       for address in _plain_values(rows['wallet_address'])}
+            if not changed.isdisjoint(result_set["addresses"]):
+                raise StaleCursor(f"Wallets in result set '{result_id}' were replaced after session "
+                                  f"v{result_set['version']}. Run the filter again.")
+        return np.asarray(snapshot.positions(result_set["addresses"]), dtype=np.int64)
+
+    def _follows(self, snapshot, state):
+        """
+        Whether a cursor from an earlier version still pages the same rows: a
+        result set's cursor does while its result set does (see _rows), an
+        unsorted cursor over the session does while only upserts happened.
+        """
+        if state["v"] == snapshot.version or state["r"] is not None:
+            return True
+        return state["s"] is None and snapshot.changes_since(state["v"]) is not None
+
+    def _order(self, snapshot, flat, result_id, sort, descending):
+        key = (snapshot.version, result_id, sort, descending)
+        with self._lock:
+            if key in self._orders:
+                self._orders.move_to_end(key)
+                return self._orders[key]
+        rows = self._rows(snapshot, result_id)
+        if sort is not None:
+            # The flat frame has a RangeIndex, so the sorted index is the row positions; missing values sort last.
+            try:
+                values = flat[sort].take(rows)
+                rows = values.sort_values(ascending=not descending, na_position="last", kind="stable").index.to_numpy()
+            except TypeError:
+                raise ValueError(f"Column '{sort}' holds values that cannot be sorted.")
+        with self._lock:
+            self._orders[key] = rows
+            while len(self._orders) > self.max_orders:
+                self._orders.popitem(last=False)
+        return rows
+
+    def columns(self, snapshot):
+        """The sortable, projectable columns of a snapshot: [{"name", "dtype", "numeric"}]."""
+        flat = snapshot.frame
+        return [{"name": column, "dtype": str(flat[column].dtype), "numeric": pd.api.types.is_numeric_dtype(flat[column])}
+                for column in flat.columns]
+
+    def query(self, snapshot, cursor=None, limit=DEFAULT_LIMIT, sort=None, order="asc", fields=None,
+              result_id=None, fmt="records"):
+        """
+        One page of wallets. A cursor continues the query it was issued by, so
+        `sort`, `order` and `result_id` are taken from it; `limit`, `fields` and
+        `fmt` may change from page to page. "records" returns nested profile
+        dicts as "items"; "compact" returns "columns" plus "rows" of values.
+        Raises ValueError for bad parameters and StaleCursor when the session
+        changed since the cursor was issued in a way it cannot follow.
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format '{fmt}'. Choose one of: {', '.join(FORMATS)}.")
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        offset = 0
+        if cursor:
+            state = decode_cursor(cursor)
+            if not self._follows(snapshot, state):
+                raise StaleCursor(f"The session changed (v{state['v']} -> v{snapshot.version}) since this cursor was issued.")
+            offset, sort, descending, result_id = state["o"], state["s"], state["d"], state["r"]
+        else:
+            if order not in ORDERS:
+                raise ValueError(f"Unknown order '{order}'. Choose one of: {', '.join(ORDERS)}.")
+            descending = order == "desc"
+        flat = snapshot.frame
+        if sort is not None and sort not in flat.columns:
+            raise ValueError(f"Unknown sort column '{sort}'.")
+        columns = _resolve_fields(fields, flat, snapshot.layout)
+
+        rows = self._order(snapshot, flat, result_id, sort, descending)
+        page = rows[offset:offset + limit]
+        values = [_plain_values(flat[column].take(page)) for column in columns]
+        records = [list(row) for row in zip(*values)] if values else [[] for _ in page]
+        next_offset = offset + len(page)
+        next_cursor = None
+        if next_offset < len(rows):
+            next_cursor = encode_cursor({"v": snapshot.version, "o": next_offset, "s": sort, "d": descending, "r": result_id})
+
+        result = {"version": snapshot.version, "result_id": result_id, "total": len(rows), "offset": offset,
+                  "sort": sort, "order": "desc" if descending else "asc", "next_cursor": next_cursor}
+        if fmt == "compact":
+            result.update(columns=columns, rows=records)
+        else:
+            result["items"] = _nest(columns, records, snapshot.layout)
+        return result
@@ -0,0 +1,62 @@
+"""
+Production launch: serves app.py from several gunicorn worker processes, each
+running a pool of threads, instead of Flask's single-process development server.
+
+    python serve.py                              # 2 workers x 8 threads on 127.0.0.1:5000
+    python serve.py --workers 4 --bind 0.0.0.0:8000
+
+The workers share one session directory in ./LOGS. Its session snapshot,
+config.json and filter result sets are the shared state (see shared_state.py),
+so any worker can answer any request. Logs, artifacts, metrics and filter-pool
+frames are kept per worker. Requires gunicorn (pip install gunicorn), which
+runs on Linux and macOS.
+"""
+import argparse
+import os
+import sys
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+from logger_setup import initialize_session_dir
+from shared_state import SHARED_STATE_ENV_VAR
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run Alpha Sieve under gunicorn with several workers.")
+    parser.add_argument("--workers", type=int, default=2, help="worker processes (default 2)")
+    parser.add_argument("--threads", type=int, default=8,
+                        help="threads per worker; AI streams are capped below this by max_streams_per_worker (default 8)")
+    parser.add_argument("--bind", default="127.0.0.1:5000", help="address to listen on (default 127.0.0.1:5000)")
+    parser.add_argument("--timeout", type=int, default=600,
+                        help="seconds a worker may go silent before it is restarted; covers long parses (default 600)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if BaseApplication is None:
+        sys.exit("serve.py needs gunicorn: pip install gunicorn (or run `python app.py` for the development server).")
+
+    # Set before any worker starts, so every worker joins this session directory and shares its state.
+    initialize_session_dir()
+    os.environ[SHARED_STATE_ENV_VAR] = '1'
+
+    class AlphaSieveServer(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", args.bind)
+            self.cfg.set("workers", args.workers)
+            self.cfg.set("threads", args.threads)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("timeout", args.timeout)
+            # Each worker imports the app itself: its thread pools and the filter pool's processes do not survive a fork.
+            self.cfg.set("preload_app", False)
+
+        def load(self):
+            from app import app
+            return app
+
+    AlphaSieveServer().run()
+
+if __name__ == '__main__':
+    main()
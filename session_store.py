@@ -0,0 +1,406 @@
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from frame_files import MAX_CHUNKS, append_frame, merge_rows, read_changes, read_frame, read_meta, write_frame
+
+SEP = "."
+
+def flatten_profile(profile):
+    """Flattens one level of nesting: {"a": {"b": 1}, "c": 2} -> {"a.b": 1, "c": 2}."""
+    row = {}
+    for key, value in profile.items():
+        if isinstance(value, dict):
+            for sub_key, sub_value in value.items():
+                row[f"{key}{SEP}{sub_key}"] = sub_value
+        else:
+            row[key] = value
+    return row
+
+def _typed_column(values):
+    """
+    A column with a proper dtype: int64 or float64 when the values allow it,
+    nullable Int64 for ints with gaps, and pandas' own inference otherwise.
+    """
+    kinds = set(map(type, values))
+    numeric = kinds - {type(None)}
+    if numeric and numeric <= {int}:
+        return pd.array(values, dtype="Int64") if type(None) in kinds else pd.array(values, dtype="int64")
+    if numeric <= {int, float}:
+        return pd.array([float("nan") if v is None else v for v in values], dtype="float64")
+    return pd.Series(values).array
+
+def _plain_values(column):
+    """A column's values as Python objects, missing values as None."""
+    return column.to_numpy(dtype=object, na_value=None).tolist()
+
+def _profiles(flat, layout):
+    """Rebuilds profile dicts, in the key order they were ingested with, from a flat frame."""
+    values = {column: _plain_values(flat[column]) for column in flat.columns}
+    missing = [None] * len(flat)
+    profiles = [{} for _ in range(len(flat))]
+    for key, sub_keys in layout.items():
+        if sub_keys is None:
+            for profile, value in zip(profiles, values.get(key, missing)):
+                profile[key] = value
+            continue
+        columns = [values.get(f"{key}{SEP}{sub_key}", missing) for sub_key in sub_keys]
+        for profile, row in zip(profiles, zip(*columns)):
+            profile[key] = dict(zip(sub_keys, row))
+    return profiles
+
+def nested_frame(flat, layout):
+    """The frame in the shape profiles have: one object column of dicts per category."""
+    profiles = _profiles(flat, layout)
+    return pd.DataFrame({key: [profile[key] for profile in profiles] for key in layout}, index=flat.index)
+
+class Snapshot:
+    """
+    A read-only view of the session at one version. `frame` and `nested_frame()`
+    hand out shallow copies; under pandas copy-on-write, whatever filter code does
+    to them never reaches the store or other snapshots.
+    """
+
+    def __init__(self, store, version, flat, layout, index, lineage, changes):
+        self._store = store
+        self.version = version
+        self._flat = flat
+        self.layout = layout
+        self._index = index
+        self.lineage = lineage
+        self._changes = changes
+
+    def __len__(self):
+        return len(self._flat)
+
+    @property
+    def frame(self):
+        """The flat, typed frame: one row per wallet, one "category.metric" column per value."""
+        return self._flat.copy(deep=False)
+
+    def nested_frame(self):
+        """This version's nested frame (see nested_frame), built once and cached by the store."""
+        return self._store._nested(self.version, self._flat, self.layout).copy(deep=False)
+
+    def profiles(self, positions=None):
+        """The wallets as profile dicts, in session order, or only those at the given row positions."""
+        flat = self._flat if positions is None else self._flat.iloc[list(positions)]
+        return _profiles(flat, self.layout)
+
+    def positions(self, addresses):
+        """Row positions of `addresses`, in the order given; addresses not in the session are left out."""
+        # The index is shared with later versions, which only ever add addresses past this one's rows.
+        n, index = len(self._flat), self._index
+        return [index[address] for address in addresses if index.get(address, n) < n]
+
+    def changes_since(self, version):
+        """
+        The upserts that turn `version` of this session into this one, as
+        [(version, rows, targets)] (see frame_files.merge_rows), or None when
+        they are not all kept: `version` is from before the last replace() or
+        load(), or too many upserts ago.
+        """
+        if version is None or version > self.version:
+            return None
+        changes = [change for change in self._changes if version < change[0] <= self.version]
+        return changes if [change[0] for change in changes] == list(range(version + 1, self.version + 1)) else None
+
+def _address(profile):
+    address = profile.get('wallet_address')
+    return address if isinstance(address, str) and address else None
+
+def _dedupe(profiles):
+    """Profiles with one entry per wallet_address, the last of several taking the place of the first."""
+    unique, seen = [], {}
+    for profile in profiles:
+        address = _address(profile)
+        if address is None:
+            unique.append(profile)
+        elif address in seen:
+            unique[seen[address]] = profile
+        else:
+            seen[address] = len(unique)
+            unique.append(profile)
+    return unique
+
+class SessionStore:
+    """
+    The wallets of the current session, one per wallet_address. Profiles are
+    flattened once, at ingest, into a typed columnar frame that stays resident
+    and is shared by every snapshot until the session changes. An address index
+    (address -> row) is kept alongside it, so upserts and lookups by address
+    cost O(1) per wallet. Every mutation bumps `version`.
+
+    The last upserts are kept as changes (see Snapshot.changes_since), so
+    save() and FilterPool.publish() can append them to what is already on
+    disk instead of writing the whole session again. `lineage` names the
+    sequence of versions they belong to; replace() and load() start a new one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flat = pd.DataFrame()
+        self._layout = {}  # top-level key -> list of sub-keys, or None for plain values
+        self._index = {}  # wallet_address -> row position; rows never move, so it only grows until replace()
+        self._nested_cache = (None, None)
+        self._lineage = uuid.uuid4().hex
+        self._changes = []  # [(version, rows, targets)] of the last upserts; replaced, never mutated
+        self.version = 0
+
+    def __len__(self):
+        return len(self._flat)
+
+    def _learn_layout(self, layout, profiles):
+        """`layout` extended with the keys of `profiles`; published layouts are never mutated."""
+        layout = {key: list(sub_keys) if sub_keys is not None else None for key, sub_keys in layout.items()}
+        for profile in profiles:
+            for key, value in profile.items():
+                if isinstance(value, dict):
+                    sub_keys = layout.setdefault(key, [])
+                    sub_keys.extend(sub_key for sub_key in value if sub_key not in sub_keys)
+                else:
+                    layout.setdefault(key, None)
+        return layout
+
+    def _frame_from(self, profiles):
+        rows = [flatten_profile(profile) for profile in profiles]
+        columns = {}
+        for row in rows:
+            for column in row:
+                columns.setdefault(column, None)
+        return pd.DataFrame({column: _typed_column([row.get(column) for row in rows]) for column in columns})
+
+    def _commit(self, flat, layout, nested=None):
+        self._flat = flat.reset_index(drop=True)
+        self._layout = layout
+        self.version += 1
+        self._nested_cache = (self.version, nested) if nested is not None else (None, None)
+
+    def _restart(self, lineage=None):
+        """Starts a new lineage (or takes the given one) with no changes kept; called with the lock held."""
+        self._lineage = lineage or uuid.uuid4().hex
+        self._changes = []
+
+    def _apply(self, rows, targets, layout):
+        """
+        Merges upserted rows into the session (see frame_files.merge_rows) and
+        keeps the change; called with the lock held.
+        """
+        n = len(self._flat)
+        nested = None
+        cached_version, cached = self._nested_cache
+        if n and cached_version == self.version and layout == self._layout:
+            nested = merge_rows(cached, nested_frame(rows, layout), targets)
+        flat = merge_rows(self._flat, rows, targets)
+        if 'wallet_address' in rows.columns:
+            for address, target in zip(_plain_values(rows['wallet_address']), targets):
+                if target >= n and isinstance(address, str) and address:
+                    self._index[address] = int(target)
+        self._commit(flat, layout, nested)
+        # Kept changes never outgrow the session itself, nor what append_frame would take.
+        changes = self._changes[-(MAX_CHUNKS - 1):] + [(self.version, rows, targets)]
+        while sum(len(change[1]) for change in changes) > len(self._flat):
+            changes.pop(0)
+        self._changes = changes
+
+    def replace(self, profiles):
+        """Replaces the session with the given profiles; of several with one wallet_address, the last wins."""
+        profiles = _dedupe(profiles)
+        index = {}
+        for position, profile in enumerate(profiles):
+            address = _address(profile)
+            if address is not None:
+                index[address] = position
+        with self._lock:
+            self._index = index
+            self._restart()
+            self._commit(self._frame_from(profiles), self._learn_layout({}, profiles))
+
+    def upsert(self, profiles):
+        """
+        Adds profiles to the session, replacing in place any wallet whose
+        wallet_address is already there. Returns {"added", "replaced"}.
+        Only the new profiles are flattened, indexed and (when the session's
+        nested frame is cached) nested. Merging them into the resident frames
+        is one vectorized concat and take, which still copies the whole frame
+        in memory; what is saved or published afterwards is only the change.
+        """
+        profiles = _dedupe(profiles)
+        if not profiles:
+            return {"added": 0, "replaced": 0}
+        added = self._frame_from(profiles)
+        with self._lock:
+            n = len(self._flat)
+            # Each profile takes the row of the wallet it replaces, or the next row past the end.
+            targets = np.empty(len(profiles), dtype=np.int64)
+            appended = 0
+            for i, profile in enumerate(profiles):
+                address = _address(profile)
+                position = self._index.get(address) if address is not None else None
+                if position is None:
+                    position = n + appended
+                    appended += 1
+                targets[i] = position
+            self._apply(added, targets, self._learn_layout(self._layout, profiles))
+        return {"added": appended, "replaced": len(profiles) - appended}
+
+    def clear(self):
+        self.replace([])
+
+    def save(self, path):
+        """
+        Writes the current version to `path` in the frame_files format (one .npy
+        per column plus a manifest holding the layout), atomically. When `path`
+        holds an earlier version of this lineage, only the upserts since are
+        appended (append_frame), until the frame is due for compaction.
+        Returns the version written.
+        """
+        snapshot = self.snapshot()
+        meta = {"layout": snapshot.layout, "version": snapshot.version, "wallets": len(snapshot),
+                "saved_at": time.time(), "lineage": snapshot.lineage}
+        saved = read_meta(path)
+        changes = None
+        if saved is not None and saved.get("lineage") == snapshot.lineage:
+            changes = snapshot.changes_since(saved.get("version"))
+        if changes == []:
+            return snapshot.version
+        if changes is None or not append_frame(path, changes, meta):
+            write_frame(snapshot.frame, path, meta)
+        return snapshot.version
+
+    def load(self, path, mmap=True, keep_version=False):
+        """
+        Replaces the session with one written by save(). With `mmap`, numeric
+        columns stay read-only views of the mapped files until a later ingest
+        copies them; nothing is reparsed or re-flattened. `keep_version` takes
+        the saved version as is, for processes sharing one snapshot; a store
+        already holding an earlier version of the saved lineage then only
+        merges in the upserts appended since. Returns the saved meta.
+        """
+        if keep_version:
+            with self._lock:
+                lineage, version = self._lineage, self.version
+            changes, meta = read_changes(path, version)
+            if changes is not None and meta.get("lineage") == lineage:
+                with self._lock:
+                    if (self._lineage, self.version) == (lineage, version):
+                        for _, rows, targets in changes:
+                            self._apply(rows, targets, meta["layout"])
+                        return meta
+        flat, meta = read_frame(path, mmap=mmap)
+        addresses = _plain_values(flat['wallet_address']) if 'wallet_address' in flat.columns else []
+        index = {address: position for position, address in enumerate(addresses) if address}
+        with self._lock:
+            self._index = index
+            if keep_version:
+                self._restart(meta.get("lineage"))
+                self._commit(flat, meta["layout"])
+                self.version = meta["version"]
+            else:
+                self._restart()
+                # Versions continue from the saved one, so cursors from before a restart are seen as stale.
+                self.version = max(self.version, meta.get("version", 0))
+                self._commit(flat, meta["layout"])
+        return meta
+
+    def snapshot(self):
+        with self._lock:
+            return Snapshot(self, self.version, self._flat, self._layout, self._index, self._lineage, self._changes)
+
+    def _nested(self, version, flat, layout):
+        """The nested frame of one version, built once and cached until the session changes."""
+        cached_version, cached = self._nested_cache
+        if cached_version == version:
+            return cached
+        nested = nested_frame(flat, layout)
+        with self._lock:
+            if self.version == version:
+                self._nested_cache = (version, nested)
+        return nested
+
+class SnapshotSaver:
+    """
+    Saves the session to `path` on a background thread whenever request()
+    is called, so ingest requests do not wait on the write. Requests that
+    arrive during a save collapse into one more save of the newest version;
+    versions already on disk, or current when the saver was created, are not
+    written again. close() saves what is pending and stops the thread; the
+    app registers it with atexit. A save that fails is logged, counted as
+    "session.snapshot_failures" in `metrics` and reported by status() until
+    a later save succeeds.
+    """
+
+    def __init__(self, store, path, logger=None, metrics=None):
+        self.store = store
+        self.path = path
+        self.logger = logger
+        self.metrics = metrics
+        self.saved_version = store.version
+        self.failures = 0  # consecutive failed saves
+        self.last_error = None
+        self._wanted = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='session-snapshot', daemon=True)
+        self._thread.start()
+
+    def request(self):
+        self._wanted.set()
+
+    def status(self):
+        """{"saved_version", "pending", "failures", "last_error"}; failures counts the saves failed since the last success."""
+        return {"saved_version": self.saved_version, "pending": self.store.version != self.saved_version,
+                "failures": self.failures, "last_error": self.last_error}
+
+    def _save(self):
+        if self.store.version == self.saved_version:
+            return
+        started = time.perf_counter()
+        try:
+            self.saved_version = self.store.save(self.path)
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            if self.metrics:
+                self.metrics.count("session.snapshot_failures")
+            if self.logger:
+                self.logger.error(f"Could not save the session snapshot: {e}", exc_info=True)
+            return
+        self.failures, self.last_error = 0, None
+        if self.logger:
+            self.logger.info(f"Session snapshot v{self.saved_version} ({len(self.store)} wallets) saved to "
+                             f"{self.path} in {(time.perf_counter() - started) * 1000:.0f} ms.")
+
+    def _run(self):
+        while not self._closed:
+            self._wanted.wait()
+            self._wanted.clear()
+            self._save()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wanted.set()
+        self._thread.join()
+        self._save()
+
+def find_snapshots(logs_dir, name):
+    """
+    Saved session snapshots under `logs_dir`, newest first, as
+    [{"session", "path", "wallets", "saved_at"}], where `name` is the snapshot
+    directory inside each session directory.
+    """
+    found = []
+    if not os.path.isdir(logs_dir):
+        return found
+    for session_name in os.listdir(logs_dir):
+        path = os.path.join(logs_dir, session_name, name)
+        meta = read_meta(path)
+        if meta is None:
+            continue
+        found.append({"session": session_name, "path": path, "wallets": meta.get("wallets"), "saved_at": meta.get("saved_at")})
+    return sorted(found, key=lambda snapshot: snapshot["saved_at"] or 0, reverse=True)
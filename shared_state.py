@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; locks then only hold between threads of one process
+    fcntl = None
+
+from frame_files import MANIFEST
+
+SHARED_STATE_ENV_VAR = 'ALPHA_SIEVE_SHARED_STATE'
+
+_thread_locks = {}
+_thread_locks_lock = threading.Lock()
+
+def shared_state_enabled():
+    """True in processes started by serve.py, which share the session and config with sibling workers."""
+    return os.environ.get(SHARED_STATE_ENV_VAR) == '1'
+
+@contextmanager
+def file_lock(path):
+    """An exclusive lock across processes (flock on `path`) and across the threads of this one."""
+    with _thread_locks_lock:
+        thread_lock = _thread_locks.setdefault(os.path.abspath(path), threading.Lock())
+    with thread_lock:
+        with open(path, 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+def _stamp(path):
+    """(inode, mtime, size) of a file, or None if it does not exist; changes whenever it is replaced."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+class SharedConfig:
+    """
+    config.json as shared by every process of the app. data() returns the
+    parsed file and re-reads it only when it changed on disk, which costs one
+    stat. Writes read-modify-write the file under a lock file, then write it
+    to a temp name and rename it, so concurrent writers never lose each
+    other's keys and readers never see half a file.
+    """
+
+    def __init__(self, path, defaults):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self._data = None
+        self._stamp = None
+        if not os.path.exists(path):
+            with file_lock(self.lock_path):
+                if not os.path.exists(path):
+                    self._write(dict(defaults))
+
+    def _write(self, data):
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self._data, self._stamp = data, _stamp(self.path)
+
+    def data(self):
+        stamp = _stamp(self.path)
+        if self._data is None or stamp != self._stamp:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self._data, self._stamp = data, stamp
+        return self._data
+
+    def update(self, changes):
+        """Merges `changes` into the file as it is now. Returns the new config."""
+        with file_lock(self.lock_path):
+            self._stamp = None  # re-read under the lock
+            data = dict(self.data())
+            data.update(changes)
+            self._write(data)
+            return data
+
+    def replace(self, data):
+        """Writes `data` as the whole config, dropping keys it does not have. Returns the new config."""
+        with file_lock(self.lock_path):
+            self._write(dict(data))
+            return self._data
+
+class SharedSession:
+    """
+    Keeps this process's SessionStore in step with the snapshot that every
+    worker reads and writes at `path` (see SessionStore.save). sync() reloads
+    the snapshot, memory-mapped, when another worker has replaced it, which
+    costs one stat when nothing changed; when the other worker only appended
+    upserts, just those are read and merged in. mutate() holds the session lock
+    across catching up, the change and a synchronous save, so changes made by
+    different workers apply one after another and session versions agree in
+    every process.
+    """
+
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self._seen = None
+
+    def _manifest_stamp(self):
+        return _stamp(os.path.join(self.path, MANIFEST))
+
+    def _catch_up(self):
+        stamp = self._manifest_stamp()
+        if stamp is None or stamp == self._seen:
+            return False
+        self.store.load(self.path, keep_version=True)
+        self._seen = stamp
+        return True
+
+    def sync(self):
+        """Loads the shared snapshot if another worker changed it. Returns whether it did."""
+        stamp = self._manifest_stamp()
+        if stamp is None or stamp == self._seen:
+            return False
+        with file_lock(self.lock_path):  # a writer replaces the directory while holding it
+            return self._catch_up()
+
+    @contextmanager
+    def mutate(self):
+        """Context for changing the session: yields the store, then saves it if its version moved."""
+        with file_lock(self.lock_path):
+            self._catch_up()
+            version = self.store.version
+            yield self.store
+            if self.store.version != version:
+                self.store.save(self.path)
+                self._seen = self._manifest_stamp()
@@ -2,7 +2,9 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- GLOBAL STATE ---
     let config = { api_key: '', starred_models: [], all_models: [], selected_model: '' };
-    const sessionState = { walletsArray: [], selectedGoodWallets: new Set() };
+    // Wallets stay on the server; the lists below fetch the pages they scroll to. Selection is by address.
+    const sessionState = { walletCount: 0, selectedGoodWallets: new Set() };
+    const WALLET_FIELDS = ['performance_and_risk.pnl_sol', 'performance_and_risk.roi_percent'];
 
     // --- UI ELEMENT REFERENCES ---
     const apiKeyInput = document.getElementById('api-key');
@@ -16,12 +18,32 @@ document.addEventListener('DOMContentLoaded', () => {
     const walletListContainer = document.getElementById('wallet-list-container');
     const goodWalletsBulkInput = document.getElementById('good-wallets-bulk-input');
     const learnFilterBtn = document.getElementById('learn-filter-btn');
+    const compareModelsBtn = document.getElementById('compare-models-btn');
     const codeInput = document.getElementById('code-input');
     const executeCodeBtn = document.getElementById('execute-code-btn');
+    const cancelExecuteBtn = document.getElementById('cancel-execute-btn');
     const copyCodeBtn = document.getElementById('copy-code-btn');
     const saveCodeBtn = document.getElementById('save-code-btn');
     const clearCodeBtn = document.getElementById('clear-code-btn');
     const resultsOutput = document.getElementById('results-output');
+    const parseStatus = document.getElementById('parse-status');
+    const appendFilesCheckbox = document.getElementById('append-files');
+    const sessionSelector = document.getElementById('session-selector');
+    const restoreSessionBtn = document.getElementById('restore-session-btn');
+    const snapshotWarning = document.getElementById('snapshot-warning');
+    const walletSort = document.getElementById('wallet-sort');
+    const walletOrder = document.getElementById('wallet-order');
+
+    const walletList = createVirtualList(walletListContainer, {
+        fields: WALLET_FIELDS,
+        renderRow: walletRowHtml,
+        emptyHtml: '<li>No wallets loaded.</li>'
+    });
+    const resultsList = createVirtualList(resultsOutput, {
+        fields: ['wallet_address'],
+        renderRow: (row) => `<li>${row.wallet_address}</li>`,
+        emptyHtml: '<li>No wallets matched the filter.</li>'
+    });
 
     // --- CORE LOGIC & EVENT LISTENERS ---
 
@@ -59,14 +81,13 @@ document.addEventListener('DOMContentLoaded', () => {
         btn.textContent = 'Refreshing...';
         btn.disabled = true;
         try {
-            const response = await fetch('/api/models');
+            // refresh=1 bypasses the server's model catalogue cache; the server saves the list itself.
+            const response = await fetch('/api/models?refresh=1');
             if (!response.ok) {
                 const err = await response.json();
                 throw new Error(err.error || 'Failed to fetch models from API');
             }
-            const models = await response.json();
-            config.all_models = models;
-            await saveConfig();
+            config.all_models = await response.json();
             alert('Model list refreshed and saved.');
         } catch (error) {
             alert('Error refreshing models: ' + error.message);
@@ -93,21 +114,102 @@ document.addEventListener('DOMContentLoaded', () => {
         for (const file of fileUpload.files) {
             formData.append('files', file);
         }
+
+        // Appending upserts the new wallets by address and keeps the rest of the session.
+        const mode = appendFilesCheckbox.checked ? 'append' : 'replace';
+        parseFilesBtn.disabled = true;
+        sessionState.walletCount = 0;
+        // While parsing, the list shows this upload's wallets as their sheets finish.
+        walletList.clear();
+        let sheetsTotal = 0, sheetsDone = 0, firstWalletMs = null;
+        const startedAt = performance.now();
+
         try {
-            const response = await fetch('/api/parse-files', { method: 'POST', body: formData });
+            // Each parsed sheet's event carries its wallet; once parsing is done the list pages the session in.
+            const response = await fetch(`/api/parse-files-stream?mode=${mode}`, { method: 'POST', body: formData });
             if (!response.ok) {
                 const errData = await response.json();
                 throw new Error(errData.error || 'Unknown parsing error');
             }
-            const data = await response.json();
-            sessionState.walletsArray = data.wallets;
-            displayWallets(data.wallets);
-            alert(`${data.wallets.length} total wallets parsed successfully.`);
+            let summary = null;
+            await readEventStream(response, (data) => {
+                if (data.error) throw new Error(`Stream error: ${data.error}`);
+                switch (data.event) {
+                    case 'workbook':
+                        sheetsTotal += data.sheets;
+                        break;
+                    case 'sheet':
+                        sheetsDone += 1;
+                        if (data.status === 'parsed') {
+                            if (firstWalletMs === null) firstWalletMs = performance.now() - startedAt;
+                            sessionState.walletCount += 1;
+                            walletList.append([flatWalletRow(data.wallet)]);
+                        }
+                        break;
+                    case 'done':
+                        summary = data;
+                        break;
+                }
+                parseStatus.textContent = `${sessionState.walletCount} wallets | ${sheetsDone}/${sheetsTotal} sheets`;
+            });
+            if (!summary) throw new Error('Stream ended before parsing finished.');
+
+            await populateSortSelector();
+            await loadWallets();
+            populateSessionSelector();
+
+            parseStatus.textContent = `${summary.wallets} wallets in ${(summary.elapsed_ms / 1000).toFixed(1)}s` +
+                (firstWalletMs !== null ? ` (first after ${(firstWalletMs / 1000).toFixed(1)}s)` : '') +
+                (mode === 'append' ? ` | ${summary.added} added, ${summary.replaced} replaced, ${summary.session_count} in session` : '');
+            if (summary.failures.length > 0) {
+                alert(`${summary.wallets} total wallets parsed.\n\n${summary.failures.length} file(s) failed:\n` +
+                    summary.failures.map(f => `${f.file}: ${f.error}`).join('\n'));
+            }
         } catch (error) {
+            parseStatus.textContent = '';
+            loadWallets().catch(() => walletList.clear());
             alert('Error parsing files: ' + error.message);
+        } finally {
+            parseFilesBtn.disabled = false;
         }
     });
-    
+
+    restoreSessionBtn.addEventListener('click', async () => {
+        const name = sessionSelector.value;
+        if (!name) {
+            alert('There is no saved session to restore.');
+            return;
+        }
+        restoreSessionBtn.disabled = true;
+        try {
+            const response = await fetch(`/api/sessions/${encodeURIComponent(name)}/restore`, { method: 'POST' });
+            const data = await response.json();
+            if (!response.ok) throw new Error(data.error || 'Unknown restore error');
+            await populateSortSelector();
+            await loadWallets();
+            parseStatus.textContent = `${data.wallets} wallets restored in ${Math.round(data.restore_ms)} ms`;
+        } catch (error) {
+            alert('Error restoring session: ' + error.message);
+        } finally {
+            restoreSessionBtn.disabled = false;
+        }
+    });
+
+    walletListContainer.addEventListener('change', (event) => {
+        if (event.target.type === 'checkbox') {
+            const address = event.target.dataset.address;
+            if (event.target.checked) {
+                sessionState.selectedGoodWallets.add(address);
+            } else {
+                sessionState.selectedGoodWallets.delete(address);
+            }
+            syncBulkInputFromCheckboxes();
+        }
+    });
+
+    walletSort.addEventListener('change', () => loadWallets());
+    walletOrder.addEventListener('change', () => loadWallets());
+
     goodWalletsBulkInput.addEventListener('input', () => {
         const pastedText = goodWalletsBulkInput.value;
         const addresses = pastedText.split(/[\s,;| \n\r]+/).filter(Boolean);
@@ -127,16 +229,17 @@ document.addEventListener('DOMContentLoaded', () => {
         learnFilterBtn.disabled = true;
         learnFilterBtn.textContent = 'Generating...';
         codeInput.value = '';
-        resultsOutput.innerHTML = '';
+        resultsList.clear();
+
+        // The server looks the selected profiles up in the session.
+        const selectedAddresses = Array.from(sessionState.selectedGoodWallets);
 
-        const selectedWallets = Array.from(sessionState.selectedGoodWallets).map(index => sessionState.walletsArray[index]);
-        
         try {
             const response = await fetch('/api/learn-filter-stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
-                    wallets: selectedWallets,
+                    addresses: selectedAddresses,
                     model: modelSelector.value,
                     promptTemplate: promptSelector.value
                 })
@@ -184,30 +287,116 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    compareModelsBtn.addEventListener('click', async () => {
+        if (sessionState.selectedGoodWallets.size === 0) {
+            alert('Select "GOOD" wallets first.');
+            return;
+        }
+        const models = config.starred_models || [];
+        if (models.length === 0 || !promptSelector.value) {
+            alert('Star at least one model and select a prompt template.');
+            return;
+        }
+
+        compareModelsBtn.disabled = true;
+        compareModelsBtn.textContent = 'Generating...';
+        codeInput.value = '';
+        resultsList.clear();
+
+        const selectedAddresses = Array.from(sessionState.selectedGoodWallets);
+        // One section per job, re-rendered as the interleaved token streams arrive.
+        const jobs = [];
+        const render = () => {
+            codeInput.value = jobs.map(job =>
+                `# --- ${job.model} / ${job.prompt} [${job.status}] ---\n${job.text}`).join('\n\n');
+        };
+
+        try {
+            const response = await fetch('/api/learn-filter-fanout', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    addresses: selectedAddresses,
+                    models: models,
+                    prompts: [promptSelector.value]
+                })
+            });
+
+            if (!response.ok) {
+                const errorText = await response.text();
+                throw new Error(`Server error: ${response.status} ${errorText}`);
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                for (const line of lines) {
+                    if (!line.startsWith('data: ')) continue;
+                    const data = JSON.parse(line.substring(6));
+                    if (data.jobs) {
+                        data.jobs.forEach(job => jobs.push({ ...job, status: 'queued', text: '' }));
+                    } else if (data.job_id) {
+                        const job = jobs.find(j => j.job_id === data.job_id);
+                        if (data.token) job.text += data.token;
+                        if (data.status) job.status = data.status;
+                        if (data.error) job.text += `\n# ERROR: ${data.error}`;
+                    }
+                }
+                render();
+            }
+        } catch (error) {
+            console.error('Model comparison stream failed:', error);
+            alert('An error occurred during generation: ' + error.message);
+        } finally {
+            compareModelsBtn.disabled = false;
+            compareModelsBtn.textContent = 'Compare Starred Models';
+        }
+    });
+
     executeCodeBtn.addEventListener('click', async () => {
         const code = codeInput.value.trim();
         if (!code) {
             alert('Code input is empty.');
             return;
         }
+        const jobId = crypto.randomUUID();
+        executeCodeBtn.disabled = true;
+        cancelExecuteBtn.disabled = false;
+        cancelExecuteBtn.dataset.jobId = jobId;
         try {
             const response = await fetch('/api/execute', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ code })
+                body: JSON.stringify({ code, job_id: jobId, inline: false })
             });
             if (!response.ok) {
                 const errData = await response.json();
                 throw new Error(errData.error || 'Unknown execution error');
             }
             const data = await response.json();
-            displayResults(data.results);
-            alert(`Execution successful. ${data.results.length} wallets matched the filter.`);
+            await resultsList.load({ result: data.result_id });
+            alert(`Execution successful. ${data.count} wallets matched the filter in ${Math.round(data.timings.total_ms)} ms.`);
         } catch (error) {
             alert('Code execution failed: ' + error.message);
+        } finally {
+            executeCodeBtn.disabled = false;
+            cancelExecuteBtn.disabled = true;
         }
     });
 
+    cancelExecuteBtn.addEventListener('click', async () => {
+        cancelExecuteBtn.disabled = true;
+        await fetch(`/api/execute/${cancelExecuteBtn.dataset.jobId}/cancel`, { method: 'POST' });
+    });
+
     copyCodeBtn.addEventListener('click', () => {
         if (!codeInput.value) return;
         navigator.clipboard.writeText(codeInput.value).then(() => alert('Code copied to clipboard!'))
@@ -236,57 +425,177 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- UI RENDERING & HELPER FUNCTIONS ---
 
-    function displayWallets(wallets) {
-        walletListContainer.innerHTML = wallets.map((wallet, index) => `
+    // A streamed profile in the flat shape /api/wallets pages rows in.
+    function flatWalletRow(profile) {
+        const row = { wallet_address: profile.wallet_address };
+        for (const field of WALLET_FIELDS) {
+            const [key, subKey] = field.split('.');
+            row[field] = profile[key] ? profile[key][subKey] : null;
+        }
+        return row;
+    }
+
+    function walletRowHtml(wallet, index) {
+        const checked = sessionState.selectedGoodWallets.has(wallet.wallet_address) ? 'checked' : '';
+        return `
             <li>
-                <input type="checkbox" id="wallet-check-${index}" data-index="${index}" data-address="${wallet.wallet_address}">
+                <input type="checkbox" id="wallet-check-${index}" data-index="${index}" data-address="${wallet.wallet_address}" ${checked}>
                 <label for="wallet-check-${index}" title="${wallet.wallet_address}">
                     ${wallet.wallet_address ? `${wallet.wallet_address.substring(0, 6)}...${wallet.wallet_address.substring(wallet.wallet_address.length - 6)}` : 'N/A'}
-                    | PnL: ${(wallet.performance_and_risk.pnl_sol || 0).toFixed(2)}
-                    | ROI: ${(wallet.performance_and_risk.roi_percent || 0).toFixed(1)}%
+                    | PnL: ${(Number(wallet['performance_and_risk.pnl_sol']) || 0).toFixed(2)}
+                    | ROI: ${(Number(wallet['performance_and_risk.roi_percent']) || 0).toFixed(1)}%
                 </label>
             </li>
-        `).join('');
-
-        walletListContainer.addEventListener('change', (event) => {
-            if (event.target.type === 'checkbox') {
-                const index = parseInt(event.target.dataset.index, 10);
-                if (event.target.checked) {
-                    sessionState.selectedGoodWallets.add(index);
-                } else {
-                    sessionState.selectedGoodWallets.delete(index);
-                }
-                syncBulkInputFromCheckboxes();
+        `;
+    }
+
+    async function loadWallets() {
+        await walletList.load(walletSort.value ? { sort: walletSort.value, order: walletOrder.value } : {});
+    }
+
+    async function populateSessionSelector() {
+        const response = await fetch('/api/sessions');
+        if (!response.ok) return;
+        const { sessions, snapshot } = await response.json();
+        sessionSelector.innerHTML = sessions.map(s =>
+            `<option value="${s.session}">${s.session}${s.current ? ' (current)' : ''} | ${s.wallets} wallets</option>`
+        ).join('');
+        snapshotWarning.textContent = snapshot && snapshot.last_error
+            ? `The session is not being saved (${snapshot.failures} failed attempts): ${snapshot.last_error}`
+            : '';
+    }
+
+    async function populateSortSelector() {
+        const response = await fetch('/api/wallets/columns');
+        if (!response.ok) return;
+        const { columns } = await response.json();
+        const current = walletSort.value;
+        walletSort.innerHTML = '<option value="">Upload order</option>' + columns.filter(c => c.numeric)
+            .map(c => `<option value="${c.name}" ${c.name === current ? 'selected' : ''}>${c.name}</option>`).join('');
+    }
+
+    /**
+     * A list that renders only the rows in view (plus some overscan) inside a
+     * spacer as tall as all of them, fetching compact pages from /api/wallets
+     * as scrolling reaches rows not loaded yet. Rows have a fixed height.
+     */
+    function createVirtualList(container, { fields, renderRow, emptyHtml, rowHeight = 40, pageSize = 200, overscan = 10 }) {
+        const spacer = document.createElement('div');
+        const rowsList = document.createElement('ul');
+        spacer.className = 'virtual-spacer';
+        rowsList.className = 'virtual-rows';
+        spacer.appendChild(rowsList);
+        let state = null;
+        let scheduled = false;
+
+        async function fetchPage(current) {
+            const query = new URLSearchParams({ ...current.params, limit: pageSize, format: 'compact', fields: fields.join(',') });
+            if (current.cursor) query.set('cursor', current.cursor);
+            const response = await fetch(`/api/wallets?${query}`);
+            const page = await response.json();
+            if (!response.ok) throw new Error(page.error || 'Could not load wallets');
+            if (current !== state) return;  // reloaded meanwhile
+            page.rows.forEach(values => current.rows.push(Object.fromEntries(page.columns.map((c, i) => [c, values[i]]))));
+            current.total = page.total;
+            current.cursor = page.next_cursor;
+        }
+
+        // Pages are fetched in order, each from the cursor of the one before, up to the last row in view.
+        function ensureLoaded(current, lastIndex) {
+            if (current.loading || current.rows.length > lastIndex || !current.cursor) return;
+            current.loading = fetchPage(current)
+                .catch(error => console.error('Failed to load wallet page:', error))
+                .finally(() => { current.loading = null; if (current === state) render(); });
+        }
+
+        function render() {
+            scheduled = false;
+            if (!state) return;
+            if (state.total === 0) {
+                rowsList.innerHTML = emptyHtml;
+                spacer.style.height = `${rowHeight}px`;
+                return;
+            }
+            spacer.style.height = `${state.total * rowHeight}px`;
+            const first = Math.max(0, Math.floor(container.scrollTop / rowHeight) - overscan);
+            const last = Math.min(state.total, Math.ceil((container.scrollTop + container.clientHeight) / rowHeight) + overscan);
+            rowsList.style.transform = `translateY(${first * rowHeight}px)`;
+            const html = [];
+            for (let i = first; i < last; i++) {
+                html.push(i < state.rows.length ? renderRow(state.rows[i], i) : '<li class="placeholder">Loading...</li>');
+            }
+            rowsList.innerHTML = html.join('');
+            ensureLoaded(state, last - 1);
+        }
+
+        container.addEventListener('scroll', () => {
+            if (!scheduled) {
+                scheduled = true;
+                requestAnimationFrame(render);
             }
         });
+
+        return {
+            async load(params) {
+                const current = { params: Object.fromEntries(Object.entries(params).filter(([, v]) => v != null)),
+                                  rows: [], total: 0, cursor: null, loading: null };
+                state = current;
+                container.innerHTML = '';
+                container.appendChild(spacer);
+                container.scrollTop = 0;
+                await fetchPage(current);
+                render();
+            },
+            // Shows rows the page already has, such as wallets streamed in while parsing, after those shown
+            // so far; the next load() goes back to paging from the server.
+            append(rows) {
+                if (!state || state.params !== null) {
+                    state = { params: null, rows: [], total: 0, cursor: null, loading: null };
+                    container.innerHTML = '';
+                    container.appendChild(spacer);
+                    container.scrollTop = 0;
+                }
+                state.rows.push(...rows);
+                state.total = state.rows.length;
+                if (!scheduled) {
+                    scheduled = true;
+                    requestAnimationFrame(render);
+                }
+            },
+            clear() {
+                state = null;
+                container.innerHTML = '';
+            },
+            render
+        };
     }
 
-    function syncCheckboxesFromAddressList(addresses) {
-        sessionState.selectedGoodWallets.clear();
-        const addressSet = new Set(addresses.map(a => a.trim()));
-        const allCheckboxes = walletListContainer.querySelectorAll('input[type="checkbox"]');
-        allCheckboxes.forEach(checkbox => {
-            const walletAddress = checkbox.dataset.address;
-            const index = parseInt(checkbox.dataset.index, 10);
-            checkbox.checked = addressSet.has(walletAddress);
-            if (checkbox.checked) {
-                sessionState.selectedGoodWallets.add(index);
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            for (const line of lines) {
+                if (line.startsWith('data: ') && line.length > 6) {
+                    onEvent(JSON.parse(line.substring(6)));
+                }
             }
-        });
+        }
     }
 
-    function syncBulkInputFromCheckboxes() {
-        const selectedAddresses = Array.from(sessionState.selectedGoodWallets)
-            .map(index => sessionState.walletsArray[index].wallet_address);
-        goodWalletsBulkInput.value = selectedAddresses.join('\n');
+    function syncCheckboxesFromAddressList(addresses) {
+        // Rows not rendered yet pick their checked state up from the set when they scroll into view.
+        sessionState.selectedGoodWallets = new Set(addresses.map(a => a.trim()));
+        walletList.render();
     }
 
-    function displayResults(results) {
-        if (!results || results.length === 0) {
-            resultsOutput.innerHTML = '<li>No wallets matched the filter.</li>';
-            return;
-        }
-        resultsOutput.innerHTML = results.map(w => `<li>${w.wallet_address}</li>`).join('');
+    function syncBulkInputFromCheckboxes() {
+        goodWalletsBulkInput.value = Array.from(sessionState.selectedGoodWallets).join('\n');
     }
     
     function setApiKeyStatus(status) {
@@ -324,11 +633,26 @@ document.addEventListener('DOMContentLoaded', () => {
             config = await configResponse.json();
             apiKeyInput.value = config.api_key || '';
             populateModelSelector();
+            // Served from the server's cache; a stale list is refreshed there in the background.
+            if (config.api_key) {
+                fetch('/api/models')
+                    .then(r => r.ok ? r.json() : null)
+                    .then(models => { if (models) config.all_models = models; })
+                    .catch(() => {});
+            }
 
             const promptsResponse = await fetch('/api/prompts');
             if (!promptsResponse.ok) throw new Error('Could not fetch prompts.');
             const prompts = await promptsResponse.json();
             promptSelector.innerHTML = prompts.map(p => `<option value="${p}">${p}</option>`).join('');
+
+            // The server may have restored the previous session's wallets at startup.
+            populateSessionSelector();
+            const columnsResponse = await fetch('/api/wallets/columns');
+            if (columnsResponse.ok && (await columnsResponse.json()).total > 0) {
+                await populateSortSelector();
+                await loadWallets();
+            }
         } catch (error) {
             console.error('Fatal initialization error:', error);
             alert('Could not initialize app from server: ' + error.message);
@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from benchmarks.bench_enrichment import check_equivalence
+from benchmarks.synthetic import edge_case_wallets, raw_wallet, raw_wallets, sol
+from enrichment import _Irregular, _columns, enrich_profiles
+
+def _wallet(trades, daily_pnl=None, seed=0):
+    wallet = raw_wallet(random.Random(seed), 3)
+    return {**wallet, "trades": trades, "daily_pnl": wallet["daily_pnl"] if daily_pnl is None else daily_pnl}
+
+def _trade(delta=1.0, spent=0.5, **cells):
+    return {"Token": "TOK1", "1st Buy On": "Raydium", "Spent Sol": sol(spent), "Delta Sol": sol(delta),
+            "Delta %": 10.0, "Duration": 60.0, "market_cap": {"on_first_buy": 1e4}, **cells}
+
+IRREGULAR = {
+    "nan delta": _wallet([_trade(delta=float("nan")), _trade()]),
+    "nan delta %": _wallet([_trade(**{"Delta %": float("nan")})]),
+    "nan daily pnl": _wallet([_trade()], daily_pnl={"2024-03-01": float("nan")}),
+    "infinite spent": _wallet([_trade(spent=float("inf"))]),
+    "text duration": _wallet([_trade(Duration="3 weeks")]),
+    "text delta": _wallet([_trade(delta="n/a")]),
+    "nan token": _wallet([_trade(Token=float("nan"))]),
+    "missing amount": _wallet([{"Delta Sol": None}]),
+}
+
+REGULAR = {
+    "no trades": _wallet([], daily_pnl={}),
+    "single trade": _wallet([_trade()]),
+    "single losing trade": _wallet([_trade(delta=-0.5)]),
+    "constant trades": _wallet([_trade(), _trade(), _trade()]),
+    "missing cells": _wallet([{"Delta Sol": sol(1.0)}, {"Spent Sol": sol(2.0)}]),
+    "bare wallet": {"wallet_info": {"Wallet": "x"}, "trades": [], "daily_pnl": {}},
+}
+
+@pytest.mark.parametrize("name", IRREGULAR)
+def test_irregular_wallets_fall_back_to_create_enriched_profile(name):
+    with pytest.raises(_Irregular):
+        _columns(IRREGULAR[name])
+    assert check_equivalence([IRREGULAR[name]]) == []
+
+@pytest.mark.parametrize("name", REGULAR)
+def test_edge_wallets_match_create_enriched_profile(name):
+    _columns(REGULAR[name])  # takes the vectorized path
+    assert check_equivalence([REGULAR[name]]) == []
+
+def test_mixed_batch_matches_create_enriched_profile():
+    raws = (edge_case_wallets(random.Random(0)) + list(IRREGULAR.values()) + list(REGULAR.values())
+            + raw_wallets(200, 30, seed=1))
+    random.Random(2).shuffle(raws)
+    assert check_equivalence(raws) == []
+    assert len(enrich_profiles(raws)) == len(raws)
+
+def test_empty_batch():
+    assert enrich_profiles([]) == []
@@ -0,0 +1,17 @@
+from prompt_payload import build_prompt, summarize_wallets
+
+def test_summarize_wallets_without_numeric_metrics():
+    assert summarize_wallets([]) == {}
+    assert summarize_wallets([{"wallet_address": "a"}, {"wallet_address": "b", "meta": {"platform": "Pump"}}]) == {}
+
+def test_summarize_wallets_skips_non_numeric_metrics():
+    summary = summarize_wallets([{"wallet_address": "a", "perf": {"pnl": 1.0}}, {"wallet_address": "b", "perf": {"pnl": 3.0}}])
+    assert list(summary["mean"]) == ["perf.pnl"]
+    assert summary["mean"]["perf.pnl"] == 2.0
+    assert summary["max"]["perf.pnl"] == 3.0
+
+def test_summarize_overflow_with_address_only_selection():
+    wallets = [{"wallet_address": f"wallet-{i:04d}"} for i in range(200)]
+    prompt, report = build_prompt("${wallets_json}", wallets, token_budget=100, overflow="summarize")
+    assert report["overflow_strategy"] == "summarize"
+    assert '"summary":{}' in prompt